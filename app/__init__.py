@@ -15,6 +15,10 @@ def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
 
+    # Upload multipart langsung ditulis ke UPLOAD_FOLDER tanpa salinan sementara
+    from app.utils.file_utils import UploadRequest
+    app.request_class = UploadRequest
+
     # Initialize limiter
     limiter.init_app(app)
 
@@ -1,19 +1,42 @@
 import os
+import json
+import time
 import uuid
-from flask import request, jsonify, current_app, send_from_directory
+import hashlib
+import mimetypes
+from datetime import datetime, timezone
+from urllib.parse import quote
+from flask import request, jsonify, current_app, send_from_directory, Response, stream_with_context
+from werkzeug.http import parse_content_range_header, is_resource_modified
+from werkzeug.security import safe_join
+from werkzeug.wsgi import wrap_file
 from werkzeug.utils import secure_filename
+from app import limiter
 from app.api import api_bp
 from app.api.schemas import (
     ConversionRequestSchema,
     URLConversionRequestSchema,
     ConversionResponseSchema,
-    ConversionStatusResponseSchema
+    ConversionStatusResponseSchema,
+    UploadCreateSchema,
+    UploadFinalizeSchema
 )
-from app.services.converter import MP4ToMP3Converter
-from app.services.splitter import MP3Splitter
-from app.utils.file_utils import allowed_file, get_file_info
+from app.services.mp4_probe import MP4ProbeError, probe_mp4
+from app.services.upload_store import UploadError, UploadOffsetError
+from app.services.zip_bundle import StoredZip, BundleTooLargeError, bundle_entries
+from app.utils.file_utils import allowed_file, get_file_info, save_upload, file_checksums
 from app.utils.logger import get_logger
-from app.tasks import add_to_conversion_queue, get_queue_status
+from app.tasks import (
+    add_to_conversion_queue,
+    get_queue_status,
+    get_job_registry,
+    get_job_events,
+    get_job_eta,
+    get_job_manifest,
+    manifest_files,
+    get_upload_store,
+    QueueFullError
+)
 
 logger = get_logger(__name__)
 
@@ -24,6 +47,16 @@ def health_check():
     return jsonify({'status': 'ok'})
 
 
+def queue_full_response(error):
+    """Response 429 untuk job yang ditolak karena antrian terlalu panjang"""
+    response = jsonify({
+        'error': 'Antrian konversi penuh, coba lagi nanti',
+        'retry_after': error.retry_after
+    })
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, 429
+
+
 @api_bp.route('/conversion/url', methods=['POST'])
 def convert_from_url():
     """
@@ -34,6 +67,9 @@ def convert_from_url():
     - filename: Nama file untuk output (opsional)
     - chunk_size: Ukuran potongan dalam MB (opsional, default: 25)
     - bitrate: Bitrate audio (opsional, default: 192k)
+    - format: Format output mp3 atau m4a (opsional, default: mp3). m4a menyalin
+      audio AAC tanpa transcoding dan otomatis kembali ke mp3 jika tidak kompatibel
+    - callback_url: URL yang menerima POST status akhir job (opsional)
     """
     # Validasi request JSON
     if not request.is_json:
@@ -53,13 +89,18 @@ def convert_from_url():
     logger.info(f"URL conversion request received: {data['url'][:100]}... - job_id: {job_id}")
 
     # Tambahkan ke antrian konversi
-    is_processing = add_to_conversion_queue(
-        job_id=job_id,
-        url=data['url'],
-        base_filename=data.get('filename'),
-        chunk_size_mb=data.get('chunk_size', current_app.config['DEFAULT_CHUNK_SIZE_MB']),
-        bitrate=data.get('bitrate', '192k')
-    )
+    try:
+        is_processing = add_to_conversion_queue(
+            job_id=job_id,
+            url=data['url'],
+            base_filename=data.get('filename'),
+            chunk_size_mb=data.get('chunk_size', current_app.config['DEFAULT_CHUNK_SIZE_MB']),
+            bitrate=data.get('bitrate', '192k'),
+            output_format=data.get('format', current_app.config['DEFAULT_OUTPUT_FORMAT']),
+            callback_url=data.get('callback_url')
+        )
+    except QueueFullError as e:
+        return queue_full_response(e)
 
     # Return job information
     response_data = {
@@ -75,6 +116,8 @@ def convert_from_url():
         response_data['queue_position'] = queue_info['position']
         response_data['queue_length'] = queue_info['queue_length']
 
+    response_data.update(get_job_eta(get_job_registry().get(job_id)))
+
     return ConversionResponseSchema().dump(response_data), 202
 
 
@@ -87,6 +130,8 @@ def convert_file():
     - file: File MP4 (wajib)
     - chunk_size: Ukuran potongan dalam MB (opsional, default: 25)
     - bitrate: Bitrate audio (opsional, default: 192k)
+    - format: Format output mp3 atau m4a (opsional, default: mp3)
+    - callback_url: URL yang menerima POST status akhir job (opsional)
     """
     # Check if file was included in request
     if 'file' not in request.files:
@@ -112,14 +157,66 @@ def convert_file():
     # Generate a unique ID for this job
     job_id = str(uuid.uuid4())
 
-    # Save the uploaded file
+    # Save the uploaded file (sudah ditulis ke UPLOAD_FOLDER saat request diterima, cukup di-rename)
     filename = secure_filename(file.filename)
-    base_filename = os.path.splitext(filename)[0]
     upload_path = os.path.join(current_app.config['UPLOAD_FOLDER'], f"{job_id}_{filename}")
-    file.save(upload_path)
+    checksum = save_upload(file, upload_path)
 
     logger.info(f"File uploaded: {filename}, job_id: {job_id}")
 
+    error = upload_rejection(upload_path)
+    if error:
+        os.remove(upload_path)
+        return jsonify({'error': error}), 400
+
+    try:
+        return queue_uploaded_file(job_id, upload_path, filename, checksum, data)
+    except QueueFullError as e:
+        os.remove(upload_path)
+        return queue_full_response(e)
+
+
+def upload_rejection(upload_path):
+    """
+    Periksa struktur MP4 file upload sebelum masuk antrian
+
+    Hanya box ftyp/moov/trak yang dibaca, sehingga file rusak atau tanpa track audio
+    ditolak dalam hitungan milidetik alih-alih gagal setelah menunggu giliran di antrian.
+
+    Args:
+        upload_path (str): Path file MP4
+
+    Returns:
+        str: Pesan error jika file ditolak, atau None jika file bisa diproses
+    """
+    try:
+        info = probe_mp4(upload_path)
+    except MP4ProbeError as e:
+        return f"File MP4 rusak atau tidak lengkap: {str(e)}"
+    if info['audio'] is None:
+        return "Video has no audio track"
+    return None
+
+
+def queue_uploaded_file(job_id, upload_path, filename, checksum, data):
+    """
+    Masukkan file yang sudah ada di UPLOAD_FOLDER ke antrian konversi
+
+    Args:
+        job_id (str): ID unik untuk pekerjaan konversi
+        upload_path (str): Path file MP4
+        filename (str): Nama file asli (sudah di-secure)
+        checksum (str): SHA-256 isi file (hex)
+        data (dict): Parameter konversi hasil ConversionRequestSchema
+
+    Returns:
+        tuple: Response 202 dengan informasi job
+
+    Raises:
+        QueueFullError: Jika antrian terlalu panjang; file tidak dihapus
+    """
+    base_filename = os.path.splitext(filename)[0]
+
     # Get file info
     file_info = get_file_info(upload_path)
 
@@ -129,7 +226,10 @@ def convert_file():
         file_path=upload_path,
         base_filename=base_filename,
         chunk_size_mb=data.get('chunk_size', current_app.config['DEFAULT_CHUNK_SIZE_MB']),
-        bitrate=data.get('bitrate', '192k')
+        bitrate=data.get('bitrate', '192k'),
+        output_format=data.get('format', current_app.config['DEFAULT_OUTPUT_FORMAT']),
+        fingerprint=f"sha256:{checksum}",
+        callback_url=data.get('callback_url')
     )
 
     # Return job information
@@ -147,109 +247,410 @@ def convert_file():
         response_data['queue_position'] = queue_info['position']
         response_data['queue_length'] = queue_info['queue_length']
 
+    response_data.update(get_job_eta(get_job_registry().get(job_id)))
+
     return ConversionResponseSchema().dump(response_data), 202
 
 
-@api_bp.route('/conversion/<job_id>', methods=['GET'])
-def conversion_status(job_id):
+def upload_response(upload, status=200):
+    """Response berisi state upload bertahap, juga sebagai header untuk HEAD"""
+    response = jsonify({
+        'upload_id': upload['upload_id'],
+        'filename': upload['filename'],
+        'length': upload['length'],
+        'offset': upload['offset'],
+        'upload_url': f"/api/uploads/{upload['upload_id']}"
+    })
+    response.status_code = status
+    response.headers['Upload-Offset'] = str(upload['offset'])
+    response.headers['Upload-Length'] = str(upload['length'])
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+def upload_offset_response(error):
+    """Response 409 untuk data yang tidak dimulai di offset upload saat ini"""
+    response = jsonify({'error': str(error), 'offset': error.offset})
+    response.status_code = 409
+    response.headers['Upload-Offset'] = str(error.offset)
+    return response
+
+
+@api_bp.route('/uploads', methods=['POST'])
+def create_upload():
     """
-    Get the status of a conversion job
+    Mulai upload bertahap (resumable) untuk file besar
+
+    Data dikirim dengan PATCH /api/uploads/<upload_id>, lalu konversi dimulai
+    dengan POST /api/uploads/<upload_id>/finalize.
+
+    Expects JSON:
+    - filename: Nama file MP4 (wajib)
+    - length: Ukuran file dalam byte (wajib)
+    """
+    if not request.is_json:
+        return jsonify({'error': 'Request harus dalam format JSON'}), 400
+
+    try:
+        data = UploadCreateSchema().load(request.json)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+    filename = secure_filename(data['filename'])
+    if not allowed_file(filename):
+        return jsonify({'error': 'Tipe file tidak diizinkan, harus MP4'}), 400
+    if data['length'] > current_app.config['MAX_CONTENT_LENGTH']:
+        return jsonify({'error': 'Ukuran file melebihi batas'}), 413
+
+    upload = get_upload_store().create(filename, data['length'])
+    response = upload_response(upload, 201)
+    response.headers['Location'] = f"/api/uploads/{upload['upload_id']}"
+    return response
+
+
+@api_bp.route('/uploads/<upload_id>', methods=['GET'])
+@limiter.exempt
+def upload_status(upload_id):
+    """
+    Offset upload bertahap; klien melanjutkan upload dari offset ini (HEAD juga didukung)
 
     Args:
-        job_id: The unique job identifier
+        upload_id: ID upload
     """
-    # Check if in queue first
-    queue_info = get_queue_status(job_id)
-    if queue_info.get('status') == 'queued' and queue_info.get('position') > 0:
-        return jsonify({
-            'job_id': job_id,
-            'status': 'queued',
-            'queue_position': queue_info['position'],
-            'queue_length': queue_info['queue_length'],
-            'files': []
-        }), 200
+    upload = get_upload_store().get(upload_id)
+    if upload is None:
+        return jsonify({'error': 'Upload tidak ditemukan'}), 404
+    return upload_response(upload)
 
-    # Check if still in active processing
-    if queue_info.get('status') == 'processing':
-        return jsonify({
-            'job_id': job_id,
-            'status': 'processing',
-            'files': []
-        }), 200
 
-    # Check if result directory exists for this job
-    result_dir = os.path.join(current_app.config['RESULT_FOLDER'], job_id)
+@api_bp.route('/uploads/<upload_id>', methods=['PATCH'])
+@limiter.exempt
+def upload_chunk(upload_id):
+    """
+    Tulis satu rentang byte ke upload bertahap
+
+    Body request berisi data mentah. Posisi awal diberikan lewat header
+    Upload-Offset atau Content-Range (bytes start-end/total) dan harus sama
+    dengan offset upload saat ini; byte yang sudah diterima dilewati.
 
-    if not os.path.exists(result_dir):
-        # Check if job is still in progress (upload file exists)
-        upload_files = [f for f in os.listdir(current_app.config['UPLOAD_FOLDER'])
-                        if f.startswith(job_id)]
+    Args:
+        upload_id: ID upload
+    """
+    store = get_upload_store()
+    upload = store.get(upload_id)
+    if upload is None:
+        return jsonify({'error': 'Upload tidak ditemukan'}), 404
+
+    if request.headers.get('Upload-Offset', '').isdigit():
+        start = int(request.headers['Upload-Offset'])
+    elif request.headers.get('Content-Range'):
+        content_range = parse_content_range_header(request.headers['Content-Range'])
+        if content_range is None or content_range.units != 'bytes':
+            return jsonify({'error': 'Header Content-Range tidak valid'}), 400
+        if content_range.length is not None and content_range.length != upload['length']:
+            return jsonify({'error': 'Ukuran total pada Content-Range tidak sesuai dengan upload'}), 400
+        start = content_range.start
+    else:
+        return jsonify({'error': 'Header Upload-Offset atau Content-Range wajib diisi'}), 400
 
-        temp_files = []
-        if os.path.exists(current_app.config['TEMP_FOLDER']):
-            temp_files = [f for f in os.listdir(current_app.config['TEMP_FOLDER'])
-                          if f.startswith(job_id)]
+    try:
+        store.write(upload_id, request.stream, start)
+    except UploadOffsetError as e:
+        return upload_offset_response(e)
+    except UploadError as e:
+        return jsonify({'error': str(e)}), 400
 
-        if not upload_files and not temp_files:
-            return jsonify({'error': 'Job tidak ditemukan'}), 404
+    return upload_response(store.get(upload_id))
 
-        return jsonify({
-            'job_id': job_id,
-            'status': 'processing',
-            'files': []
-        }), 200
 
-    # Check if there was an error
-    error_file = os.path.join(result_dir, "error.txt")
-    if os.path.exists(error_file):
-        with open(error_file, 'r') as f:
-            error_message = f.read()
+@api_bp.route('/uploads/<upload_id>', methods=['DELETE'])
+def delete_upload(upload_id):
+    """
+    Batalkan upload bertahap dan hapus datanya
 
+    Args:
+        upload_id: ID upload
+    """
+    store = get_upload_store()
+    if store.get(upload_id) is None:
+        return jsonify({'error': 'Upload tidak ditemukan'}), 404
+    store.discard(upload_id)
+    return '', 204
+
+
+@api_bp.route('/uploads/<upload_id>/finalize', methods=['POST'])
+def finalize_upload(upload_id):
+    """
+    Selesaikan upload bertahap dan masukkan file ke antrian konversi
+
+    Expects (JSON atau form-data): parameter yang sama dengan /conversion/file, ditambah
+    - checksum: SHA-256 file dalam hex (opsional). Jika berbeda, upload dihapus.
+
+    Args:
+        upload_id: ID upload
+    """
+    store = get_upload_store()
+    upload = store.get(upload_id)
+    if upload is None:
+        return jsonify({'error': 'Upload tidak ditemukan'}), 404
+
+    try:
+        data = UploadFinalizeSchema().load(request.get_json(silent=True) or request.form)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+    job_id = str(uuid.uuid4())
+    filename = upload['filename']
+    upload_path = os.path.join(current_app.config['UPLOAD_FOLDER'], f"{job_id}_{filename}")
+
+    try:
+        checksum = store.finalize(upload_id, upload_path)
+    except UploadOffsetError as e:
+        return upload_offset_response(e)
+    except UploadError as e:
+        return jsonify({'error': str(e)}), 404
+
+    expected = data.get('checksum', '').lower().replace('sha256:', '')
+    if expected and expected != checksum:
+        os.remove(upload_path)
+        store.discard(upload_id)
+        return jsonify({'error': 'Checksum file tidak cocok, upload dibatalkan'}), 400
+
+    logger.info(f"Upload {upload_id} finalized: {filename}, job_id: {job_id}")
+
+    error = upload_rejection(upload_path)
+    if error:
+        os.remove(upload_path)
+        store.discard(upload_id)
+        return jsonify({'error': error}), 400
+
+    try:
+        response = queue_uploaded_file(job_id, upload_path, filename, checksum, data)
+    except QueueFullError as e:
+        # Upload tetap tersimpan sehingga finalize bisa diulang setelah Retry-After
+        store.restore(upload_id, upload_path)
+        return queue_full_response(e)
+
+    store.discard(upload_id)
+    return response
+
+
+@api_bp.route('/conversion/<job_id>', methods=['GET'])
+def conversion_status(job_id):
+    """
+    Get the status of a conversion job
+
+    Query:
+    - wait: Tunggu hingga N detik sampai ada event baru (long-poll, opsional)
+    - after: event_id terakhir yang sudah diterima klien (opsional, default: event terakhir)
+
+    Args:
+        job_id: The unique job identifier
+    """
+    job = get_job_registry().get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job tidak ditemukan'}), 404
+
+    events = get_job_events()
+    wait = min(request.args.get('wait', 0, type=float), current_app.config['LONG_POLL_MAX_WAIT'])
+    if wait > 0 and job['status'] not in ('completed', 'failed'):
+        snapshot = events.snapshot(job_id)
+        after = request.args.get('after') or (snapshot['event_id'] if snapshot else None)
+        if not events.read(job_id, after=after, timeout=wait):
+            logger.debug(f"Long-poll for job {job_id} timed out after {wait:.0f}s")
+        job = get_job_registry().get(job_id)
+
+    # Tahap dan persentase terakhir dari log event progress
+    snapshot = events.snapshot(job_id)
+    live = {key: snapshot[key] for key in ('stage', 'progress', 'event_id')} if snapshot else {}
+
+    # Jobs attached to another job report the estimates of that job
+    primary = get_job_registry().get(job['primary_job_id']) if job['primary_job_id'] else None
+    eta = get_job_eta(primary or job)
+
+    # Queued jobs (and jobs attached to another job) report the live queue state
+    if job['status'] == 'queued':
+        queue_info = get_queue_status(job_id)
+        if queue_info.get('status') == 'queued' and queue_info.get('position') > 0:
+            return ConversionStatusResponseSchema().dump({
+                'job_id': job_id,
+                'status': 'queued',
+                'queue_position': queue_info['position'],
+                'queue_length': queue_info['queue_length'],
+                'files': [],
+                **eta,
+                **live
+            }), 200
+
+    if job['status'] == 'failed':
         return jsonify({
             'job_id': job_id,
             'status': 'failed',
-            'error': error_message,
-            'files': []
+            'error': job['error'],
+            'files': [],
+            **live
         }), 200
 
-    # Check if any MP3 files exist in the result directory
-    mp3_files = [f for f in os.listdir(result_dir)
-                 if f.endswith('.mp3') and f != "error.txt"]
-
-    # If no MP3 files exist yet, job is still processing
-    if not mp3_files:
-        return jsonify({
+    # Parts are only listed once every one of them has been written
+    if job['status'] != 'completed':
+        return ConversionStatusResponseSchema().dump({
             'job_id': job_id,
             'status': 'processing',
-            'files': []
+            'files': [],
+            **eta,
+            **live
         }), 200
 
-    # Job is completed, get the files
-    file_info = []
-
-    for filename in mp3_files:
-        file_path = os.path.join(result_dir, filename)
-        info = get_file_info(file_path)
-        file_info.append({
-            'filename': filename,
-            'size': info['size'],
-            'download_url': f"/api/download/{job_id}/{filename}"
-        })
+    # Manifest tidak berubah setelah job selesai, jadi dibaca dari memori tanpa menyentuh file hasil
+    manifest = get_job_manifest(job_id)
+    if manifest is not None:
+        file_info = manifest_files(job_id, manifest)
+    else:
+        file_info = [{
+            'filename': f['filename'],
+            'size': f['size'],
+            'sha256': f.get('sha256'),
+            'download_url': f"/api/download/{job_id}/{f['filename']}"
+        } for f in job['files']]
 
     response_data = {
         'job_id': job_id,
         'status': 'completed',
-        'files': file_info
+        'files': file_info,
+        'bundle_url': f"/api/download/{job_id}/bundle.zip",
+        **live
     }
 
     return ConversionStatusResponseSchema().dump(response_data), 200
 
 
+def sse_message(event_type, data, event_id=None):
+    """Format satu event Server-Sent Events"""
+    lines = [f"id: {event_id}"] if event_id else []
+    lines += [f"event: {event_type}", f"data: {json.dumps(data)}"]
+    return "\n".join(lines) + "\n\n"
+
+
+@api_bp.route('/conversion/<job_id>/events', methods=['GET'])
+def conversion_events(job_id):
+    """
+    Stream progress job sebagai Server-Sent Events
+
+    Event: 'stage' (queued, downloading, converting), 'progress' (persentase tahap
+    berjalan), 'part' (potongan yang sudah selesai dan bisa diunduh), 'reset' (potongan
+    yang sudah diumumkan dibatalkan) dan 'status' (completed atau failed, event terakhir).
+    Klien yang menyambung ulang dengan header Last-Event-ID (atau ?after=) menerima
+    event yang terlewat.
+
+    Args:
+        job_id: The unique job identifier
+    """
+    job = get_job_registry().get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job tidak ditemukan'}), 404
+
+    events = get_job_events()
+    after = request.headers.get('Last-Event-ID') or request.args.get('after')
+    timeout = current_app.config['EVENT_STREAM_TIMEOUT']
+    heartbeat = current_app.config['EVENT_STREAM_HEARTBEAT']
+
+    def generate():
+        yield f"retry: {heartbeat * 1000}\n\n"
+
+        # Job yang selesai sebelum log event ada (atau lognya sudah kedaluwarsa)
+        if job['status'] in ('completed', 'failed') and events.snapshot(job_id) is None:
+            data = {'status': job['status']}
+            if job['status'] == 'failed':
+                data['error'] = job['error']
+            else:
+                data['files'] = [dict(f, download_url=f"/api/download/{job_id}/{f['filename']}")
+                                 for f in job['files']]
+            yield sse_message('status', data)
+            return
+
+        cursor = after
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            batch = events.read(job_id, after=cursor, timeout=min(heartbeat, remaining))
+            if not batch:
+                yield ": keep-alive\n\n"
+                continue
+            for event in batch:
+                cursor = event['id']
+                yield sse_message(event['event'], event['data'], event['id'])
+                if event['event'] == 'status':
+                    return
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Nonaktifkan buffering reverse proxy (nginx) agar event langsung terkirim
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@api_bp.route('/download/<job_id>/bundle.zip', methods=['GET'])
+def download_bundle(job_id):
+    """
+    Download semua potongan job sebagai satu arsip ZIP
+
+    Arsip dibuat saat dikirim, tanpa file arsip sementara: isinya disimpan tanpa
+    kompresi (MP3/M4A tidak bisa dikompresi lagi), sehingga ukuran dan setiap byte
+    arsip sudah diketahui dari nama, ukuran dan CRC-32 potongan di registry. Karena
+    itu Range dan If-Range didukung seperti download file biasa.
+
+    Args:
+        job_id: The unique job identifier
+    """
+    job = get_job_registry().get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job tidak ditemukan'}), 404
+    if job['status'] != 'completed':
+        return jsonify({'error': 'Job belum selesai', 'status': job['status']}), 409
+
+    result_dir = os.path.join(current_app.config['RESULT_FOLDER'], job_id)
+    files = []
+    for f in job['files']:
+        path = os.path.join(result_dir, f['filename'])
+        if not os.path.isfile(path):
+            return jsonify({'error': 'File tidak ditemukan', 'filename': f['filename']}), 404
+        if 'crc32' not in f:
+            # Job yang selesai sebelum CRC-32 disimpan di registry
+            f = dict(f, crc32=file_checksums(path)[1])
+        files.append(f)
+
+    finished_at = job.get('finished_at') or job.get('updated_at') or time.time()
+    try:
+        archive = StoredZip(bundle_entries(result_dir, files), finished_at)
+    except BundleTooLargeError:
+        return jsonify({'error': 'Arsip melebihi 4 GB, unduh potongan satu per satu'}), 413
+
+    # ETag arsip berubah jika isi, nama atau urutan potongan berubah
+    etag = hashlib.sha256(
+        "\n".join(f"{f['filename']}:{f.get('sha256') or f['crc32']}" for f in files).encode('utf-8')
+    ).hexdigest()
+
+    response = Response(wrap_file(request.environ, archive), mimetype='application/zip', direct_passthrough=True)
+    response.headers['Content-Disposition'] = f"attachment; filename*=UTF-8''{quote(job_id)}.zip"
+    response.content_length = archive.size
+    response.headers['Accept-Ranges'] = 'bytes'
+    response.set_etag(etag)
+    response.last_modified = datetime.fromtimestamp(finished_at, timezone.utc)
+    response.cache_control.no_cache = True
+    return response.make_conditional(request, accept_ranges=True, complete_length=archive.size)
+
+
 @api_bp.route('/download/<job_id>/<filename>', methods=['GET'])
 def download_file(job_id, filename):
     """
     Download a converted file
 
+    Mendukung Range dan request kondisional (If-None-Match / If-Range). ETag adalah
+    SHA-256 potongan setelah job selesai. Dengan DOWNLOAD_OFFLOAD, transfer file
+    diserahkan ke reverse proxy dan worker web hanya mengirim header.
+
     Args:
         job_id: The unique job identifier
         filename: The name of the file to download
@@ -259,5 +660,49 @@ def download_file(job_id, filename):
     if not os.path.exists(directory):
         return jsonify({'error': 'Job tidak ditemukan'}), 404
 
-    # Return the file
-    return send_from_directory(directory, filename, as_attachment=True)
\ No newline at end of file
+    path = safe_join(directory, filename)
+    if path is None or not os.path.isfile(path):
+        return jsonify({'error': 'File tidak ditemukan'}), 404
+
+    # Potongan yang sudah diumumkan lewat event sebelum job selesai belum punya hash
+    job = get_job_registry().get(job_id)
+    checksum = next((f.get('sha256') for f in (job['files'] if job else []) if f['filename'] == filename), None)
+
+    offload = current_app.config['DOWNLOAD_OFFLOAD']
+    if offload in ('x-accel', 'x-sendfile'):
+        return offloaded_download(path, job_id, filename, checksum, offload)
+
+    return send_from_directory(directory, filename, as_attachment=True, etag=checksum or True)
+
+
+def offloaded_download(path, job_id, filename, checksum, offload):
+    """
+    Response tanpa isi file; reverse proxy mengirim file, termasuk Range
+
+    Request kondisional dijawab di sini karena ETag proxy tidak sama dengan hash potongan.
+
+    Args:
+        path (str): Path file di RESULT_FOLDER
+        job_id (str): ID pekerjaan
+        filename (str): Nama file
+        checksum (str): SHA-256 file, atau None jika belum diketahui
+        offload (str): 'x-accel' atau 'x-sendfile'
+    """
+    last_modified = datetime.fromtimestamp(os.path.getmtime(path), timezone.utc)
+    if not is_resource_modified(request.environ, etag=checksum, last_modified=last_modified):
+        response = Response(status=304)
+    else:
+        response = Response(mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+        response.headers['Content-Disposition'] = f"attachment; filename*=UTF-8''{quote(filename)}"
+        if offload == 'x-accel':
+            prefix = current_app.config['DOWNLOAD_ACCEL_PREFIX'].rstrip('/')
+            response.headers['X-Accel-Redirect'] = f"{prefix}/{quote(job_id)}/{quote(filename)}"
+        else:
+            response.headers['X-Sendfile'] = os.path.abspath(path)
+
+    if checksum:
+        response.set_etag(checksum)
+    response.last_modified = last_modified
+    # Sama seperti send_file: klien memvalidasi ulang dan mendapat 304 jika file tidak berubah
+    response.cache_control.no_cache = True
+    return response
\ No newline at end of file
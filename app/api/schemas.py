@@ -1,4 +1,6 @@
-from marshmallow import Schema, fields, validate, EXCLUDE
+from flask import current_app
+from marshmallow import Schema, fields, validate, validates, ValidationError, EXCLUDE
+from app.utils.webhooks import check_callback_url
 
 
 class ConversionRequestSchema(Schema):
@@ -16,6 +18,29 @@ class ConversionRequestSchema(Schema):
         metadata={"description": "Kualitas bitrate MP3"}
     )
 
+    format = fields.String(
+        validate=validate.OneOf(['mp3', 'm4a']),
+        required=False,
+        metadata={"description": "Format output: mp3 (encode ulang) atau m4a (salin audio AAC tanpa transcoding)"}
+    )
+
+    callback_url = fields.Url(
+        schemes={'http', 'https'},
+        require_tld=False,
+        required=False,
+        metadata={"description": "URL yang menerima POST status akhir job (completed atau failed)"}
+    )
+
+    @validates('callback_url')
+    def validate_callback_url(self, value):
+        """Tolak callback ke alamat internal (loopback, privat, link-local) kecuali diizinkan WEBHOOK_ALLOWED_HOSTS"""
+        try:
+            check_callback_url(value, current_app.config['WEBHOOK_ALLOWED_HOSTS'])
+        except ValueError as e:
+            raise ValidationError(str(e))
+        except OSError:
+            raise ValidationError("Host callback_url tidak bisa di-resolve")
+
     class Meta:
         unknown = EXCLUDE  # Abaikan field yang tidak dikenal
 
@@ -34,11 +59,43 @@ class URLConversionRequestSchema(ConversionRequestSchema):
     )
 
 
+class UploadCreateSchema(Schema):
+    """Schema untuk validasi request memulai upload bertahap"""
+
+    filename = fields.String(
+        required=True,
+        metadata={"description": "Nama file MP4 yang akan diupload"}
+    )
+
+    length = fields.Integer(
+        required=True,
+        validate=validate.Range(min=1),
+        metadata={"description": "Ukuran file dalam byte"}
+    )
+
+    class Meta:
+        unknown = EXCLUDE
+
+
+class UploadFinalizeSchema(ConversionRequestSchema):
+    """Schema untuk validasi request menyelesaikan upload bertahap"""
+
+    checksum = fields.String(
+        validate=validate.Regexp(r'^(sha256:)?[0-9a-fA-F]{64}$'),
+        required=False,
+        metadata={"description": "SHA-256 file (hex) untuk verifikasi, opsional"}
+    )
+
+
 class FileInfoSchema(Schema):
     """Schema untuk informasi file"""
 
     filename = fields.String(required=True)
     size = fields.Integer(required=True)
+    duration = fields.Float(required=False)
+    start = fields.Float(required=False)
+    bitrate = fields.Integer(required=False)
+    sha256 = fields.String(required=False)
     download_url = fields.String(required=True)
 
 
@@ -53,6 +110,8 @@ class ConversionResponseSchema(Schema):
     is_queued = fields.Boolean(required=False)
     queue_position = fields.Integer(required=False)
     queue_length = fields.Integer(required=False)
+    estimated_start = fields.DateTime(required=False)
+    estimated_completion = fields.DateTime(required=False)
 
 
 class ConversionStatusResponseSchema(Schema):
@@ -62,5 +121,11 @@ class ConversionStatusResponseSchema(Schema):
     status = fields.String(required=True, validate=validate.OneOf(['processing', 'queued', 'completed', 'failed']))
     queue_position = fields.Integer(required=False)
     queue_length = fields.Integer(required=False)
+    estimated_start = fields.DateTime(required=False)
+    estimated_completion = fields.DateTime(required=False)
+    stage = fields.String(required=False)
+    progress = fields.Float(required=False, allow_none=True)
+    event_id = fields.String(required=False)
     error = fields.String(required=False)
-    files = fields.List(fields.Nested(FileInfoSchema), required=True)
\ No newline at end of file
+    files = fields.List(fields.Nested(FileInfoSchema), required=True)
+    bundle_url = fields.String(required=False)
\ No newline at end of file
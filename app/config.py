@@ -14,6 +14,10 @@ class Config:
     
     # Max allowed file size (1000MB)
     MAX_CONTENT_LENGTH = 1000 * 1024 * 1024
+
+    # Upload bertahap (/api/uploads): data yang belum selesai dan lama tidak bertambah dihapus
+    RESUMABLE_UPLOAD_FOLDER = os.environ.get('RESUMABLE_UPLOAD_FOLDER') or os.path.join(UPLOAD_FOLDER, 'partial')
+    RESUMABLE_UPLOAD_EXPIRY = int(os.environ.get('RESUMABLE_UPLOAD_EXPIRY') or 24 * 3600)  # detik
     
     # Default chunk size (25MB)
     DEFAULT_CHUNK_SIZE_MB = 25
@@ -28,8 +32,115 @@ class Config:
     
     # File serve configuration
     RESULTS_SERVE_EXPIRY = 3600  # 1 hour in seconds
+    # Pengiriman file hasil diserahkan ke reverse proxy agar worker web tidak tertahan selama transfer:
+    # '' (dikirim Flask), 'x-accel' (nginx X-Accel-Redirect) atau 'x-sendfile' (Apache/lighttpd X-Sendfile)
+    DOWNLOAD_OFFLOAD = (os.environ.get('DOWNLOAD_OFFLOAD') or '').lower()
+    # Location internal nginx yang menunjuk ke RESULT_FOLDER, untuk 'x-accel'
+    DOWNLOAD_ACCEL_PREFIX = os.environ.get('DOWNLOAD_ACCEL_PREFIX') or '/protected-results/'
+    # Jumlah manifest job selesai yang disimpan di memori untuk polling status
+    MANIFEST_CACHE_SIZE = int(os.environ.get('MANIFEST_CACHE_SIZE') or 1024)
 
     # Tambahkan konfigurasi throttling berdasarkan ukuran file
-    MAX_CONCURRENT_CONVERSIONS = 3  # Maksimum 3 konversi berjalan bersamaan
+    MAX_CONCURRENT_CONVERSIONS = int(os.environ.get('MAX_CONCURRENT_CONVERSIONS') or 3)  # Maksimum konversi bersamaan
     MAX_FILE_SIZE_FOR_INSTANT_PROCESSING = 50 * 1024 * 1024  # 50MB
     LARGE_FILE_PROCESSING_DELAY = 300  # Delay 5 menit untuk file besar
+
+    # Slot konversi per proses menyesuaikan kuota CPU dan memori container (cgroup), antara
+    # MIN_CONCURRENT_CONVERSIONS dan MAX_CONCURRENT_CONVERSIONS
+    ADAPTIVE_CONCURRENCY = os.environ.get('ADAPTIVE_CONCURRENCY', 'true').lower() in ('1', 'true', 'yes')
+    MIN_CONCURRENT_CONVERSIONS = int(os.environ.get('MIN_CONCURRENT_CONVERSIONS') or 1)
+    ADAPTIVE_TARGET_CPU = float(os.environ.get('ADAPTIVE_TARGET_CPU') or 0.85)  # Fraksi kuota CPU
+    ADAPTIVE_MEMORY_HEADROOM = float(os.environ.get('ADAPTIVE_MEMORY_HEADROOM') or 0.15)  # Fraksi memori yang dibiarkan bebas
+    ADAPTIVE_JOB_MEMORY = int(os.environ.get('ADAPTIVE_JOB_MEMORY') or 256 * 1024 * 1024)  # Perkiraan awal memori per job
+    ADAPTIVE_SAMPLE_INTERVAL = float(os.environ.get('ADAPTIVE_SAMPLE_INTERVAL') or 5)  # detik
+
+    # Penjadwalan antrian: 'sjf' (job dengan perkiraan waktu proses kecil didahulukan,
+    # job besar tertunda paling lama LARGE_FILE_PROCESSING_DELAY) atau 'fifo'
+    SCHEDULING_POLICY = os.environ.get('SCHEDULING_POLICY') or 'sjf'
+    ESTIMATED_ENCODE_SPEED = 40  # Kecepatan encode MP3, kali realtime
+    ESTIMATED_REMUX_SPEED = 400  # Kecepatan passthrough M4A, kali realtime
+    ESTIMATED_INPUT_BITRATE = 1000000  # Bitrate video (bps) untuk perkiraan durasi dari ukuran file
+    ESTIMATED_DOWNLOAD_RATE = 10 * 1024 * 1024  # Kecepatan download (byte/detik)
+
+    # Konfigurasi ffmpeg untuk ekstraksi audio
+    FFMPEG_BINARY = os.environ.get('FFMPEG_BINARY') or 'ffmpeg'
+    FFPROBE_BINARY = os.environ.get('FFPROBE_BINARY') or 'ffprobe'
+    FFMPEG_THREADS = int(os.environ.get('FFMPEG_THREADS') or 0)  # 0 = biarkan ffmpeg menentukan
+    FFMPEG_TIMEOUT = int(os.environ.get('FFMPEG_TIMEOUT') or 3600)  # Batas waktu per konversi (detik)
+
+    # Format output default: mp3 (encode ulang) atau m4a (salin audio AAC tanpa transcoding)
+    DEFAULT_OUTPUT_FORMAT = 'mp3'
+
+    # Encode paralel untuk input panjang: jumlah proses ffmpeg per job (1 = nonaktif)
+    PARALLEL_ENCODE_WORKERS = int(os.environ.get('PARALLEL_ENCODE_WORKERS') or 1)
+    PARALLEL_ENCODE_MIN_DURATION = int(os.environ.get('PARALLEL_ENCODE_MIN_DURATION') or 600)  # detik
+
+    # Konversi sambil download untuk MP4 dengan atom moov di depan (faststart)
+    STREAMING_INGEST = os.environ.get('STREAMING_INGEST', 'true').lower() in ('1', 'true', 'yes')
+    # Pilihan untuk file besar yang servernya mendukung Range: 'stream' (konversi sambil download,
+    # satu koneksi) atau 'ranges' (download paralel dulu, baru konversi)
+    URL_INGEST_PREFERENCE = os.environ.get('URL_INGEST_PREFERENCE') or 'stream'
+
+    # Download paralel dengan HTTP Range (beberapa koneksi per file)
+    DOWNLOAD_CONNECTIONS = int(os.environ.get('DOWNLOAD_CONNECTIONS') or 4)
+    DOWNLOAD_RANGE_MIN_SIZE = int(os.environ.get('DOWNLOAD_RANGE_MIN_SIZE') or 16 * 1024 * 1024)  # 16MB
+    DOWNLOAD_RANGE_RETRIES = int(os.environ.get('DOWNLOAD_RANGE_RETRIES') or 3)
+    # Job URL yang download-nya gagal sementara (koneksi putus, 5xx) dijalankan ulang; download
+    # dengan Range dilanjutkan dari file .part yang tersimpan
+    DOWNLOAD_JOB_RETRIES = int(os.environ.get('DOWNLOAD_JOB_RETRIES') or 2)
+    DOWNLOAD_JOB_RETRY_DELAY = int(os.environ.get('DOWNLOAD_JOB_RETRY_DELAY') or 30)  # detik
+
+    # Cache hasil konversi berdasarkan isi input + parameter (hardlink ke folder hasil)
+    RESULT_CACHE_ENABLED = os.environ.get('RESULT_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    CACHE_FOLDER = os.environ.get('CACHE_FOLDER') or os.path.join(basedir, '../storage/cache')
+    CACHE_MAX_BYTES = int(os.environ.get('CACHE_MAX_BYTES') or 10 * 1024 * 1024 * 1024)  # 10GB
+
+    # Mode eksekusi: 'thread' (worker thread di proses web) atau 'rq' (job dikirim ke Redis
+    # dan dikerjakan oleh worker.py, yang bisa dijalankan di banyak container)
+    EXECUTION_MODE = os.environ.get('EXECUTION_MODE') or 'thread'
+    RQ_ASYNC = os.environ.get('RQ_ASYNC', 'true').lower() in ('1', 'true', 'yes')  # false: jalankan job langsung
+    RQ_JOB_TIMEOUT = int(os.environ.get('RQ_JOB_TIMEOUT') or 4 * 3600)  # Download + konversi (detik)
+    # Antrian RQ untuk job upload berdasarkan perkiraan waktu proses (detik); job URL selalu 'default'
+    RQ_HIGH_MAX_COST = float(os.environ.get('RQ_HIGH_MAX_COST') or 60)  # 'high' jika tidak lebih dari ini
+    RQ_LOW_MIN_COST = float(os.environ.get('RQ_LOW_MIN_COST') or 900)  # 'low' jika minimal ini
+
+    # Registry status job: 'sqlite' (lokal) atau 'redis' (dibagi antar proses/container)
+    JOB_REGISTRY_BACKEND = os.environ.get('JOB_REGISTRY_BACKEND') or ('redis' if EXECUTION_MODE == 'rq' else 'sqlite')
+    JOB_REGISTRY_PATH = os.environ.get('JOB_REGISTRY_PATH') or os.path.join(basedir, '../storage/jobs.db')
+    JOB_REGISTRY_TTL = int(os.environ.get('JOB_REGISTRY_TTL') or 7 * 24 * 3600)  # Redis: simpan 7 hari
+
+    # Batas MAX_CONCURRENT_CONVERSIONS untuk semua proses (worker gunicorn, replika, worker RQ):
+    # 'redis' (semaphore + satu antrian global untuk semua host), 'file' (lock file, satu host)
+    # atau 'none' (batas per proses saja)
+    ADMISSION_BACKEND = os.environ.get('ADMISSION_BACKEND') or ('redis' if EXECUTION_MODE == 'rq' else 'file')
+    ADMISSION_LOCK_FOLDER = os.environ.get('ADMISSION_LOCK_FOLDER') or os.path.join(basedir, '../storage/locks')
+    ADMISSION_LEASE_SECONDS = int(os.environ.get('ADMISSION_LEASE_SECONDS') or 60)  # Slot dilepas jika proses mati
+
+    # Model throughput: kecepatan ESTIMATED_* hanya nilai awal, diperbarui dari job yang selesai.
+    # 'redis' membagi model ke semua proses, 'memory' per proses
+    THROUGHPUT_BACKEND = os.environ.get('THROUGHPUT_BACKEND') or ('redis' if EXECUTION_MODE == 'rq' else 'memory')
+    THROUGHPUT_SMOOTHING = float(os.environ.get('THROUGHPUT_SMOOTHING') or 0.2)  # Bobot pengukuran terbaru
+
+    # Backpressure: job baru ditolak (429 + Retry-After) jika perkiraan waktu tunggunya melebihi batas
+    MAX_QUEUE_WAIT = int(os.environ.get('MAX_QUEUE_WAIT') or 1800)  # detik, 0 = tanpa batas
+
+    # Progress job: stream SSE /api/conversion/<job_id>/events dan long-poll ?wait=
+    EVENT_STREAM_TIMEOUT = int(os.environ.get('EVENT_STREAM_TIMEOUT') or 300)  # detik, klien menyambung ulang otomatis
+    EVENT_STREAM_HEARTBEAT = int(os.environ.get('EVENT_STREAM_HEARTBEAT') or 15)  # detik antar komentar keep-alive
+    LONG_POLL_MAX_WAIT = int(os.environ.get('LONG_POLL_MAX_WAIT') or 60)  # batas atas parameter wait (detik)
+
+    # Webhook callback_url: dikirim di background dengan retry (backoff eksponensial).
+    # 'redis' agar job yang selesai di worker RQ tetap dikirim oleh proses web
+    WEBHOOK_BACKEND = os.environ.get('WEBHOOK_BACKEND') or ('redis' if EXECUTION_MODE == 'rq' else 'memory')
+    WEBHOOK_TIMEOUT = int(os.environ.get('WEBHOOK_TIMEOUT') or 10)  # detik per percobaan
+    WEBHOOK_MAX_ATTEMPTS = int(os.environ.get('WEBHOOK_MAX_ATTEMPTS') or 6)
+    WEBHOOK_BACKOFF_BASE = int(os.environ.get('WEBHOOK_BACKOFF_BASE') or 5)  # detik sebelum retry pertama
+    WEBHOOK_BACKOFF_MAX = int(os.environ.get('WEBHOOK_BACKOFF_MAX') or 600)
+    WEBHOOK_WORKERS = int(os.environ.get('WEBHOOK_WORKERS') or 4)  # thread pengirim dan koneksi per host
+    # Callback ke alamat non-publik (loopback, privat, link-local) ditolak, kecuali host, IP atau
+    # jaringan CIDR di daftar ini (dipisah koma), misalnya "hooks.internal,10.20.0.0/16"
+    WEBHOOK_ALLOWED_HOSTS = [host.strip() for host in (os.environ.get('WEBHOOK_ALLOWED_HOSTS') or '').split(',')
+                             if host.strip()]
+    # Callback yang gagal permanen dicatat di sini (satu JSON per baris)
+    WEBHOOK_DEAD_LETTER_PATH = (os.environ.get('WEBHOOK_DEAD_LETTER_PATH')
+                                or os.path.join(basedir, '../storage/webhooks/dead_letter.jsonl'))
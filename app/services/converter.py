@@ -1,31 +1,40 @@
 import os
-from moviepy.editor import VideoFileClip
+from app.services.ffmpeg import FFmpegError, FFmpegRunner
 from app.utils.logger import get_logger
 
 class MP4ToMP3Converter:
     """Service for converting MP4 videos to MP3 audio files"""
     
-    def __init__(self, bitrate="192k", sample_rate=44100):
+    def __init__(self, bitrate="192k", sample_rate=44100, threads=0, ffmpeg_binary="ffmpeg", timeout=None):
         """
         Initialize the converter with given settings
         
         Args:
             bitrate (str): Bitrate for the MP3 file (e.g. '192k')
             sample_rate (int): Sample rate in Hz
+            threads (int): Number of threads ffmpeg may use (0 lets ffmpeg decide)
+            ffmpeg_binary (str): Path or name of the ffmpeg executable
+            timeout (int, optional): Abort a conversion after this many seconds
         """
         self.bitrate = bitrate
         self.sample_rate = sample_rate
+        self.runner = FFmpegRunner(binary=ffmpeg_binary, threads=threads, timeout=timeout)
         self.logger = get_logger(__name__)
     
-    def convert(self, mp4_path, output_folder, output_filename=None):
+    def convert(self, mp4_path, output_folder, output_filename=None, progress_callback=None):
         """
         Convert an MP4 file to MP3
+
+        Only the first audio stream is demuxed and decoded; the video stream
+        is never read.
         
         Args:
             mp4_path (str): Path to the MP4 file
             output_folder (str): Directory to save the MP3 file
             output_filename (str, optional): Custom name for the output file.
                 If None, will use the input filename with _temp suffix.
+            progress_callback (callable, optional): Receives progress dicts
+                from FFmpegRunner while the conversion runs
         
         Returns:
             str: Path to the converted MP3 file
@@ -51,25 +60,12 @@ class MP4ToMP3Converter:
         self.logger.info(f"Starting conversion of {mp4_path} to {output_path}")
         
         try:
-            # Extract audio from video
-            video = VideoFileClip(mp4_path)
-            
-            # Check if video has audio
-            if not video.audio:
-                self.logger.error(f"Video has no audio track: {mp4_path}")
-                raise ValueError(f"Video has no audio track: {mp4_path}")
-            
-            # Write audio to file
-            video.audio.write_audiofile(
-                output_path,
-                bitrate=self.bitrate,
-                fps=self.sample_rate,
-                logger=None  # Disable moviepy's internal logger
+            self.runner.run(
+                ['-vn', '-sn', '-dn', '-i', mp4_path],
+                self._encode_args() + ['-f', 'mp3', output_path],
+                progress_callback=progress_callback
             )
             
-            # Close the video to release resources
-            video.close()
-            
             self.logger.info(f"Conversion completed: {output_path}")
             return output_path
             
@@ -79,3 +75,84 @@ class MP4ToMP3Converter:
             if os.path.exists(output_path):
                 os.remove(output_path)
             raise Exception(f"Conversion failed: {str(e)}")
+
+    def convert_segmented(self, mp4_path, splitter, output_folder, base_filename, progress_callback=None,
+                          input_stream=None, part_callback=None, parts=None):
+        """
+        Convert an MP4 file to MP3 parts in a single pass
+
+        The encoder writes the MP3 bitstream to a pipe and the splitter cuts it
+        into size-bounded parts as it arrives, so no intermediate MP3 file is
+        written or read back.
+
+        Args:
+            mp4_path (str): Path to the MP4 file, or a source label for logging
+                when input_stream is given
+            splitter (MP3Splitter): Splitter that decides the part size
+            output_folder (str): Directory to save the parts
+            base_filename (str): Base name for the parts
+            progress_callback (callable, optional): Receives progress dicts
+                from FFmpegRunner while the conversion runs
+            input_stream (iterable, optional): Chunks of the MP4 file as they
+                arrive (e.g. from a download). The MP4 must have its moov atom
+                before the media data so it can be demuxed from a pipe.
+            part_callback (callable, optional): Called with the path of each
+                part as soon as it is complete
+            parts (PartLog, optional): Receives the size, checksums and duration
+                of each part
+
+        Returns:
+            list: List of paths to the MP3 parts
+
+        Raises:
+            IOError: If the input file doesn't exist
+            FFmpegError: If ffmpeg fails (NoAudioStreamError, InvalidInputError, ...)
+            Exception: For any other conversion errors
+        """
+        if input_stream is None and not os.path.exists(mp4_path):
+            self.logger.error(f"Input file not found: {mp4_path}")
+            raise IOError(f"Input file not found: {mp4_path}")
+
+        self.logger.info(f"Starting segmented conversion of {mp4_path} into {output_folder}")
+
+        output_files = []
+
+        def _consume(stream):
+            output_files.extend(splitter.split_stream(stream, output_folder, base_filename, part_callback, parts))
+
+        try:
+            self.runner.run(
+                ['-vn', '-sn', '-dn', '-i', 'pipe:0' if input_stream is not None else mp4_path],
+                self._encode_args() + [
+                    # A pipe cannot be rewound to fill in the Xing frame
+                    '-write_xing', '0',
+                    '-id3v2_version', '0',
+                    '-f', 'mp3', 'pipe:1'
+                ],
+                progress_callback=progress_callback,
+                stdout_handler=_consume,
+                stdin_source=input_stream
+            )
+
+            self.logger.info(f"Segmented conversion completed: {len(output_files)} parts")
+            return output_files
+
+        except Exception as e:
+            self.logger.error(f"Error during conversion: {str(e)}")
+            # Clean up parts written before the failure
+            for path in output_files:
+                if os.path.exists(path):
+                    os.remove(path)
+            if isinstance(e, FFmpegError):
+                # Keep the specific failure (no audio track, corrupt input, ...) for the caller
+                raise
+            raise Exception(f"Conversion failed: {str(e)}") from e
+
+    def _encode_args(self):
+        """Output options for encoding the first audio stream to MP3"""
+        return [
+            '-map', '0:a:0',
+            '-c:a', 'libmp3lame',
+            '-b:a', self.bitrate,
+            '-ar', str(self.sample_rate),
+        ]
@@ -1,42 +1,403 @@
 import os
+import json
+import time
+import threading
 import requests
-from urllib.parse import urlparse, unquote
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, urlunparse, unquote
 import tempfile
 import shutil
 from flask import current_app
+from app.services.mp4_probe import MP4ProbeError, probe_mp4, probe_mp4_prefix
 from app.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+# Batas byte awal yang dibaca untuk mencari atom moov sebelum mdat
+MOOV_PEEK_LIMIT = 4 * 1024 * 1024
+
+# Interval minimum (detik) antara penyimpanan state download ke disk
+STATE_SAVE_INTERVAL = 2.0
+
+
+def moov_before_mdat(data):
+    """
+    Periksa urutan box top-level MP4 pada bagian awal file
+
+    Args:
+        data (bytes): Byte awal file
+
+    Returns:
+        bool: True jika moov muncul sebelum mdat, False jika mdat lebih dulu atau
+            data bukan MP4, None jika data belum cukup untuk memutuskan
+    """
+    pos = 0
+    while pos + 8 <= len(data):
+        size = int.from_bytes(data[pos:pos + 4], 'big')
+        box_type = bytes(data[pos + 4:pos + 8])
+        header_size = 8
+
+        if pos == 0 and box_type != b'ftyp':
+            return False
+        if box_type == b'moov':
+            return True
+        if box_type == b'mdat':
+            return False
+
+        if size == 1:
+            if pos + 16 > len(data):
+                return None
+            size = int.from_bytes(data[pos + 8:pos + 16], 'big')
+            header_size = 16
+        if size < header_size:
+            # size 0 (box sampai akhir file) atau box rusak
+            return False
+
+        pos += size
+
+    return None
+
+
+# Port default yang dihapus saat normalisasi URL
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def normalize_url(url):
+    """
+    Normalisasi URL agar URL yang menunjuk ke file yang sama bisa dibandingkan
+
+    Skema dan host diubah ke huruf kecil, port default dan fragment dihapus.
+    Query string dibiarkan apa adanya karena urutannya bisa bermakna bagi server.
+
+    Args:
+        url (str): URL asli
+
+    Returns:
+        str: URL yang sudah dinormalisasi
+    """
+    try:
+        parsed = urlparse(url.strip())
+        scheme = parsed.scheme.lower()
+        netloc = (parsed.hostname or '').lower()
+        if parsed.port and parsed.port != DEFAULT_PORTS.get(scheme):
+            netloc += f":{parsed.port}"
+    except ValueError:
+        return url
+
+    if parsed.username is not None:
+        userinfo = parsed.username if parsed.password is None else f"{parsed.username}:{parsed.password}"
+        netloc = f"{userinfo}@{netloc}"
+
+    return urlunparse((scheme, netloc, parsed.path or '/', parsed.params, parsed.query, ''))
+
+
+class RangeNotSupportedError(Exception):
+    """Server tidak melayani request Range seperti yang diiklankan"""
+
+
+class DownloadError(ValueError):
+    """Download gagal karena koneksi atau server sedang bermasalah; percobaan berikutnya bisa berhasil"""
+
+
+def download_error(e):
+    """
+    Ubah exception requests menjadi error download
+
+    Args:
+        e (requests.RequestException): Error dari requests
+
+    Returns:
+        ValueError: DownloadError untuk masalah sementara (koneksi, timeout, 408, 429, 5xx),
+            ValueError biasa untuk response yang tidak akan berubah jika diulang (mis. 404)
+    """
+    message = f"Gagal mendownload file: {str(e)}"
+    response = getattr(e, 'response', None)
+    if response is not None and response.status_code < 500 and response.status_code not in (408, 429):
+        return ValueError(message)
+    return DownloadError(message)
+
+
+class _DownloadProgress:
+    """Penghitung byte yang aman dipakai bersama oleh beberapa koneksi"""
+
+    def __init__(self, total_size, downloaded=0, log_interval=5 * 1024 * 1024, callback=None):
+        self.total_size = total_size
+        self.downloaded = downloaded
+        self.log_interval = log_interval
+        self.next_log = (downloaded // log_interval + 1) * log_interval
+        self.callback = callback
+        self.lock = threading.Lock()
+
+    def add(self, count):
+        with self.lock:
+            self.downloaded += count
+            downloaded = self.downloaded
+            if self.total_size > 0 and self.downloaded >= self.next_log:
+                progress = (self.downloaded / self.total_size) * 100
+                logger.info(
+                    f"Download progress: {progress:.1f}% ({self.downloaded / (1024 * 1024):.1f}MB/{self.total_size / (1024 * 1024):.1f}MB)")
+                self.next_log += self.log_interval
+        if self.callback:
+            self.callback(downloaded, self.total_size)
+
+
+class _DownloadState:
+    """
+    State download yang disimpan di samping file .part agar download bisa dilanjutkan
+
+    Setiap range dicatat sebagai [start, end, offset], dengan offset adalah byte
+    pertama yang belum ditulis. File state ditulis secara atomik (tulis ke file
+    sementara lalu rename) sehingga crash tidak meninggalkan state yang rusak.
+    """
+
+    def __init__(self, path, metadata, ranges):
+        self.path = path
+        self.size = metadata['size']
+        self.etag = metadata.get('etag')
+        self.last_modified = metadata.get('last_modified')
+        self.ranges = [list(r) for r in ranges]
+        self.lock = threading.Lock()
+        self.last_save = 0.0
+
+    @classmethod
+    def load(cls, path, metadata):
+        """
+        Baca state yang tersimpan jika masih cocok dengan file di server
+
+        Returns:
+            _DownloadState: State tersimpan, atau None jika tidak ada, rusak,
+                atau file di server sudah berubah (ukuran/ETag/Last-Modified berbeda)
+        """
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            ranges = data['ranges']
+        except (OSError, ValueError, KeyError):
+            return None
+
+        if data.get('size') != metadata['size']:
+            return None
+        if metadata.get('etag') and data.get('etag') != metadata.get('etag'):
+            return None
+        if metadata.get('last_modified') and data.get('last_modified') != metadata.get('last_modified'):
+            return None
+        if not metadata.get('etag') and not metadata.get('last_modified'):
+            # Tanpa validator tidak ada jaminan file masih sama
+            return None
+
+        return cls(path, metadata, ranges)
+
+    @property
+    def downloaded(self):
+        return sum(offset - start for start, end, offset in self.ranges)
+
+    def advance(self, index, offset):
+        """Catat progress range dan simpan ke disk jika interval sudah lewat"""
+        with self.lock:
+            self.ranges[index][2] = offset
+            if time.monotonic() - self.last_save >= STATE_SAVE_INTERVAL:
+                self._save()
+
+    def save(self):
+        with self.lock:
+            self._save()
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def _save(self):
+        data = {
+            'size': self.size,
+            'etag': self.etag,
+            'last_modified': self.last_modified,
+            'ranges': self.ranges,
+        }
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+        self.last_save = time.monotonic()
+
+
+class DownloadStream:
+    """
+    Response download yang sudah dibuka, dengan bagian awal yang sudah dibaca
+
+    info berisi hasil probe_mp4_prefix jika moov lengkap ada di bagian awal, atau None.
+    """
+
+    def __init__(self, response, chunks, prefix, filename):
+        self.response = response
+        self.filename = filename
+        self.total_size = int(response.headers.get('content-length', 0))
+        self.info = None
+        valid = True
+        try:
+            self.info = probe_mp4_prefix(prefix, self.total_size or None)
+        except MP4ProbeError:
+            valid = False
+        # File rusak atau tanpa track audio didownload dulu agar ditolak validate_file_type
+        self.streamable = valid and moov_before_mdat(prefix) is True and \
+            os.path.splitext(filename)[1].lower() == '.mp4' and \
+            (self.info is None or self.info['audio'] is not None)
+        self._chunks = chunks
+        self._prefix = bytes(prefix)
+
+    def iter_chunks(self, progress_callback=None):
+        """
+        Iterasi seluruh body response, dimulai dari bagian yang sudah dibaca
+
+        Args:
+            progress_callback (callable, optional): Dipanggil dengan (byte terdownload,
+                ukuran total) setelah setiap chunk, seperti pada URLDownloader.download
+
+        Raises:
+            ValueError: Jika koneksi terputus di tengah download
+        """
+        downloaded = len(self._prefix)
+        next_log = 5 * 1024 * 1024
+        if self._prefix:
+            yield self._prefix
+            if progress_callback:
+                progress_callback(downloaded, self.total_size)
+
+        try:
+            for chunk in self._chunks:
+                if chunk:  # filter chunk kosong
+                    downloaded += len(chunk)
+                    yield chunk
+                    if progress_callback:
+                        progress_callback(downloaded, self.total_size)
+
+                    # Log progress untuk file besar
+                    if self.total_size > 0 and downloaded >= next_log:
+                        progress = (downloaded / self.total_size) * 100
+                        logger.info(
+                            f"Download progress: {progress:.1f}% ({downloaded / (1024 * 1024):.1f}MB/{self.total_size / (1024 * 1024):.1f}MB)")
+                        next_log += 5 * 1024 * 1024
+        except requests.RequestException as e:
+            logger.error(f"Error downloading file: {str(e)}")
+            raise ValueError(f"Gagal mendownload file: {str(e)}")
+
+        if self.total_size and downloaded < self.total_size:
+            raise ValueError(f"Download tidak lengkap: {downloaded} dari {self.total_size} byte")
+
+    def close(self):
+        self.response.close()
+
 
 class URLDownloader:
     """Service untuk mendownload file dari URL"""
 
-    def __init__(self, chunk_size=8192, timeout=30):
+    def __init__(self, chunk_size=64 * 1024, timeout=30, connections=1, min_range_size=16 * 1024 * 1024,
+                 range_retries=3):
         """
         Initialize downloader
 
         Args:
             chunk_size (int): Ukuran chunk untuk streaming download
             timeout (int): Timeout request dalam detik
+            connections (int): Jumlah koneksi paralel untuk download dengan Range
+            min_range_size (int): Ukuran file minimum (byte) untuk download paralel
+            range_retries (int): Jumlah percobaan ulang berturut-turut per range
+                yang tidak menghasilkan data baru
         """
         self.chunk_size = chunk_size
         self.timeout = timeout
+        self.connections = max(1, connections)
+        self.min_range_size = min_range_size
+        self.range_retries = range_retries
+
+    def probe(self, url):
+        """
+        Ambil metadata file dari URL dengan request HEAD
+
+        Args:
+            url (str): URL file
+
+        Returns:
+            dict: 'url' (URL akhir setelah redirect), 'filename', 'size',
+                'accept_ranges', 'etag' dan 'last_modified'. Dict kosong jika HEAD gagal.
+        """
+        if not self._is_valid_url(url):
+            return {}
+
+        try:
+            response = requests.head(url, allow_redirects=True, timeout=self.timeout)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            logger.warning(f"HEAD request gagal untuk {url}: {str(e)}")
+            return {}
+
+        headers = response.headers
+        try:
+            size = int(headers.get('content-length') or 0)
+        except ValueError:
+            size = 0
+
+        return {
+            'url': response.url,
+            'filename': self._get_filename_from_url(url),
+            'size': size,
+            'accept_ranges': headers.get('accept-ranges', '').lower() == 'bytes',
+            'etag': headers.get('etag'),
+            'last_modified': headers.get('last-modified'),
+        }
+
+    @staticmethod
+    def is_resumable(metadata):
+        """
+        Cek apakah download dari probe() bisa dilanjutkan dengan request Range
 
-    def download(self, url, output_folder, filename=None):
+        Args:
+            metadata (dict): Hasil probe()
+
+        Returns:
+            bool: True jika server mendukung Range dan ukuran file diketahui
+        """
+        return bool(metadata) and bool(metadata.get('accept_ranges')) and metadata.get('size', 0) > 0
+
+    def supports_ranges(self, metadata):
+        """
+        Cek apakah file dari probe() bisa didownload dengan beberapa koneksi
+
+        Args:
+            metadata (dict): Hasil probe()
+
+        Returns:
+            bool: True jika download paralel dengan Range dapat digunakan
+        """
+        return self.is_resumable(metadata) and self.connections > 1 \
+            and metadata['size'] >= self.min_range_size
+
+    def download(self, url, output_folder, filename=None, metadata=None, progress_callback=None):
         """
         Download file dari URL ke output_folder
 
+        Jika server mendukung Range, file ditulis ke {nama}.part dengan state di
+        {nama}.part.json. Koneksi yang terputus dilanjutkan dari byte terakhir, dan
+        pemanggilan berikutnya dengan folder yang sama (misalnya setelah proses
+        restart) melanjutkan download selama ETag/Last-Modified tidak berubah.
+        File yang cukup besar didownload dengan beberapa koneksi paralel. Jika
+        server tidak mendukung Range, digunakan satu koneksi streaming.
+
         Args:
             url (str): URL file yang akan didownload
             output_folder (str): Folder untuk menyimpan file
             filename (str, optional): Nama file output. Jika None, akan menggunakan nama file dari URL.
+            metadata (dict, optional): Hasil probe(). Jika None, probe() dipanggil
+                terlebih dahulu.
+            progress_callback (callable, optional): Dipanggil dengan (byte terdownload,
+                ukuran total atau 0 jika tidak diketahui) setiap ada data masuk
 
         Returns:
             str: Path ke file yang didownload
 
         Raises:
-            ValueError: Jika URL tidak valid atau masalah downloading
+            DownloadError: Jika download gagal karena masalah sementara; file .part
+                download dengan Range disimpan agar pemanggilan berikutnya melanjutkannya
+            ValueError: Jika URL tidak valid atau masalah downloading lainnya
         """
         # Validasi URL
         if not self._is_valid_url(url):
@@ -51,6 +412,15 @@ class URLDownloader:
         output_filename = filename or self._get_filename_from_url(url)
         output_path = os.path.join(output_folder, output_filename)
 
+        # Download dengan Range (bisa dilanjutkan) jika didukung server
+        if metadata is None:
+            metadata = self.probe(url)
+        if self.is_resumable(metadata):
+            try:
+                return self._download_ranges(metadata.get('url') or url, output_path, metadata, progress_callback)
+            except RangeNotSupportedError as e:
+                logger.warning(f"Download dengan Range tidak didukung ({str(e)}), menggunakan satu koneksi")
+
         # Download file dengan streaming untuk menangani file besar
         try:
             logger.info(f"Mulai download dari: {url}")
@@ -67,6 +437,8 @@ class URLDownloader:
                     if chunk:  # filter chunk kosong
                         temp_file.write(chunk)
                         downloaded += len(chunk)
+                        if progress_callback:
+                            progress_callback(downloaded, total_size)
 
                         # Log progress untuk file besar
                         if total_size > 0 and downloaded % (5 * 1024 * 1024) == 0:  # Log setiap 5MB
@@ -85,8 +457,198 @@ class URLDownloader:
             # Hapus file sementara jika ada
             if 'temp_file' in locals() and os.path.exists(temp_file.name):
                 os.unlink(temp_file.name)
+            raise download_error(e)
+
+    def _download_ranges(self, url, output_path, metadata, progress_callback=None):
+        """
+        Download file dengan request Range ke file .part yang sudah dialokasikan
+
+        Raises:
+            RangeNotSupportedError: Jika server mengabaikan header Range atau file
+                di server berubah selama download
+            DownloadError: Jika sebuah range tetap gagal setelah semua percobaan ulang.
+                File .part dan state-nya disimpan agar bisa dilanjutkan.
+        """
+        total_size = metadata['size']
+        part_path = output_path + '.part'
+        state_path = part_path + '.json'
+
+        # If-Range memastikan semua range berasal dari versi file yang sama
+        validator = metadata.get('etag')
+        if not validator or validator.startswith('W/'):
+            validator = metadata.get('last_modified')
+
+        state = None
+        if os.path.exists(part_path) and os.path.getsize(part_path) == total_size:
+            state = _DownloadState.load(state_path, metadata)
+
+        if state is not None:
+            logger.info(f"Melanjutkan download dari: {url} "
+                        f"({state.downloaded / (1024 * 1024):.1f}MB/{total_size / (1024 * 1024):.1f}MB)")
+        else:
+            connections = self.connections if total_size >= self.min_range_size else 1
+            range_size = -(-total_size // connections)
+            ranges = [(start, min(start + range_size, total_size) - 1, start)
+                      for start in range(0, total_size, range_size)]
+            state = _DownloadState(state_path, metadata, ranges)
+
+            logger.info(f"Mulai download dari: {url} ({len(ranges)} koneksi, "
+                        f"{total_size / (1024 * 1024):.1f}MB)")
+
+            with open(part_path, 'wb') as f:
+                self._preallocate(f.fileno(), total_size)
+            state.save()
+
+        pending = [i for i, (start, end, offset) in enumerate(state.ranges) if offset <= end]
+        fd = os.open(part_path, os.O_WRONLY)
+        stop = threading.Event()
+        progress = _DownloadProgress(total_size, state.downloaded, callback=progress_callback)
+
+        try:
+            if pending:
+                with ThreadPoolExecutor(max_workers=len(pending)) as executor:
+                    futures = [
+                        executor.submit(self._fetch_range, url, fd, state, index, validator, stop, progress)
+                        for index in pending
+                    ]
+                    try:
+                        for future in futures:
+                            future.result()
+                    except Exception:
+                        # Hentikan range lain secepatnya
+                        stop.set()
+                        raise
+        except RangeNotSupportedError:
+            # File di server berubah atau Range diabaikan: data yang ada tidak bisa dipakai
+            os.close(fd)
+            state.remove()
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            raise
+        except Exception:
+            os.close(fd)
+            state.save()
+            raise
+
+        os.close(fd)
+        os.replace(part_path, output_path)
+        state.remove()
+        logger.info(f"Download selesai: {output_path} ({total_size / (1024 * 1024):.2f}MB)")
+        return output_path
+
+    def _fetch_range(self, url, fd, state, index, validator, stop, progress):
+        """Download satu range ke posisinya di file, melanjutkan dari byte terakhir jika gagal"""
+        start, end, offset = state.ranges[index]
+        attempt = 0
+
+        with requests.Session() as session:
+            while offset <= end and not stop.is_set():
+                resumed_from = offset
+                headers = {'Range': f"bytes={offset}-{end}"}
+                if validator:
+                    headers['If-Range'] = validator
+
+                try:
+                    with session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+                        if response.status_code != 206:
+                            response.raise_for_status()
+                            raise RangeNotSupportedError(f"status {response.status_code} untuk range {offset}-{end}")
+
+                        for chunk in response.iter_content(chunk_size=self.chunk_size):
+                            if stop.is_set():
+                                return
+                            if not chunk:
+                                continue
+                            chunk = chunk[:end + 1 - offset]
+                            os.pwrite(fd, chunk, offset)
+                            offset += len(chunk)
+                            state.advance(index, offset)
+                            progress.add(len(chunk))
+                            if offset > end:
+                                break
+
+                    if offset <= end:
+                        raise requests.ConnectionError(f"Koneksi berakhir di byte {offset} dari range {start}-{end}")
+
+                except requests.RequestException as e:
+                    # Batas percobaan berlaku untuk kegagalan berturut-turut tanpa data baru
+                    attempt = 1 if offset > resumed_from else attempt + 1
+                    if attempt > self.range_retries:
+                        logger.error(f"Range {start}-{end} gagal: {str(e)}")
+                        raise download_error(e)
+                    delay = min(2 ** attempt, 30)
+                    logger.warning(f"Range {start}-{end} gagal di byte {offset} ({str(e)}), "
+                                   f"mencoba lagi dalam {delay} detik")
+                    time.sleep(delay)
+
+    @staticmethod
+    def _preallocate(fd, size):
+        """Alokasikan ruang file sekaligus agar tulisan paralel tidak memfragmentasi file"""
+        if hasattr(os, 'posix_fallocate'):
+            try:
+                os.posix_fallocate(fd, 0, size)
+                return
+            except OSError:
+                pass
+        os.ftruncate(fd, size)
+
+    def open_stream(self, url, peek_limit=MOOV_PEEK_LIMIT):
+        """
+        Buka download dari URL tanpa menyimpannya, untuk dikonversi sambil didownload
+
+        Bagian awal body dibaca sampai posisi atom moov terhadap mdat diketahui dan,
+        jika moov di depan, sampai moov terbaca lengkap (maksimal peek_limit byte).
+        DownloadStream.streamable bernilai True hanya jika moov ada di depan, sehingga
+        ffmpeg bisa membaca file dari pipe.
+
+        Args:
+            url (str): URL file yang akan didownload
+            peek_limit (int): Jumlah byte maksimum yang dibaca untuk pemeriksaan
+
+        Returns:
+            DownloadStream: Stream yang siap dibaca
+
+        Raises:
+            ValueError: Jika URL tidak valid atau masalah downloading
+        """
+        if not self._is_valid_url(url):
+            logger.error(f"URL tidak valid: {url}")
+            raise ValueError(f"URL tidak valid: {url}")
+
+        try:
+            logger.info(f"Membuka stream dari: {url}")
+            response = requests.get(url, stream=True, timeout=self.timeout)
+            response.raise_for_status()
+
+            chunks = response.iter_content(chunk_size=self.chunk_size)
+            prefix = bytearray()
+            while len(prefix) < peek_limit and not self._prefix_complete(prefix):
+                chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                prefix += chunk
+
+        except requests.RequestException as e:
+            logger.error(f"Error downloading file: {str(e)}")
+            if 'response' in locals():
+                response.close()
             raise ValueError(f"Gagal mendownload file: {str(e)}")
 
+        return DownloadStream(response, chunks, prefix, self._get_filename_from_url(url))
+
+    @staticmethod
+    def _prefix_complete(prefix):
+        """True jika bagian awal cukup untuk memutuskan streaming dan membaca moov"""
+        order = moov_before_mdat(prefix)
+        if order is None:
+            return False
+        if not order:
+            return True
+        try:
+            return probe_mp4_prefix(prefix) is not None
+        except MP4ProbeError:
+            return True
+
     def _is_valid_url(self, url):
         """Validasi format URL"""
         try:
@@ -114,11 +676,14 @@ class URLDownloader:
         Args:
             file_path (str): Path ke file
 
+        Struktur MP4 (box ftyp/moov/trak) dibaca tanpa mendekode media, sehingga file rusak
+        atau tanpa track audio ditolak dalam hitungan milidetik sebelum masuk ke ffmpeg.
+
         Returns:
             bool: True jika file valid
 
         Raises:
-            ValueError: Jika file bukan MP4
+            ValueError: Jika file bukan MP4, rusak, atau tidak memiliki track audio
         """
         # Cek ekstensi file
         ext = os.path.splitext(file_path)[1].lower()
@@ -136,6 +701,16 @@ class URLDownloader:
             os.remove(file_path)
             raise ValueError("File yang didownload kosong")
 
-        # Validasi tambahan bisa ditambahkan di sini, seperti memeriksa header file
+        try:
+            info = probe_mp4(file_path)
+        except MP4ProbeError as e:
+            logger.error(f"File MP4 rusak: {file_path} ({str(e)})")
+            os.remove(file_path)
+            raise ValueError(f"File MP4 rusak atau tidak lengkap: {str(e)}")
+
+        if info['audio'] is None:
+            logger.error(f"File tanpa track audio: {file_path}")
+            os.remove(file_path)
+            raise ValueError("Video has no audio track")
 
         return True
\ No newline at end of file
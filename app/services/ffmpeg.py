@@ -0,0 +1,403 @@
+import re
+import json
+import subprocess
+import threading
+from collections import deque
+from app.services.mp4_probe import MP4ProbeError, probe_mp4
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Keys written by ffmpeg's -progress output
+_PROGRESS_KEYS = {
+    'frame', 'fps', 'bitrate', 'total_size', 'out_time_us', 'out_time_ms',
+    'out_time', 'dup_frames', 'drop_frames', 'speed', 'progress'
+}
+
+_DURATION_RE = re.compile(r'Duration:\s*(\d+):(\d+):(\d+(?:\.\d+)?)')
+
+# Number of stderr lines kept for error reporting
+_STDERR_TAIL = 20
+
+# Seconds to wait for ffmpeg to exit after the stdout handler failed
+_HANDLER_ERROR_GRACE = 5
+
+
+class FFmpegError(Exception):
+    """Raised when an ffmpeg process fails"""
+
+    def __init__(self, message, returncode=None, stderr=None):
+        super().__init__(message)
+        self.returncode = returncode
+        self.stderr = stderr or []
+
+
+class FFmpegNotFoundError(FFmpegError):
+    """Raised when the ffmpeg binary cannot be executed"""
+
+
+class FFmpegTimeoutError(FFmpegError):
+    """Raised when ffmpeg is killed after exceeding its time limit"""
+
+
+class FFmpegCancelledError(FFmpegError):
+    """Raised when ffmpeg is killed because the caller cancelled the run"""
+
+
+class NoAudioStreamError(FFmpegError, ValueError):
+    """Raised when the input has no audio stream to extract"""
+
+
+class InvalidInputError(FFmpegError, ValueError):
+    """Raised when ffmpeg cannot read the input container"""
+
+
+# Ordered (pattern, exception class, message) used to map ffmpeg failures
+_ERROR_PATTERNS = [
+    ('matches no streams', NoAudioStreamError, "Video has no audio track"),
+    ('does not contain any stream', NoAudioStreamError, "Video has no audio track"),
+    ('moov atom not found', InvalidInputError, "Input file is incomplete or corrupt (moov atom not found)"),
+    ('Invalid data found when processing input', InvalidInputError, "Input file is corrupt or not a supported container"),
+    ('No such file or directory', InvalidInputError, "Input file not found"),
+]
+
+
+def map_ffmpeg_error(returncode, stderr_lines):
+    """
+    Translate a failed ffmpeg run into an exception
+
+    Args:
+        returncode (int): Exit code of the process
+        stderr_lines (list): Last lines written to stderr
+
+    Returns:
+        FFmpegError: The most specific exception for the failure
+    """
+    output = "\n".join(stderr_lines)
+    for pattern, error_class, message in _ERROR_PATTERNS:
+        if pattern in output:
+            return error_class(message, returncode, stderr_lines)
+
+    last_line = stderr_lines[-1] if stderr_lines else "no output"
+    if returncode is not None and returncode < 0:
+        return FFmpegError(f"ffmpeg terminated by signal {-returncode}", returncode, stderr_lines)
+    return FFmpegError(f"ffmpeg exited with code {returncode}: {last_line}", returncode, stderr_lines)
+
+
+def parse_duration(line):
+    """Return the duration in seconds from an ffmpeg 'Duration:' line, or None"""
+    match = _DURATION_RE.search(line)
+    if not match:
+        return None
+    hours, minutes, seconds = match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def probe_media(path, binary="ffprobe", timeout=30):
+    """
+    Read container duration and first audio stream parameters
+
+    MP4 files are probed by parsing their boxes, which takes milliseconds;
+    other files, and MP4s whose duration is not in the moov box (fragmented
+    files), are probed with ffprobe.
+
+    Args:
+        path (str): Path to the media file
+        binary (str): Path or name of the ffprobe executable
+        timeout (int): Seconds to wait for ffprobe
+
+    Returns:
+        dict: 'duration' (seconds or None) and 'audio' (dict with 'codec',
+            'sample_rate', 'channels' and 'bit_rate', or None if there is no
+            audio stream); MP4s probed from their boxes also report 'moov_at_front'
+
+    Raises:
+        FFmpegNotFoundError: If ffprobe cannot be started
+        InvalidInputError: If the file cannot be probed
+    """
+    try:
+        info = probe_mp4(path)
+        if info['duration']:
+            return info
+    except (MP4ProbeError, OSError) as e:
+        logger.debug(f"Box-level probe of {path} failed ({str(e)}), using ffprobe")
+
+    command = [
+        binary, '-v', 'error',
+        '-select_streams', 'a:0',
+        '-show_entries', 'stream=codec_name,sample_rate,channels,bit_rate:format=duration',
+        '-of', 'json', path
+    ]
+    try:
+        result = subprocess.run(command, stdin=subprocess.DEVNULL, capture_output=True, timeout=timeout)
+    except OSError as e:
+        raise FFmpegNotFoundError(f"Cannot execute {binary}: {str(e)}")
+    except subprocess.TimeoutExpired:
+        raise FFmpegTimeoutError(f"ffprobe exceeded the {timeout}s time limit")
+
+    stderr_lines = result.stderr.decode('utf-8', errors='replace').splitlines()
+    if result.returncode != 0:
+        raise InvalidInputError(stderr_lines[-1] if stderr_lines else "ffprobe failed",
+                                result.returncode, stderr_lines)
+
+    try:
+        data = json.loads(result.stdout or b'{}')
+    except ValueError:
+        raise InvalidInputError("ffprobe returned invalid output", result.returncode, stderr_lines)
+
+    def _number(value, cast):
+        try:
+            return cast(value)
+        except (TypeError, ValueError):
+            return None
+
+    audio = None
+    streams = data.get('streams') or []
+    if streams:
+        stream = streams[0]
+        audio = {
+            'codec': stream.get('codec_name'),
+            'sample_rate': _number(stream.get('sample_rate'), int),
+            'channels': _number(stream.get('channels'), int),
+            'bit_rate': _number(stream.get('bit_rate'), int),
+        }
+
+    return {
+        'duration': _number((data.get('format') or {}).get('duration'), float),
+        'audio': audio,
+    }
+
+
+class FFmpegRunner:
+    """Runs ffmpeg as a managed subprocess with progress reporting"""
+
+    def __init__(self, binary="ffmpeg", threads=0, timeout=None):
+        """
+        Initialize the runner
+
+        Args:
+            binary (str): Path or name of the ffmpeg executable
+            threads (int): Value passed to -threads (0 lets ffmpeg decide)
+            timeout (int, optional): Kill ffmpeg after this many seconds
+        """
+        self.binary = binary
+        self.threads = threads
+        self.timeout = timeout
+
+    def build_command(self, input_args, output_args):
+        """
+        Build the full ffmpeg command line
+
+        Args:
+            input_args (list): Options and -i argument for the input
+            output_args (list): Options and destination for the output
+
+        Returns:
+            list: Command line arguments
+        """
+        command = [self.binary, '-hide_banner', '-nostdin', '-nostats', '-y',
+                   '-progress', 'pipe:2']
+        command += list(input_args)
+        if self.threads:
+            command += ['-threads', str(self.threads)]
+        command += list(output_args)
+        return command
+
+    def run(self, input_args, output_args, progress_callback=None, duration=None, stdout_handler=None,
+            stdin_source=None, cancel_event=None):
+        """
+        Run ffmpeg and wait for it to finish
+
+        Args:
+            input_args (list): Options and -i argument for the input
+            output_args (list): Options and destination for the output
+            progress_callback (callable, optional): Called with a dict containing
+                'out_time' (seconds encoded so far), 'speed', 'percent' (when the
+                duration is known) and 'done'
+            duration (float, optional): Input duration in seconds. If None, it is
+                read from ffmpeg's own log output.
+            stdout_handler (callable, optional): Called with ffmpeg's stdout as a
+                binary stream when the output is written to pipe:1. It runs in the
+                calling thread and must read the stream until EOF. If it raises
+                and ffmpeg failed too, ffmpeg's error is raised instead, since it
+                explains why the handler got no usable output.
+            stdin_source (iterable, optional): Chunks of bytes written to ffmpeg's
+                stdin from a separate thread, for inputs read from pipe:0. If the
+                iterable raises, ffmpeg is killed and the error is re-raised here.
+            cancel_event (threading.Event, optional): ffmpeg is killed as soon as
+                the event is set, e.g. when a sibling process has failed
+
+        Raises:
+            FFmpegNotFoundError: If ffmpeg cannot be started
+            FFmpegTimeoutError: If the process exceeds the timeout
+            FFmpegCancelledError: If cancel_event was set before ffmpeg finished
+            FFmpegError: If ffmpeg exits with an error
+        """
+        command = self.build_command(input_args, output_args)
+        logger.debug(f"Running: {' '.join(command)}")
+
+        try:
+            process = subprocess.Popen(
+                command,
+                stdin=subprocess.PIPE if stdin_source is not None else subprocess.DEVNULL,
+                stdout=subprocess.PIPE if stdout_handler else subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+            )
+        except OSError as e:
+            raise FFmpegNotFoundError(f"Cannot execute {self.binary}: {str(e)}")
+
+        timed_out = threading.Event()
+        timer = None
+        if self.timeout:
+            def _kill():
+                timed_out.set()
+                process.kill()
+            timer = threading.Timer(self.timeout, _kill)
+            timer.daemon = True
+            timer.start()
+
+        cancelled = threading.Event()
+        finished = threading.Event()
+        watcher = None
+        if cancel_event is not None:
+            watcher = threading.Thread(
+                target=self._watch_cancel,
+                args=(process, cancel_event, finished, cancelled)
+            )
+            watcher.daemon = True
+            watcher.start()
+
+        # stderr is drained in its own thread so a full pipe never blocks ffmpeg
+        # while the caller is busy consuming stdout
+        stderr_tail = deque(maxlen=_STDERR_TAIL)
+        reader = threading.Thread(
+            target=self._read_progress,
+            args=(process.stderr, stderr_tail, progress_callback, duration)
+        )
+        reader.daemon = True
+        reader.start()
+
+        feed_errors = []
+        feeder = None
+        if stdin_source is not None:
+            feeder = threading.Thread(
+                target=self._feed_stdin,
+                args=(process, stdin_source, feed_errors)
+            )
+            feeder.daemon = True
+            feeder.start()
+
+        handler_error = None
+        handler_killed = False
+        try:
+            if stdout_handler:
+                try:
+                    stdout_handler(process.stdout)
+                except Exception as e:
+                    handler_error = e
+                    try:
+                        process.wait(timeout=_HANDLER_ERROR_GRACE)
+                    except subprocess.TimeoutExpired:
+                        # ffmpeg is still writing output nobody reads: the handler's error is the cause
+                        handler_killed = True
+                        process.kill()
+            returncode = process.wait()
+        finally:
+            if timer:
+                timer.cancel()
+            finished.set()
+            if watcher:
+                watcher.join()
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            reader.join()
+            if feeder:
+                feeder.join()
+            if process.stdout:
+                process.stdout.close()
+            process.stderr.close()
+
+        if feed_errors:
+            raise feed_errors[0]
+        if cancelled.is_set():
+            raise FFmpegCancelledError("ffmpeg was cancelled", returncode, list(stderr_tail))
+        if timed_out.is_set():
+            raise FFmpegTimeoutError(f"ffmpeg exceeded the {self.timeout}s time limit",
+                                     returncode, list(stderr_tail))
+        if returncode != 0 and not handler_killed:
+            raise map_ffmpeg_error(returncode, list(stderr_tail))
+        if handler_error is not None:
+            raise handler_error
+
+    @staticmethod
+    def _watch_cancel(process, cancel_event, finished, cancelled):
+        """Kill ffmpeg once cancel_event is set, until the run finishes"""
+        while not finished.is_set():
+            if cancel_event.wait(0.1):
+                if process.poll() is None:
+                    cancelled.set()
+                    process.kill()
+                return
+
+    @staticmethod
+    def _feed_stdin(process, source, errors):
+        """Copy chunks from source to ffmpeg's stdin"""
+        try:
+            for chunk in source:
+                process.stdin.write(chunk)
+        except BrokenPipeError:
+            # ffmpeg stopped reading; its exit status reports why
+            pass
+        except Exception as e:
+            # A truncated input must not look like a complete conversion
+            errors.append(e)
+            process.kill()
+        finally:
+            try:
+                process.stdin.close()
+            except OSError:
+                pass
+
+    def _read_progress(self, stream, stderr_tail, progress_callback, duration):
+        """Consume ffmpeg's stderr, separating progress blocks from log lines"""
+        block = {}
+        for raw_line in stream:
+            line = raw_line.decode('utf-8', errors='replace').strip()
+            if not line:
+                continue
+
+            key, sep, value = line.partition('=')
+            if sep and (key in _PROGRESS_KEYS or key.startswith('stream_')):
+                block[key] = value
+                if key == 'progress':
+                    if progress_callback:
+                        try:
+                            progress_callback(self._progress_info(block, duration))
+                        except Exception as e:
+                            # Never let a reporting error stop stderr from being drained
+                            logger.warning(f"Progress callback failed: {str(e)}")
+                    block = {}
+                continue
+
+            stderr_tail.append(line)
+            if duration is None:
+                duration = parse_duration(line)
+
+    @staticmethod
+    def _progress_info(block, duration):
+        """Turn one block of -progress output into a progress dict"""
+        try:
+            out_time = int(block.get('out_time_us') or block.get('out_time_ms') or 0) / 1000000
+        except ValueError:
+            out_time = 0.0
+        out_time = max(out_time, 0.0)
+
+        info = {
+            'out_time': out_time,
+            'speed': block.get('speed', '').rstrip('x').strip() or None,
+            'done': block.get('progress') == 'end',
+        }
+        if duration:
+            info['percent'] = 100.0 if info['done'] else min(out_time / duration * 100, 99.9)
+        return info
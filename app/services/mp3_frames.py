@@ -0,0 +1,434 @@
+import os
+from collections import namedtuple
+
+# Bitrate tables in kbps, indexed by bitrate index (0 = free format, 15 = invalid)
+_BITRATES = {
+    (1, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (1, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (1, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (2, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (2, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (2, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+
+# Sample rates in Hz, indexed by the 2-bit version field (01 is reserved)
+_SAMPLE_RATES = {
+    0b00: (11025, 12000, 8000),   # MPEG 2.5
+    0b10: (22050, 24000, 16000),  # MPEG 2
+    0b11: (44100, 48000, 32000),  # MPEG 1
+}
+
+# How far to look for the next frame sync before giving up on the file
+RESYNC_WINDOW = 64 * 1024
+
+# Size of the blocks read from disk while scanning
+READ_BLOCK_SIZE = 1024 * 1024
+
+FrameHeader = namedtuple('FrameHeader', [
+    'version',      # 1 for MPEG 1, 2 for MPEG 2 and MPEG 2.5
+    'layer',        # 1, 2 or 3
+    'bitrate',      # bits per second
+    'sample_rate',  # Hz
+    'samples',      # samples per frame
+    'channels',     # 1 or 2
+    'size',         # frame length in bytes, header included
+])
+
+Frame = namedtuple('Frame', ['offset', 'header'])
+
+Segment = namedtuple('Segment', [
+    'start',         # byte offset of the first frame
+    'end',           # byte offset just past the last frame
+    'start_sample',  # position of the first sample in the whole stream
+    'samples',       # number of samples in the segment
+    'sample_rate',
+])
+
+
+class MP3FormatError(ValueError):
+    """Raised when a file cannot be parsed as an MPEG audio bitstream"""
+
+
+def parse_frame_header(data, pos=0):
+    """
+    Parse a 4-byte MPEG audio frame header
+
+    Args:
+        data (bytes): Buffer containing the header
+        pos (int): Offset of the header within the buffer
+
+    Returns:
+        FrameHeader: The decoded header, or None if the bytes are not a valid header
+    """
+    if len(data) - pos < 4:
+        return None
+
+    b1, b2, b3 = data[pos + 1], data[pos + 2], data[pos + 3]
+    if data[pos] != 0xFF or (b1 & 0xE0) != 0xE0:
+        return None
+
+    version_bits = (b1 >> 3) & 0x03
+    layer_bits = (b1 >> 1) & 0x03
+    bitrate_index = (b2 >> 4) & 0x0F
+    sample_rate_index = (b2 >> 2) & 0x03
+
+    if version_bits == 0b01 or layer_bits == 0 or sample_rate_index == 3:
+        return None
+    # Free format (0) has no computable frame length, 15 is invalid
+    if bitrate_index in (0, 15):
+        return None
+
+    version = 1 if version_bits == 0b11 else 2
+    layer = 4 - layer_bits
+    bitrate = _BITRATES[(version, layer)][bitrate_index] * 1000
+    sample_rate = _SAMPLE_RATES[version_bits][sample_rate_index]
+    padding = (b2 >> 1) & 0x01
+    channels = 1 if ((b3 >> 6) & 0x03) == 0b11 else 2
+
+    if layer == 1:
+        samples = 384
+        size = (12 * bitrate // sample_rate + padding) * 4
+    elif layer == 2 or version == 1:
+        samples = 1152
+        size = 144 * bitrate // sample_rate + padding
+    else:
+        samples = 576
+        size = 72 * bitrate // sample_rate + padding
+
+    return FrameHeader(version, layer, bitrate, sample_rate, samples, channels, size)
+
+
+def is_info_frame(data, header):
+    """
+    Check whether a frame carries a Xing/Info or VBRI tag instead of audio
+
+    Args:
+        data (bytes): The complete frame, header included
+        header (FrameHeader): The parsed header of the frame
+
+    Returns:
+        bool: True if the frame is a metadata frame
+    """
+    if header.version == 1:
+        side_info = 17 if header.channels == 1 else 32
+    else:
+        side_info = 9 if header.channels == 1 else 17
+
+    xing_pos = 4 + side_info
+    if data[xing_pos:xing_pos + 4] in (b'Xing', b'Info'):
+        return True
+
+    return data[36:40] == b'VBRI'
+
+
+def id3v2_tag_size(data):
+    """Return the total size of an ID3v2 tag at the start of data, or 0"""
+    if len(data) < 10 or data[:3] != b'ID3':
+        return 0
+
+    size_bytes = data[6:10]
+    if any(b & 0x80 for b in size_bytes):
+        return 0
+
+    size = 0
+    for b in size_bytes:
+        size = (size << 7) | b
+
+    # Footer present flag adds another 10 bytes
+    footer = 10 if data[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def _audio_bounds(f, file_size):
+    """
+    Find the byte range of the audio data, skipping leading ID3v2 tags
+    and trailing ID3v1/APEv2 tags
+
+    Returns:
+        tuple: (start, end) byte offsets
+    """
+    start = 0
+    while True:
+        f.seek(start)
+        tag_size = id3v2_tag_size(f.read(10))
+        if not tag_size:
+            break
+        start += tag_size
+
+    end = file_size
+    if end - start >= 128:
+        f.seek(end - 128)
+        if f.read(3) == b'TAG':
+            end -= 128
+
+    if end - start >= 32:
+        f.seek(end - 32)
+        footer = f.read(32)
+        if footer[:8] == b'APETAGEX':
+            tag_size = int.from_bytes(footer[12:16], 'little')
+            has_header = int.from_bytes(footer[20:24], 'little') & 0x80000000
+            end -= tag_size + (32 if has_header else 0)
+
+    return start, max(start, end)
+
+
+def _same_stream(a, b):
+    """Check that two headers belong to the same elementary stream"""
+    return (a.version, a.layer, a.sample_rate) == (b.version, b.layer, b.sample_rate)
+
+
+def iter_frames(mp3_path):
+    """
+    Iterate over the audio frames of an MP3 file without decoding them
+
+    Only frame headers are inspected; the file is read in fixed-size blocks so
+    memory use does not depend on the file size. A leading Xing/Info/VBRI frame
+    is skipped because its frame count and seek table describe the whole file.
+
+    Args:
+        mp3_path (str): Path to the MP3 file
+
+    Yields:
+        Frame: Offset and header of each audio frame, in file order
+
+    Raises:
+        MP3FormatError: If the file is not a parseable MPEG audio bitstream
+    """
+    file_size = os.path.getsize(mp3_path)
+
+    with open(mp3_path, 'rb') as f:
+        start, end = _audio_bounds(f, file_size)
+
+        buf = b''
+        buf_offset = start  # file offset of buf[0]
+        pos = start
+        first = True
+        reference = None
+
+        while pos < end:
+            # Keep at least one frame plus the next header in memory
+            rel = pos - buf_offset
+            if len(buf) - rel < 8192 and buf_offset + len(buf) < end:
+                f.seek(pos)
+                buf = f.read(min(READ_BLOCK_SIZE, end - pos))
+                buf_offset = pos
+                rel = 0
+
+            header = parse_frame_header(buf, rel)
+
+            if header is None or (reference is not None and not _same_stream(header, reference)):
+                if end - pos < 4:
+                    # Trailing bytes too short to hold a frame
+                    break
+                next_pos = _resync(f, pos, end, reference)
+                if next_pos is None:
+                    if reference is not None and end - pos <= RESYNC_WINDOW:
+                        # Unknown trailing data (e.g. Lyrics3 tag) after valid audio
+                        break
+                    raise MP3FormatError(f"Lost MP3 frame sync at offset {pos}")
+                pos = next_pos
+                continue
+
+            if pos + header.size > end:
+                # Truncated final frame
+                break
+
+            if first:
+                # Require a second valid frame right after the first one so that
+                # arbitrary data starting with 0xFFE is not mistaken for MP3
+                f.seek(pos + header.size)
+                following = parse_frame_header(f.read(4))
+                if pos + header.size < end and (following is None or not _same_stream(header, following)):
+                    raise MP3FormatError(f"No valid MP3 frame sequence at offset {pos}")
+
+                reference = header
+                first = False
+                frame_data = buf[rel:rel + header.size]
+                if len(frame_data) < header.size:
+                    f.seek(pos)
+                    frame_data = f.read(header.size)
+                if is_info_frame(frame_data, header):
+                    pos += header.size
+                    continue
+
+            yield Frame(pos, header)
+            pos += header.size
+
+
+def _resync(f, pos, end, reference):
+    """
+    Search for the next frame header after pos
+
+    A candidate is accepted only when the frame following it is also valid.
+
+    Returns:
+        int: Offset of the next frame, or None if nothing was found in the window
+    """
+    f.seek(pos + 1)
+    window = f.read(min(RESYNC_WINDOW, end - pos - 1))
+
+    i = window.find(b'\xff')
+    while i != -1:
+        header = parse_frame_header(window, i)
+        if header is not None and (reference is None or _same_stream(header, reference)):
+            candidate = pos + 1 + i
+            f.seek(candidate + header.size)
+            following = parse_frame_header(f.read(4))
+            if candidate + header.size >= end or (following is not None and _same_stream(header, following)):
+                return candidate
+        i = window.find(b'\xff', i + 1)
+
+    return None
+
+
+def iter_stream_frames(stream, read_size=256 * 1024):
+    """
+    Iterate over the audio frames of an MP3 bitstream read from a pipe
+
+    Leading ID3v2 tags and a Xing/Info/VBRI frame are skipped, as are any
+    bytes between frames that do not form a valid header.
+
+    Args:
+        stream: Binary file-like object positioned at the start of the MP3 data
+        read_size (int): Size of each read from the stream
+
+    Yields:
+        tuple: (FrameHeader, bytes) for each audio frame, in stream order
+    """
+    buf = b''
+    pos = 0
+    eof = False
+    first = True
+
+    def _fill(needed):
+        nonlocal buf, pos, eof
+        while not eof and len(buf) - pos < needed:
+            data = stream.read(read_size)
+            if not data:
+                eof = True
+                break
+            buf = buf[pos:] + data
+            pos = 0
+
+    _fill(10)
+    tag_size = id3v2_tag_size(buf[pos:pos + 10])
+    while tag_size:
+        _fill(tag_size + 10)
+        pos += min(tag_size, len(buf) - pos)
+        tag_size = id3v2_tag_size(buf[pos:pos + 10])
+
+    while True:
+        _fill(4)
+        header = parse_frame_header(buf, pos)
+        if header is None:
+            if len(buf) - pos < 4:
+                return
+            next_sync = buf.find(b'\xff', pos + 1)
+            pos = next_sync if next_sync != -1 else len(buf)
+            continue
+
+        _fill(header.size)
+        if len(buf) - pos < header.size:
+            return
+
+        data = buf[pos:pos + header.size]
+        pos += header.size
+
+        if first:
+            first = False
+            if is_info_frame(data, header):
+                continue
+
+        yield header, data
+
+
+def plan_segments(mp3_path, max_size_bytes):
+    """
+    Group the frames of an MP3 file into consecutive segments of at most max_size_bytes
+
+    Args:
+        mp3_path (str): Path to the MP3 file
+        max_size_bytes (int): Upper bound for the size of each segment
+
+    Returns:
+        list: List of Segment tuples covering all audio frames
+
+    Raises:
+        MP3FormatError: If the file is not a parseable MPEG audio bitstream
+    """
+    segments = []
+    seg_start = None
+    seg_end = None
+    seg_first_sample = 0
+    seg_samples = 0
+    total_samples = 0
+    sample_rate = None
+
+    for frame in iter_frames(mp3_path):
+        header = frame.header
+        sample_rate = header.sample_rate
+        frame_end = frame.offset + header.size
+
+        if seg_start is not None and frame_end - seg_start > max_size_bytes:
+            segments.append(Segment(seg_start, seg_end, seg_first_sample, seg_samples, sample_rate))
+            seg_start = None
+
+        if seg_start is None:
+            seg_start = frame.offset
+            seg_first_sample = total_samples
+            seg_samples = 0
+
+        seg_end = frame_end
+        seg_samples += header.samples
+        total_samples += header.samples
+
+    if seg_start is None:
+        raise MP3FormatError(f"No MP3 audio frames found in {mp3_path}")
+
+    segments.append(Segment(seg_start, seg_end, seg_first_sample, seg_samples, sample_rate))
+    return segments
+
+
+def copy_range(src, dst, start, length, block_size=READ_BLOCK_SIZE, zero_copy=True):
+    """
+    Copy length bytes starting at start from one open file to another
+
+    Uses copy_file_range where the platform supports it so the data does not
+    pass through user space, and falls back to a buffered read/write loop.
+
+    Args:
+        src: Source file object opened in binary mode
+        dst: Destination file object opened in binary mode
+        start (int): Offset in the source file
+        length (int): Number of bytes to copy
+        block_size (int): Buffer size for the fallback loop
+        zero_copy (bool): Allow copy_file_range; disable it when dst has to see
+            the data, e.g. to hash it while writing
+    """
+    offset = start
+    remaining = length
+    if zero_copy and hasattr(os, 'copy_file_range'):
+        try:
+            dst.flush()
+            while remaining > 0:
+                copied = os.copy_file_range(src.fileno(), dst.fileno(), remaining, offset)
+                if copied == 0:
+                    break
+                offset += copied
+                remaining -= copied
+        except OSError:
+            # Not supported for this pair of files (e.g. cross-device on older kernels);
+            # the loop below copies whatever copy_file_range did not
+            pass
+        dst.seek(0, os.SEEK_END)
+        if remaining == 0:
+            return
+
+    src.seek(offset)
+    while remaining > 0:
+        chunk = src.read(min(block_size, remaining))
+        if not chunk:
+            raise IOError(f"Unexpected end of file while copying at offset {offset}")
+        dst.write(chunk)
+        offset += len(chunk)
+        remaining -= len(chunk)
@@ -0,0 +1,348 @@
+import os
+import sys
+import struct
+from array import array
+
+# Top-level boxes that may come first in an MP4/QuickTime file
+LEADING_BOXES = {b'ftyp', b'moov', b'mdat', b'free', b'skip', b'wide', b'pnot', b'uuid'}
+
+# Larger moov boxes are treated as corrupt rather than read into memory
+MAX_MOOV_SIZE = 256 * 1024 * 1024
+
+# Sample entry formats, as ffprobe names the codecs
+SAMPLE_ENTRY_CODECS = {
+    b'mp4a': 'aac',
+    b'.mp3': 'mp3',
+    b'ac-3': 'ac3',
+    b'ec-3': 'eac3',
+    b'Opus': 'opus',
+    b'fLaC': 'flac',
+    b'alac': 'alac',
+    b'samr': 'amr_nb',
+    b'sawb': 'amr_wb',
+    b'sowt': 'pcm_s16le',
+    b'twos': 'pcm_s16be',
+}
+
+# MPEG-4 objectTypeIndication values found in the esds of an 'mp4a' entry
+OBJECT_TYPE_CODECS = {
+    0x40: 'aac',
+    0x66: 'aac',
+    0x67: 'aac',
+    0x68: 'aac',
+    0x69: 'mp3',
+    0x6B: 'mp3',
+    0xA5: 'ac3',
+    0xA6: 'eac3',
+}
+
+# Sampling frequencies by AudioSpecificConfig index
+AAC_SAMPLE_RATES = (96000, 88200, 64000, 48000, 44100, 32000, 24000, 22050, 16000, 12000, 11025, 8000, 7350)
+
+
+class MP4ProbeError(ValueError):
+    """Raised when a file is not a well-formed MP4"""
+
+
+def probe_mp4(path):
+    """
+    Read duration and first audio track parameters from the boxes of an MP4 file
+
+    Only the top-level box headers and the moov box are read, so the probe
+    takes milliseconds regardless of the size of the media data.
+
+    Args:
+        path (str): Path to the MP4 file
+
+    Returns:
+        dict: 'duration' (seconds or None), 'audio' (dict with 'codec',
+            'sample_rate', 'channels' and 'bit_rate', or None if there is no
+            audio track) and 'moov_at_front' (True if the moov box precedes
+            the media data, so the file can be demuxed from a pipe)
+
+    Raises:
+        MP4ProbeError: If the file is not an MP4, is truncated or has no moov box
+    """
+    file_size = os.path.getsize(path)
+    moov = None
+    moov_at_front = None
+    with open(path, 'rb') as f:
+        pos = 0
+        while pos < file_size:
+            f.seek(pos)
+            box_type, header_size, size = _box_header(f.read(16), pos, file_size)
+            if pos == 0 and box_type not in LEADING_BOXES:
+                raise MP4ProbeError("Not an MP4 file")
+            if box_type == b'mdat' and moov_at_front is None:
+                moov_at_front = False
+            elif box_type == b'moov' and moov is None:
+                if size > MAX_MOOV_SIZE:
+                    raise MP4ProbeError(f"moov box of {size} bytes is too large")
+                f.seek(pos + header_size)
+                moov = f.read(size - header_size)
+                if moov_at_front is None:
+                    moov_at_front = True
+            pos += size
+
+    if moov is None:
+        raise MP4ProbeError("No moov box")
+    return dict(_parse_moov(moov), moov_at_front=moov_at_front)
+
+
+def probe_mp4_prefix(data, file_size=None):
+    """
+    Probe an MP4 from the first bytes of the file, e.g. the start of a download
+
+    Args:
+        data (bytes): Leading bytes of the file
+        file_size (int, optional): Size of the whole file (e.g. Content-Length);
+            boxes in data that extend past it mark the file as truncated
+
+    Returns:
+        dict: Same as probe_mp4() with 'moov_at_front' True, or None if data
+            does not contain a complete moov box before the media data
+
+    Raises:
+        MP4ProbeError: If the data is not the start of an MP4 file or the file is truncated
+    """
+    info = None
+    pos = 0
+    while pos + 8 <= len(data):
+        try:
+            box_type, header_size, size = _box_header(data[pos:pos + 16], pos, file_size)
+        except MP4ProbeError:
+            if file_size is not None and pos + 16 <= len(data):
+                raise
+            break
+        if pos == 0 and box_type not in LEADING_BOXES:
+            raise MP4ProbeError("Not an MP4 file")
+        if info is None and (box_type == b'mdat' or size is None):
+            return None
+        if box_type == b'moov' and info is None:
+            if pos + size > len(data):
+                return None
+            info = dict(_parse_moov(bytes(data[pos + header_size:pos + size])), moov_at_front=True)
+            if file_size is None:
+                break
+        if size is None:
+            break
+        pos += size
+    return info
+
+
+def _box_header(header, pos, end):
+    """
+    Decode a box header
+
+    Args:
+        header (bytes): Up to 16 bytes starting at the box
+        pos (int): Offset of the box
+        end (int): Offset of the end of the enclosing data, or None if unknown
+
+    Returns:
+        tuple: (type, header size, box size); the box size is None for a box
+            that runs to an unknown end
+
+    Raises:
+        MP4ProbeError: If the header is invalid or the box exceeds end
+    """
+    if len(header) < 8:
+        raise MP4ProbeError(f"Truncated box header at offset {pos}")
+    size, box_type = struct.unpack('>I4s', header[:8])
+    header_size = 8
+    if size == 1:
+        if len(header) < 16:
+            raise MP4ProbeError(f"Truncated box header at offset {pos}")
+        size = struct.unpack('>Q', header[8:16])[0]
+        header_size = 16
+    elif size == 0:
+        # The box runs to the end of the file
+        size = end - pos if end is not None else None
+        return box_type, header_size, size
+
+    if size < header_size:
+        raise MP4ProbeError(f"Invalid size of '{box_type.decode('latin-1')}' box at offset {pos}")
+    if end is not None and pos + size > end:
+        raise MP4ProbeError(f"'{box_type.decode('latin-1')}' box at offset {pos} extends past the end of the file")
+    return box_type, header_size, size
+
+
+def _children(data, start, end):
+    """Yield (type, payload start, end) of the boxes between start and end"""
+    pos = start
+    while pos + 8 <= end:
+        box_type, header_size, size = _box_header(data[pos:pos + 16], pos, end)
+        yield box_type, pos + header_size, pos + size
+        pos += size
+
+
+def _find(data, start, end, *path):
+    """Payload bounds of the first box at path below start..end, or None"""
+    for box_type in path:
+        for child_type, child_start, child_end in _children(data, start, end):
+            if child_type == box_type:
+                start, end = child_start, child_end
+                break
+        else:
+            return None
+    return start, end
+
+
+def _parse_moov(moov):
+    """Duration and first audio track of a moov payload"""
+    duration = None
+    audio = None
+    try:
+        for box_type, start, end in _children(moov, 0, len(moov)):
+            if box_type == b'mvhd':
+                duration = _media_duration(moov, start)
+            elif box_type == b'trak' and audio is None:
+                audio = _parse_audio_track(moov, start, end)
+    except (struct.error, IndexError):
+        raise MP4ProbeError("Malformed moov box")
+    return {'duration': duration, 'audio': audio}
+
+
+def _media_duration(data, start):
+    """Duration in seconds from an mvhd or mdhd payload, None if unset"""
+    if data[start] == 1:
+        timescale, duration = struct.unpack('>IQ', data[start + 20:start + 32])
+        unset = 0xFFFFFFFFFFFFFFFF
+    else:
+        timescale, duration = struct.unpack('>II', data[start + 12:start + 20])
+        unset = 0xFFFFFFFF
+    if not timescale or not duration or duration == unset:
+        return None
+    return duration / timescale
+
+
+def _parse_audio_track(data, start, end):
+    """Audio parameters of a trak payload, or None if it is not a sound track"""
+    hdlr = _find(data, start, end, b'mdia', b'hdlr')
+    if hdlr is None or data[hdlr[0] + 8:hdlr[0] + 12] != b'soun':
+        return None
+
+    mdhd = _find(data, start, end, b'mdia', b'mdhd')
+    duration = _media_duration(data, mdhd[0]) if mdhd else None
+    stbl = _find(data, start, end, b'mdia', b'minf', b'stbl')
+    if stbl is None:
+        raise MP4ProbeError("Sound track without sample table")
+
+    stsd = _find(data, stbl[0], stbl[1], b'stsd')
+    if stsd is None or struct.unpack('>I', data[stsd[0] + 4:stsd[0] + 8])[0] == 0:
+        raise MP4ProbeError("Sound track without sample description")
+    audio = _parse_sample_entry(data, stsd[0] + 8, stsd[1])
+
+    if not audio['bit_rate'] and duration:
+        stsz = _find(data, stbl[0], stbl[1], b'stsz')
+        if stsz is not None:
+            audio['bit_rate'] = round(_total_sample_size(data, stsz[0]) * 8 / duration) or None
+    if not audio['sample_rate'] and mdhd:
+        audio['sample_rate'] = struct.unpack('>I', data[mdhd[0] + (20 if data[mdhd[0]] == 1 else 12):][:4])[0]
+    return audio
+
+
+def _parse_sample_entry(data, start, end):
+    """Codec, sample rate, channels and declared bitrate of the first audio sample entry"""
+    entry_type, header_size, size = _box_header(data[start:start + 16], start, end)
+    body = start + header_size
+    version = struct.unpack('>H', data[body + 8:body + 10])[0]
+    channels, = struct.unpack('>H', data[body + 16:body + 18])
+    sample_rate = struct.unpack('>I', data[body + 24:body + 28])[0] >> 16
+    children = body + 28
+
+    if version == 1:
+        children += 16
+    elif version == 2:
+        # QuickTime v2 entries carry the real rate as a double and the channel count after it
+        sample_rate = round(struct.unpack('>d', data[body + 32:body + 40])[0])
+        channels = struct.unpack('>I', data[body + 40:body + 44])[0]
+        children += 36
+
+    codec = SAMPLE_ENTRY_CODECS.get(entry_type, entry_type.decode('latin-1').strip())
+    bit_rate = None
+    if entry_type == b'mp4a':
+        esds = _find(data, children, start + size, b'esds')
+        if esds is not None:
+            object_type, bit_rate, config = _parse_esds(data[esds[0]:esds[1]])
+            codec = OBJECT_TYPE_CODECS.get(object_type, codec)
+            if config and (not sample_rate or not channels):
+                sample_rate = sample_rate or config[0]
+                channels = channels or config[1]
+
+    return {
+        'codec': codec,
+        'sample_rate': sample_rate or None,
+        'channels': channels or None,
+        'bit_rate': bit_rate or None,
+    }
+
+
+def _parse_esds(esds):
+    """
+    Decode the ES descriptor of an 'mp4a' entry
+
+    Returns:
+        tuple: (objectTypeIndication, average bitrate, (sample rate, channels)
+            from the AudioSpecificConfig or None)
+    """
+    pos = 4
+    object_type = None
+    bit_rate = None
+    config = None
+    while pos < len(esds):
+        tag = esds[pos]
+        pos += 1
+        length = 0
+        for _ in range(4):
+            byte = esds[pos]
+            pos += 1
+            length = (length << 7) | (byte & 0x7F)
+            if not byte & 0x80:
+                break
+
+        if tag == 0x03:
+            flags = esds[pos + 2]
+            pos += 3
+            if flags & 0x80:
+                pos += 2
+            if flags & 0x40:
+                pos += 1 + esds[pos]
+            if flags & 0x20:
+                pos += 2
+            # The decoder config descriptor is nested inside
+            continue
+        if tag == 0x04:
+            object_type = esds[pos]
+            bit_rate = struct.unpack('>I', esds[pos + 9:pos + 13])[0]
+            pos += 13
+            continue
+        if tag == 0x05 and length >= 2:
+            config = _audio_specific_config(esds[pos:pos + length])
+        pos += length
+    return object_type, bit_rate, config
+
+
+def _audio_specific_config(config):
+    """(sample rate, channels) from an MPEG-4 AudioSpecificConfig"""
+    bits = int.from_bytes(config[:5].ljust(5, b'\0'), 'big')
+    index = (bits >> 31) & 0x0F
+    if index == 0x0F:
+        sample_rate = (bits >> 7) & 0xFFFFFF
+        channels = (bits >> 3) & 0x0F
+    else:
+        sample_rate = AAC_SAMPLE_RATES[index] if index < len(AAC_SAMPLE_RATES) else None
+        channels = (bits >> 27) & 0x0F
+    return sample_rate, channels
+
+
+def _total_sample_size(data, start):
+    """Sum of the sample sizes in an stsz payload"""
+    sample_size, count = struct.unpack('>II', data[start + 4:start + 12])
+    if sample_size:
+        return sample_size * count
+    sizes = array('I')
+    sizes.frombytes(data[start + 12:start + 12 + count * 4])
+    if sys.byteorder == 'little':
+        sizes.byteswap()
+    return sum(sizes)
@@ -0,0 +1,325 @@
+import io
+import os
+import math
+import threading
+from collections import namedtuple
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from app.services.ffmpeg import FFmpegRunner, probe_media
+from app.services.mp3_frames import iter_stream_frames, plan_segments, copy_range
+from app.utils.file_utils import HashingFile
+from app.utils.logger import get_logger
+
+# Samples of delay LAME adds in front of the audio (576 + 529 decoder delay)
+ENCODER_DELAY = 1105
+
+# Frames encoded and discarded before each slice so it starts with a warm encoder
+PREROLL_FRAMES = 40
+
+Slice = namedtuple('Slice', [
+    'part',         # index of the part the slice belongs to
+    'first_frame',  # index of the first output frame of the slice
+    'frames',       # number of frames to keep, None for "until the end"
+    'path',         # file the slice is written to
+])
+
+
+def parse_bitrate(bitrate):
+    """Convert an ffmpeg bitrate string such as '192k' to bits per second"""
+    value = str(bitrate).strip().lower()
+    if value.endswith('k'):
+        return int(float(value[:-1]) * 1000)
+    return int(value)
+
+
+class ParallelMP3Encoder:
+    """Service for encoding one long input into MP3 parts on several ffmpeg processes at once"""
+
+    def __init__(self, bitrate="192k", sample_rate=44100, workers=2, max_size_mb=25,
+                 ffmpeg_binary="ffmpeg", ffprobe_binary="ffprobe", timeout=None):
+        """
+        Initialize the encoder
+
+        Args:
+            bitrate (str): Constant bitrate for the MP3 parts (e.g. '192k')
+            sample_rate (int): Sample rate in Hz
+            workers (int): Number of ffmpeg processes to run at the same time
+            max_size_mb (int): Maximum size in MB for each part
+            ffmpeg_binary (str): Path or name of the ffmpeg executable
+            ffprobe_binary (str): Path or name of the ffprobe executable
+            timeout (int, optional): Abort a slice after this many seconds
+        """
+        self.bitrate = bitrate
+        self.sample_rate = sample_rate
+        self.workers = max(1, workers)
+        self.max_size_bytes = max_size_mb * 1024 * 1024
+        self.ffprobe_binary = ffprobe_binary
+        # Each slice gets one encoder thread; parallelism comes from the slices
+        self.runner = FFmpegRunner(binary=ffmpeg_binary, threads=1, timeout=timeout)
+        self.samples_per_frame = 1152 if sample_rate >= 32000 else 576
+        self.logger = get_logger(__name__)
+
+    def encode(self, mp4_path, work_folder, output_folder, base_filename, duration=None, progress_callback=None,
+               parts=None):
+        """
+        Encode an MP4's audio into size-bounded MP3 parts using several processes
+
+        The output frame sequence is cut into slices that are encoded
+        independently. Every slice starts encoding PREROLL_FRAMES early and
+        drops those frames, so the encoder delay never lands inside the stitched
+        stream, and the bit reservoir is disabled so each frame decodes on its
+        own. Slice boundaries follow part boundaries; when there are fewer parts
+        than workers, each part is built from several slices joined by byte copy.
+
+        Args:
+            mp4_path (str): Path to the MP4 file
+            work_folder (str): Scratch directory on the same volume as output_folder
+            output_folder (str): Directory to save the parts
+            base_filename (str): Base name for the parts
+            duration (float, optional): Input duration in seconds; probed if None
+            progress_callback (callable, optional): Receives combined progress dicts
+            parts (PartLog, optional): Receives the size, checksums and duration
+                of each part, computed while the parts are written
+
+        Returns:
+            list: List of paths to the MP3 parts
+
+        Raises:
+            Exception: For any conversion errors
+        """
+        if not os.path.exists(mp4_path):
+            raise IOError(f"Input file not found: {mp4_path}")
+
+        if duration is None:
+            duration = probe_media(mp4_path, binary=self.ffprobe_binary).get('duration')
+        if not duration:
+            raise ValueError(f"Cannot determine duration of {mp4_path}")
+
+        os.makedirs(work_folder, exist_ok=True)
+        os.makedirs(output_folder, exist_ok=True)
+
+        slices = self._plan(duration, work_folder, base_filename)
+        self.logger.info(f"Encoding {duration:.0f}s of audio as {len(slices)} slices on {self.workers} workers")
+
+        progress = _ProgressAggregator(len(slices), duration, progress_callback)
+        cancel = threading.Event()
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                futures = [
+                    executor.submit(self._encode_slice, mp4_path, s, progress.reporter(i), cancel)
+                    for i, s in enumerate(slices)
+                ]
+                wait(futures, return_when=FIRST_EXCEPTION)
+                failed = next((f for f in futures if f.done() and f.exception() is not None), None)
+                if failed is not None:
+                    # One failed slice fails the whole encode: kill the others instead of waiting for them
+                    cancel.set()
+                    for future in futures:
+                        future.cancel()
+                    raise failed.exception()
+                written = {s.path: future.result() for s, future in zip(slices, futures)}
+
+            output_files = self._assemble(slices, output_folder, base_filename, written, parts)
+            progress.finish()
+            return output_files
+
+        except Exception as e:
+            self.logger.error(f"Error during parallel conversion: {str(e)}")
+            for s in slices:
+                if os.path.exists(s.path):
+                    os.remove(s.path)
+            raise Exception(f"Conversion failed: {str(e)}")
+
+    def _plan(self, duration, work_folder, base_filename):
+        """Cut the expected output frames into slices aligned with part boundaries"""
+        spf = self.samples_per_frame
+        total_frames = math.ceil((duration * self.sample_rate + ENCODER_DELAY) / spf) + 1
+
+        # Largest CBR frame (with padding) at this bitrate and sample rate
+        frame_bytes = spf // 8 * parse_bitrate(self.bitrate) // self.sample_rate + 1
+        frames_per_part = max(1, self.max_size_bytes // frame_bytes)
+
+        part_count = math.ceil(total_frames / frames_per_part)
+        pieces_per_part = max(1, math.ceil(self.workers / part_count))
+
+        slices = []
+        for part in range(part_count):
+            part_start = part * frames_per_part
+            length = min(frames_per_part, total_frames - part_start)
+            pieces = min(pieces_per_part, length)
+            for j in range(pieces):
+                first = part_start + length * j // pieces
+                last = part_start + length * (j + 1) // pieces
+                path = os.path.join(work_folder, f"{base_filename}_slice{len(slices) + 1}.mp3")
+                slices.append(Slice(part, first, last - first, path))
+
+        # The duration is an estimate, so let the final slice run to the end of the input
+        slices[-1] = slices[-1]._replace(frames=None)
+        return slices
+
+    def _encode_slice(self, mp4_path, slc, progress_callback, cancel_event=None):
+        """
+        Encode one slice, keeping only its own frames
+
+        Args:
+            mp4_path (str): Path to the MP4 file
+            slc (Slice): Slice to encode
+            progress_callback (callable): Receives the progress of this slice
+            cancel_event (threading.Event, optional): Kills the encoder when set
+
+        Returns:
+            tuple: (HashingFile the slice was written through, samples written)
+        """
+        spf = self.samples_per_frame
+        start_frame = max(0, slc.first_frame - PREROLL_FRAMES)
+        skip = slc.first_frame - start_frame
+
+        input_args = []
+        if start_frame:
+            input_args += ['-ss', f"{start_frame * spf / self.sample_rate:.6f}"]
+        input_args += ['-vn', '-sn', '-dn', '-i', mp4_path]
+
+        output_args = [
+            '-map', '0:a:0',
+            '-c:a', 'libmp3lame',
+            '-b:a', self.bitrate,
+            '-ar', str(self.sample_rate),
+            # Without the bit reservoir no frame depends on data in the previous one,
+            # so frames from different slices can be joined safely
+            '-reservoir', '0',
+        ]
+        if slc.frames is not None:
+            encode_frames = skip + slc.frames + 2
+            output_args += ['-t', f"{encode_frames * spf / self.sample_rate:.6f}"]
+        output_args += ['-write_xing', '0', '-id3v2_version', '0', '-f', 'mp3', 'pipe:1']
+
+        result = []
+
+        def _consume(stream):
+            index = 0
+            samples = 0
+            raw = HashingFile(slc.path, 'wb')
+            with io.BufferedWriter(raw) as f:
+                for header, data in iter_stream_frames(stream):
+                    if index >= skip and (slc.frames is None or index < skip + slc.frames):
+                        f.write(data)
+                        samples += header.samples
+                    index += 1
+            result[:] = [raw, samples]
+
+        self.runner.run(input_args, output_args, progress_callback=progress_callback, stdout_handler=_consume,
+                        cancel_event=cancel_event)
+        return tuple(result)
+
+    def _assemble(self, slices, output_folder, base_filename, written, parts=None):
+        """
+        Join the slices of every part into the final _partN.mp3 files
+
+        If joining fails, every file already written to output_folder is
+        removed so a failed encode leaves no partial output behind.
+
+        Args:
+            slices (list): Slices from _plan()
+            output_folder (str): Directory to save the parts
+            base_filename (str): Base name for the parts
+            written (dict): Result of _encode_slice() by slice path
+            parts (PartLog, optional): Receives the metadata of each part
+        """
+        created = []
+        try:
+            return self._join_parts(slices, output_folder, base_filename, written, parts, created)
+        except Exception:
+            for path in created:
+                if os.path.exists(path):
+                    os.remove(path)
+            raise
+
+    def _join_parts(self, slices, output_folder, base_filename, written, parts, created):
+        """Body of _assemble(); every path it writes in output_folder is appended to created first"""
+        by_part = {}
+        for s in slices:
+            by_part.setdefault(s.part, []).append(s.path)
+
+        output_files = []
+        for part in sorted(by_part):
+            paths = [p for p in by_part[part] if os.path.getsize(p) > 0]
+            for p in by_part[part]:
+                if p not in paths:
+                    os.remove(p)
+            if not paths:
+                continue
+
+            target = os.path.join(output_folder, f"{base_filename}_part{len(output_files) + 1}.mp3")
+            created += [target, target + '.tmp']
+            duration = sum(written[p][1] for p in paths) / self.sample_rate
+            if len(paths) == 1:
+                os.replace(paths[0], target)
+                if parts is not None:
+                    parts.record_file(target, written[paths[0]][0], duration)
+            else:
+                with HashingFile(target + '.tmp', 'wb') as dst:
+                    for p in paths:
+                        with open(p, 'rb') as src:
+                            copy_range(src, dst, 0, os.path.getsize(p), zero_copy=parts is None)
+                        os.remove(p)
+                os.replace(target + '.tmp', target)
+                if parts is not None:
+                    parts.record_file(target, dst, duration)
+            output_files.append(target)
+
+        if not output_files:
+            raise ValueError("Encoder produced no audio")
+
+        # The last part runs to the end of the input and may exceed the limit
+        # if the probed duration was short; cut it at frame boundaries
+        last = output_files[-1]
+        if os.path.getsize(last) > self.max_size_bytes:
+            output_files.pop()
+            segments = plan_segments(last, self.max_size_bytes)
+            tail = last + '.tail'
+            created.append(tail)
+            os.replace(last, tail)
+            with open(tail, 'rb') as src:
+                for segment in segments:
+                    target = os.path.join(output_folder, f"{base_filename}_part{len(output_files) + 1}.mp3")
+                    created.append(target)
+                    with HashingFile(target, 'wb') as dst:
+                        copy_range(src, dst, segment.start, segment.end - segment.start, zero_copy=parts is None)
+                    if parts is not None:
+                        parts.record_file(target, dst, segment.samples / segment.sample_rate)
+                    output_files.append(target)
+            os.remove(tail)
+
+        for i, path in enumerate(output_files):
+            self.logger.info(f"Part {i + 1} size: {os.path.getsize(path) / (1024 * 1024):.2f} MB")
+
+        return output_files
+
+
+class _ProgressAggregator:
+    """Combines the progress of concurrently encoded slices into one report"""
+
+    def __init__(self, count, duration, callback):
+        self.out_times = [0.0] * count
+        self.duration = duration
+        self.callback = callback
+        self.lock = threading.Lock()
+
+    def reporter(self, index):
+        def _report(progress):
+            if not self.callback:
+                return
+            with self.lock:
+                self.out_times[index] = progress.get('out_time', 0.0)
+                out_time = sum(self.out_times)
+            self.callback({
+                'out_time': out_time,
+                'speed': None,
+                'done': False,
+                'percent': min(out_time / self.duration * 100, 99.9),
+            })
+        return _report
+
+    def finish(self):
+        if self.callback:
+            self.callback({'out_time': self.duration, 'speed': None, 'done': True, 'percent': 100.0})
@@ -0,0 +1,167 @@
+import os
+import glob
+from app.services.ffmpeg import FFmpegRunner, probe_media
+from app.utils.logger import get_logger
+
+# Audio codecs that can be copied into an .m4a container unchanged
+PASSTHROUGH_CODECS = {'aac'}
+
+# Bitrate assumed when the stream does not report one
+FALLBACK_BITRATE = 320000
+
+# Share of each part reserved for container overhead (moov, sample tables)
+CONTAINER_OVERHEAD = 0.03
+
+# Attempts to find a segment duration that keeps every part under the limit
+MAX_ATTEMPTS = 3
+
+
+class PassthroughError(Exception):
+    """Raised when the audio track cannot be remuxed without transcoding"""
+
+
+class AudioRemuxer:
+    """Service for copying the audio track of an MP4 into size-bounded M4A parts"""
+
+    def __init__(self, max_size_mb=25, threads=0, ffmpeg_binary="ffmpeg", ffprobe_binary="ffprobe", timeout=None):
+        """
+        Initialize the remuxer
+
+        Args:
+            max_size_mb (int): Maximum size in MB for each part
+            threads (int): Number of threads ffmpeg may use (0 lets ffmpeg decide)
+            ffmpeg_binary (str): Path or name of the ffmpeg executable
+            ffprobe_binary (str): Path or name of the ffprobe executable
+            timeout (int, optional): Abort a remux after this many seconds
+        """
+        self.max_size_bytes = max_size_mb * 1024 * 1024
+        self.ffprobe_binary = ffprobe_binary
+        self.runner = FFmpegRunner(binary=ffmpeg_binary, threads=threads, timeout=timeout)
+        self.logger = get_logger(__name__)
+
+    def probe(self, mp4_path):
+        """
+        Check whether the audio track of a file can be passed through
+
+        Args:
+            mp4_path (str): Path to the MP4 file
+
+        Returns:
+            dict: Probe result (see probe_media)
+
+        Raises:
+            PassthroughError: If there is no audio track or its codec is not supported
+        """
+        try:
+            info = probe_media(mp4_path, binary=self.ffprobe_binary)
+        except Exception as e:
+            raise PassthroughError(f"Cannot probe input: {str(e)}")
+
+        audio = info.get('audio')
+        if not audio:
+            raise PassthroughError("Input has no audio track")
+        if audio.get('codec') not in PASSTHROUGH_CODECS:
+            raise PassthroughError(f"Audio codec '{audio.get('codec')}' cannot be passed through")
+
+        return info
+
+    def remux(self, mp4_path, work_folder, output_folder, base_filename, info=None, progress_callback=None,
+              part_callback=None):
+        """
+        Copy the audio track into M4A parts of at most max_size_bytes, without re-encoding
+
+        Parts are cut by duration, using the stream bitrate to predict their size.
+        If a part still ends up too large (VBR audio), the remux is repeated with
+        a shorter duration. Parts are written to work_folder and only moved to
+        output_folder once all of them fit.
+
+        Args:
+            mp4_path (str): Path to the MP4 file
+            work_folder (str): Scratch directory on the same volume as output_folder
+            output_folder (str): Directory to save the parts
+            base_filename (str): Base name for the parts
+            info (dict, optional): Result of probe(); probed again if None
+            progress_callback (callable, optional): Receives progress dicts
+                from FFmpegRunner while the remux runs
+            part_callback (callable, optional): Called with the path of each
+                part once it is in output_folder
+
+        Returns:
+            list: List of paths to the M4A parts
+
+        Raises:
+            PassthroughError: If the track cannot be passed through or no segment
+                duration produces parts under the limit
+        """
+        if info is None:
+            info = self.probe(mp4_path)
+
+        os.makedirs(work_folder, exist_ok=True)
+        os.makedirs(output_folder, exist_ok=True)
+
+        bitrate = info['audio'].get('bit_rate') or FALLBACK_BITRATE
+        usable_bytes = self.max_size_bytes * (1 - CONTAINER_OVERHEAD)
+        segment_time = usable_bytes * 8 / bitrate
+        # The segment muxer expands printf-style patterns, so escape any literal %
+        pattern = os.path.join(work_folder.replace('%', '%%'), f"{base_filename.replace('%', '%%')}_part%d.m4a")
+
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            self._remove_parts(work_folder, base_filename)
+            self.logger.info(f"Remuxing audio of {mp4_path} into {segment_time:.1f}s parts (attempt {attempt})")
+
+            try:
+                self.runner.run(
+                    ['-vn', '-sn', '-dn', '-i', mp4_path],
+                    [
+                        '-map', '0:a:0',
+                        '-c:a', 'copy',
+                        '-f', 'segment',
+                        '-segment_time', f"{segment_time:.3f}",
+                        '-segment_format', 'ipod',
+                        '-segment_start_number', '1',
+                        '-reset_timestamps', '1',
+                        pattern
+                    ],
+                    progress_callback=progress_callback,
+                    duration=info.get('duration')
+                )
+            except Exception as e:
+                self._remove_parts(work_folder, base_filename)
+                raise PassthroughError(f"Remux failed: {str(e)}")
+
+            parts = self._list_parts(work_folder, base_filename)
+            largest = max((os.path.getsize(p) for p in parts), default=0)
+            if not parts:
+                raise PassthroughError("Remux produced no output")
+
+            if largest <= self.max_size_bytes:
+                output_files = []
+                for path in parts:
+                    target = os.path.join(output_folder, os.path.basename(path))
+                    os.replace(path, target)
+                    output_files.append(target)
+                    self.logger.info(f"Part {len(output_files)} size: {os.path.getsize(target) / (1024 * 1024):.2f} MB")
+                    if part_callback:
+                        part_callback(target)
+                return output_files
+
+            # Scale the duration down by how much the largest part overshot
+            segment_time *= self.max_size_bytes / largest * (1 - CONTAINER_OVERHEAD)
+
+        self._remove_parts(work_folder, base_filename)
+        raise PassthroughError(f"Could not keep parts under {self.max_size_bytes} bytes")
+
+    def _list_parts(self, folder, base_filename):
+        """Return the parts in folder ordered by part number"""
+        prefix = os.path.join(glob.escape(folder), f"{glob.escape(base_filename)}_part")
+        parts = glob.glob(f"{prefix}*.m4a")
+
+        def _number(path):
+            name = os.path.basename(path)[len(base_filename) + len("_part"):-len(".m4a")]
+            return int(name) if name.isdigit() else 0
+
+        return sorted(parts, key=_number)
+
+    def _remove_parts(self, folder, base_filename):
+        for path in self._list_parts(folder, base_filename):
+            os.remove(path)
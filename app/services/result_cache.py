@@ -0,0 +1,190 @@
+import os
+import json
+import uuid
+import shutil
+import hashlib
+import threading
+from app.utils.file_utils import link_or_copy
+from app.utils.logger import get_logger
+
+# Name of the file describing a cache entry
+ENTRY_FILE = "entry.json"
+
+# Prefix of staging directories that are not complete entries yet
+STAGING_PREFIX = ".staging-"
+
+
+def url_fingerprint(url, metadata):
+    """
+    Fingerprint a remote file from its URL and HTTP validators
+
+    Args:
+        url (str): URL of the file
+        metadata (dict): Result of URLDownloader.probe()
+
+    Returns:
+        str: Fingerprint, or None if the server sent no ETag or Last-Modified
+            (without a validator a changed file would be served from the cache)
+    """
+    if not metadata or not (metadata.get('etag') or metadata.get('last_modified')):
+        return None
+    parts = [url, metadata.get('etag') or '', str(metadata.get('size') or ''), metadata.get('last_modified') or '']
+    return "url:" + hashlib.sha256("\n".join(parts).encode('utf-8')).hexdigest()
+
+
+def make_cache_key(fingerprint, bitrate, chunk_size_mb, output_format):
+    """
+    Combine an input fingerprint with the conversion parameters into a cache key
+
+    Args:
+        fingerprint (str): Content fingerprint ('sha256:...' or from url_fingerprint)
+        bitrate (str): Bitrate of the conversion
+        chunk_size_mb (int): Part size in MB
+        output_format (str): 'mp3' or 'm4a'
+
+    Returns:
+        str: Hex digest usable as a directory name
+    """
+    params = json.dumps([fingerprint, str(bitrate), int(chunk_size_mb), output_format])
+    return hashlib.sha256(params.encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    """Content-addressed store of finished conversions, shared between jobs through hardlinks"""
+
+    def __init__(self, cache_folder, max_bytes):
+        """
+        Initialize the cache
+
+        Args:
+            cache_folder (str): Directory holding the entries; must be on the same
+                volume as the result folder for hardlinks to work
+            max_bytes (int): Total size of the entries kept before the least
+                recently used ones are evicted
+        """
+        self.cache_folder = cache_folder
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.logger = get_logger(__name__)
+        os.makedirs(cache_folder, exist_ok=True)
+
+    def lookup(self, key, result_dir, base_filename, parts=None):
+        """
+        Materialize a cached result into result_dir
+
+        Args:
+            key (str): Cache key from make_cache_key()
+            result_dir (str): Directory of the new job
+            base_filename (str): Base name for the parts of the new job
+            parts (PartLog, optional): Receives the metadata stored with the entry
+
+        Returns:
+            list: Paths of the parts in result_dir, or None on a cache miss
+        """
+        entry_dir = os.path.join(self.cache_folder, key)
+        with self.lock:
+            entry = self._read_entry(entry_dir)
+            if entry is None:
+                return None
+
+            os.makedirs(result_dir, exist_ok=True)
+            output_files = []
+            try:
+                for i, name in enumerate(entry['files']):
+                    ext = os.path.splitext(name)[1]
+                    target = os.path.join(result_dir, f"{base_filename}_part{i + 1}{ext}")
+                    link_or_copy(os.path.join(entry_dir, name), target)
+                    output_files.append(target)
+                    # Entries stored before part metadata was kept are hashed when the job finishes
+                    if parts is not None and entry.get('parts'):
+                        parts.record(target, **entry['parts'][i])
+            except OSError as e:
+                self.logger.warning(f"Cache entry {key} is unusable: {str(e)}")
+                for path in output_files:
+                    os.remove(path)
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                return None
+
+            # The directory mtime records the last use for LRU eviction
+            os.utime(entry_dir)
+
+        self.logger.info(f"Cache hit {key}: {len(output_files)} parts linked into {result_dir}")
+        return output_files
+
+    def store(self, key, output_files, parts=None):
+        """
+        Add the parts of a finished conversion to the cache
+
+        The parts are hardlinked into a staging directory that is renamed into
+        place, so readers never see a partial entry.
+
+        Args:
+            key (str): Cache key from make_cache_key()
+            output_files (list): Paths of the parts, in order
+            parts (PartLog, optional): Metadata of the parts, kept with the entry
+        """
+        entry_dir = os.path.join(self.cache_folder, key)
+        if os.path.exists(entry_dir):
+            return
+
+        staging_dir = os.path.join(self.cache_folder, f"{STAGING_PREFIX}{uuid.uuid4().hex}")
+        try:
+            os.makedirs(staging_dir)
+            names = []
+            size = 0
+            for i, path in enumerate(output_files):
+                name = f"part{i + 1}{os.path.splitext(path)[1]}"
+                link_or_copy(path, os.path.join(staging_dir, name))
+                names.append(name)
+                size += os.path.getsize(path)
+
+            entry = {'files': names, 'size': size}
+            recorded = [parts.get(path) for path in output_files] if parts is not None else []
+            if recorded and all(recorded):
+                entry['parts'] = recorded
+            with open(os.path.join(staging_dir, ENTRY_FILE), 'w') as f:
+                json.dump(entry, f)
+
+            with self.lock:
+                try:
+                    os.rename(staging_dir, entry_dir)
+                except OSError:
+                    # Another job stored the same result first
+                    return
+                self.logger.info(f"Cached {len(names)} parts as {key} ({size / (1024 * 1024):.2f} MB)")
+                self._evict()
+        except OSError as e:
+            self.logger.warning(f"Cannot cache result {key}: {str(e)}")
+        finally:
+            if os.path.exists(staging_dir):
+                shutil.rmtree(staging_dir, ignore_errors=True)
+
+    def _evict(self):
+        """Remove least recently used entries until the cache fits max_bytes"""
+        entries = []
+        total = 0
+        for name in os.listdir(self.cache_folder):
+            if name.startswith(STAGING_PREFIX):
+                continue
+            entry_dir = os.path.join(self.cache_folder, name)
+            entry = self._read_entry(entry_dir)
+            if entry is None:
+                continue
+            size = entry.get('size', 0)
+            entries.append((os.path.getmtime(entry_dir), size, entry_dir))
+            total += size
+
+        entries.sort()
+        while total > self.max_bytes and entries:
+            mtime, size, entry_dir = entries.pop(0)
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total -= size
+            self.logger.info(f"Evicted cache entry {os.path.basename(entry_dir)} ({size / (1024 * 1024):.2f} MB)")
+
+    @staticmethod
+    def _read_entry(entry_dir):
+        try:
+            with open(os.path.join(entry_dir, ENTRY_FILE)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
@@ -1,8 +1,11 @@
 import os
-import math
-from pydub import AudioSegment
+from app.services.mp3_frames import MP3FormatError, parse_frame_header, is_info_frame, id3v2_tag_size
+from app.utils.file_utils import HashingFile
 from app.utils.logger import get_logger
 
+# Size of the reads from an MP3 stream
+STREAM_READ_SIZE = 256 * 1024
+
 class MP3Splitter:
     """Service for splitting MP3 files into smaller chunks"""
     
@@ -16,85 +19,180 @@ class MP3Splitter:
         self.max_size_bytes = max_size_mb * 1024 * 1024
         self.logger = get_logger(__name__)
     
-    def split(self, mp3_path, output_folder, base_filename=None, delete_source=True):
+    def split_stream(self, stream, output_folder, base_filename, part_callback=None, parts=None):
         """
-        Split an MP3 file into chunks of specified maximum size
-        
+        Split an MP3 bitstream into parts while it is being produced
+
+        Frames are read from the stream (e.g. an encoder's stdout) and written
+        straight into size-bounded part files, so the complete MP3 never exists
+        on disk. A part is written under a temporary name and renamed to its
+        final _partN.mp3 name once it is complete.
+
         Args:
-            mp3_path (str): Path to the MP3 file
+            stream: Binary file-like object positioned at the start of the MP3 data
             output_folder (str): Directory to save the split files
-            base_filename (str, optional): Base name for output files.
-                If None, uses the input filename without _temp suffix.
-            delete_source (bool): Whether to delete the source file after splitting
-        
+            base_filename (str): Base name for output files
+            part_callback (callable, optional): Called with the path of each
+                part once it has its final name
+            parts (PartLog, optional): Receives the size, checksums and duration
+                of each part, computed while it is written
+
         Returns:
             list: List of paths to the split MP3 files
-        
+
         Raises:
-            IOError: If the input file doesn't exist
-            Exception: For any splitting errors
+            MP3FormatError: If the stream does not contain MPEG audio frames
         """
-        if not os.path.exists(mp3_path):
-            self.logger.error(f"Input file not found: {mp3_path}")
-            raise IOError(f"Input file not found: {mp3_path}")
-        
         if not os.path.exists(output_folder):
             os.makedirs(output_folder)
-        
-        # Determine base filename for output
-        if base_filename is None:
-            base_filename = os.path.splitext(os.path.basename(mp3_path))[0]
-            base_filename = base_filename.replace("_temp", "")  # Remove temp suffix
-        
-        self.logger.info(f"Loading MP3 for splitting: {mp3_path}")
-        
+
+        segmenter = _StreamSegmenter(output_folder, base_filename, self.max_size_bytes, self.logger,
+                                     part_callback, parts)
         try:
-            # Load the MP3 file
-            audio = AudioSegment.from_mp3(mp3_path)
-            
-            # Calculate duration and bytes per millisecond
-            duration_ms = len(audio)
-            file_size = os.path.getsize(mp3_path)
-            bytes_per_ms = file_size / duration_ms
-            
-            # Calculate segment duration
-            segment_duration_ms = int(self.max_size_bytes / bytes_per_ms)
-            
-            # Calculate number of segments
-            total_segments = math.ceil(duration_ms / segment_duration_ms)
-            
-            self.logger.info(f"Splitting file into {total_segments} parts of ~{self.max_size_bytes/1024/1024:.1f}MB each")
-            
-            output_files = []
-            
-            # Create segments
-            for i in range(total_segments):
-                start_ms = i * segment_duration_ms
-                end_ms = min((i + 1) * segment_duration_ms, duration_ms)
-                
-                segment = audio[start_ms:end_ms]
-                
-                # Generate output filename
-                output_file = os.path.join(output_folder, f"{base_filename}_part{i+1}.mp3")
-                
-                self.logger.info(f"Exporting part {i+1}/{total_segments} to {output_file}")
-                
-                # Export segment
-                segment.export(output_file, format="mp3")
-                
-                # Verify size
-                actual_size_mb = os.path.getsize(output_file) / (1024 * 1024)
-                self.logger.info(f"Part {i+1} size: {actual_size_mb:.2f} MB")
-                
-                output_files.append(output_file)
-            
-            # Delete source file if requested
-            if delete_source:
-                self.logger.info(f"Deleting source file: {mp3_path}")
-                os.remove(mp3_path)
-            
-            return output_files
-            
-        except Exception as e:
-            self.logger.error(f"Error during splitting: {str(e)}")
-            raise Exception(f"Splitting failed: {str(e)}")
+            while True:
+                data = stream.read(STREAM_READ_SIZE)
+                if not data:
+                    break
+                segmenter.feed(data)
+            return segmenter.close()
+        except Exception:
+            segmenter.abort()
+            raise
+
+
+class _StreamSegmenter:
+    """Incremental frame parser that writes MP3 frames into size-bounded parts"""
+
+    def __init__(self, output_folder, base_filename, max_size_bytes, logger, part_callback=None, parts=None):
+        self.output_folder = output_folder
+        self.base_filename = base_filename
+        self.max_size_bytes = max_size_bytes
+        self.logger = logger
+        self.part_callback = part_callback
+        self.parts = parts
+
+        self.output_files = []
+        self._buf = b''
+        self._skip = 0          # bytes of an ID3v2 tag still to discard
+        self._started = False   # leading tags and Xing frame handled
+        self._reference = None  # header of the first audio frame
+        self._part = None
+        self._part_path = None
+        self._part_size = 0
+        self._part_samples = 0
+
+    def feed(self, data):
+        """Consume the next chunk of the stream"""
+        if self._skip:
+            dropped = min(self._skip, len(data))
+            self._skip -= dropped
+            data = data[dropped:]
+
+        buf = self._buf + data if self._buf else data
+        pos = 0
+
+        if not self._started:
+            if len(buf) < 10:
+                self._buf = buf
+                return
+            tag_size = id3v2_tag_size(buf)
+            if tag_size:
+                if tag_size > len(buf):
+                    self._skip = tag_size - len(buf)
+                    self._buf = b''
+                else:
+                    self._buf = b''
+                    self.feed(buf[tag_size:])
+                return
+
+        run_start = pos
+        length = len(buf)
+
+        while length - pos >= 4:
+            header = parse_frame_header(buf, pos)
+            if header is None or (self._reference is not None and
+                                  (header.layer, header.sample_rate) !=
+                                  (self._reference.layer, self._reference.sample_rate)):
+                # Flush what we have and look for the next sync word
+                self._write(buf[run_start:pos])
+                next_sync = buf.find(b'\xff', pos + 1)
+                if next_sync == -1:
+                    pos = length
+                    run_start = pos
+                    break
+                self.logger.warning(f"Skipping {next_sync - pos} bytes of non-frame data in MP3 stream")
+                pos = next_sync
+                run_start = pos
+                continue
+
+            if pos + header.size > length:
+                break
+
+            if not self._started:
+                self._started = True
+                self._reference = header
+                if is_info_frame(buf[pos:pos + header.size], header):
+                    pos += header.size
+                    run_start = pos
+                    continue
+
+            if self._part is None or self._part_size + (pos - run_start) + header.size > self.max_size_bytes:
+                self._write(buf[run_start:pos])
+                self._next_part()
+                run_start = pos
+
+            pos += header.size
+            self._part_samples += header.samples
+
+        self._write(buf[run_start:pos])
+        self._buf = buf[pos:]
+
+    def close(self):
+        """Finish the last part and return the paths of all parts"""
+        if self._buf:
+            self.logger.warning(f"Discarding {len(self._buf)} trailing bytes of incomplete MP3 frame")
+            self._buf = b''
+        self._finish_part()
+
+        if not self.output_files:
+            raise MP3FormatError("No MP3 audio frames found in stream")
+        return self.output_files
+
+    def abort(self):
+        """Remove every part written so far"""
+        if self._part:
+            self._part.close()
+            self._part = None
+            if os.path.exists(self._part_path + '.tmp'):
+                os.remove(self._part_path + '.tmp')
+        for path in self.output_files:
+            if os.path.exists(path):
+                os.remove(path)
+        self.output_files = []
+
+    def _write(self, data):
+        # Data before the first frame has no part to go to
+        if data and self._part is not None:
+            self._part.write(data)
+            self._part_size += len(data)
+
+    def _next_part(self):
+        self._finish_part()
+        index = len(self.output_files) + 1
+        self._part_path = os.path.join(self.output_folder, f"{self.base_filename}_part{index}.mp3")
+        self._part = HashingFile(self._part_path + '.tmp', 'wb')
+        self._part_size = 0
+        self._part_samples = 0
+
+    def _finish_part(self):
+        if self._part is None:
+            return
+        part, self._part = self._part, None
+        part.close()
+        os.replace(self._part_path + '.tmp', self._part_path)
+        if self.parts is not None:
+            self.parts.record_file(self._part_path, part, self._part_samples / self._reference.sample_rate)
+        self.output_files.append(self._part_path)
+        self.logger.info(f"Part {len(self.output_files)} size: {self._part_size / (1024 * 1024):.2f} MB")
+        if self.part_callback:
+            self.part_callback(self._part_path)
@@ -0,0 +1,234 @@
+import os
+import re
+import json
+import time
+import uuid
+import fcntl
+import hashlib
+import threading
+from app.utils.logger import get_logger
+
+# Upload ids are generated here; anything else is rejected before touching the filesystem
+UPLOAD_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+
+# Bytes read from the request body at a time
+WRITE_CHUNK_SIZE = 1024 * 1024
+
+
+class UploadError(Exception):
+    """Request that does not fit the state of the upload"""
+    pass
+
+
+class UploadOffsetError(UploadError):
+    """Data that does not start at the current offset, or an upload that is not complete yet"""
+
+    def __init__(self, message, offset):
+        super().__init__(message)
+        self.offset = offset
+
+
+class UploadStore:
+    """
+    Resumable uploads written in place, one byte range at a time
+
+    Each upload is a data file that only ever grows at its end, plus a small
+    JSON file with its name and expected length. The current offset is the
+    size of the data file, so an upload interrupted mid-request resumes from
+    the last byte that reached the disk. The SHA-256 is computed while the data
+    streams in; its state is kept in memory and rebuilt from the file if this
+    process did not receive the earlier ranges.
+    """
+
+    def __init__(self, folder, expiry_seconds=24 * 3600):
+        """
+        Args:
+            folder (str): Directory for unfinished uploads; on the same volume as
+                UPLOAD_FOLDER so that finishing an upload is a rename
+            expiry_seconds (int): Unfinished uploads untouched this long are deleted
+        """
+        self.folder = folder
+        self.expiry_seconds = expiry_seconds
+        self.logger = get_logger(__name__)
+        self.digests = {}
+        self.lock = threading.Lock()
+        os.makedirs(folder, exist_ok=True)
+
+    def create(self, filename, length):
+        """
+        Start a new upload
+
+        Args:
+            filename (str): Name of the file being uploaded
+            length (int): Total size of the file in bytes
+
+        Returns:
+            dict: Upload state (see get())
+        """
+        self.purge_expired()
+        upload_id = uuid.uuid4().hex
+        meta = {'upload_id': upload_id, 'filename': filename, 'length': length, 'created_at': time.time()}
+        open(self._data_path(upload_id), 'wb').close()
+        with open(self._meta_path(upload_id) + '.tmp', 'w') as f:
+            json.dump(meta, f)
+        os.replace(self._meta_path(upload_id) + '.tmp', self._meta_path(upload_id))
+        with self.lock:
+            self.digests[upload_id] = (0, hashlib.sha256())
+        self.logger.info(f"Upload {upload_id} created for {filename} ({length} bytes)")
+        return dict(meta, offset=0)
+
+    def get(self, upload_id):
+        """
+        State of an upload
+
+        Returns:
+            dict: 'upload_id', 'filename', 'length', 'created_at' and 'offset'
+                (bytes received so far), or None if the upload does not exist
+        """
+        if not UPLOAD_ID_RE.match(upload_id or ''):
+            return None
+        try:
+            with open(self._meta_path(upload_id)) as f:
+                meta = json.load(f)
+            meta['offset'] = os.path.getsize(self._data_path(upload_id))
+        except (OSError, ValueError):
+            return None
+        return meta
+
+    def write(self, upload_id, stream, start):
+        """
+        Append a byte range read from stream
+
+        Bytes before the current offset (a client resending the end of a range
+        whose response it never saw) are skipped.
+
+        Args:
+            upload_id (str): The upload
+            stream: Readable binary stream, e.g. the request body
+            start (int): Offset of the first byte in stream
+
+        Returns:
+            int: The new offset
+
+        Raises:
+            UploadOffsetError: If start is past the current offset or another
+                request is writing to the upload
+            UploadError: If the upload does not exist or the data goes beyond
+                the declared length
+        """
+        meta = self.get(upload_id)
+        if meta is None:
+            raise UploadError("Upload not found")
+        with open(self._data_path(upload_id), 'ab') as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                raise UploadOffsetError("Upload is being written by another request", meta['offset'])
+
+            offset = os.path.getsize(self._data_path(upload_id))
+            if start > offset:
+                raise UploadOffsetError(f"Range starts at {start}, upload is at {offset}", offset)
+            digest = self._digest(upload_id, offset)
+
+            skip = offset - start
+            try:
+                while True:
+                    chunk = stream.read(WRITE_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    if skip:
+                        dropped = min(skip, len(chunk))
+                        skip -= dropped
+                        chunk = chunk[dropped:]
+                        if not chunk:
+                            continue
+                    if offset + len(chunk) > meta['length']:
+                        raise UploadError(f"Data exceeds the declared length of {meta['length']} bytes")
+                    f.write(chunk)
+                    digest.update(chunk)
+                    offset += len(chunk)
+            finally:
+                # Whatever reached the file counts, even if the client disconnected
+                f.flush()
+                with self.lock:
+                    self.digests[upload_id] = (offset, digest)
+        return offset
+
+    def finalize(self, upload_id, target_path):
+        """
+        Move a complete upload to its final path
+
+        The upload's state is kept until discard(), so restore() can undo the
+        move if the file cannot be used after all.
+
+        Args:
+            upload_id (str): The upload
+            target_path (str): Destination of the file
+
+        Returns:
+            str: Hex SHA-256 of the file
+
+        Raises:
+            UploadOffsetError: If not all bytes have been received
+            UploadError: If the upload does not exist
+        """
+        meta = self.get(upload_id)
+        if meta is None:
+            raise UploadError("Upload not found")
+        if meta['offset'] != meta['length']:
+            raise UploadOffsetError(f"Upload incomplete: {meta['offset']} of {meta['length']} bytes", meta['offset'])
+        hexdigest = self._digest(upload_id, meta['offset']).hexdigest()
+        os.replace(self._data_path(upload_id), target_path)
+        return hexdigest
+
+    def restore(self, upload_id, target_path):
+        """Move a finalized file back so the upload can be finalized again"""
+        os.replace(target_path, self._data_path(upload_id))
+
+    def discard(self, upload_id):
+        """Delete an upload and its state"""
+        with self.lock:
+            self.digests.pop(upload_id, None)
+        for path in (self._meta_path(upload_id), self._data_path(upload_id)):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def purge_expired(self):
+        """Delete unfinished uploads that have not received data for expiry_seconds"""
+        cutoff = time.time() - self.expiry_seconds
+        for name in os.listdir(self.folder):
+            upload_id, ext = os.path.splitext(name)
+            if ext != '.json' or not UPLOAD_ID_RE.match(upload_id):
+                continue
+            data_path = self._data_path(upload_id)
+            try:
+                last_write = os.path.getmtime(data_path if os.path.exists(data_path) else self._meta_path(upload_id))
+            except OSError:
+                continue
+            if last_write < cutoff:
+                self.logger.info(f"Deleting expired upload {upload_id}")
+                self.discard(upload_id)
+
+    def _digest(self, upload_id, offset):
+        """SHA-256 state of the first offset bytes, rebuilt from the file if not cached"""
+        with self.lock:
+            cached = self.digests.get(upload_id)
+        if cached and cached[0] == offset:
+            return cached[1]
+
+        digest = hashlib.sha256()
+        with open(self._data_path(upload_id), 'rb') as f:
+            remaining = offset
+            while remaining:
+                chunk = f.read(min(WRITE_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                digest.update(chunk)
+                remaining -= len(chunk)
+        return digest
+
+    def _data_path(self, upload_id):
+        return os.path.join(self.folder, upload_id + '.part')
+
+    def _meta_path(self, upload_id):
+        return os.path.join(self.folder, upload_id + '.json')
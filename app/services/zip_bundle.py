@@ -0,0 +1,166 @@
+import io
+import os
+import time
+import struct
+import bisect
+
+# Without ZIP64 every size and offset in the archive is a 32-bit field
+ZIP_MAX_SIZE = 0xFFFFFFFF
+
+# Bit 11: names are UTF-8
+_UTF8_FLAG = 0x0800
+
+# Version 1.0 is enough to extract stored (uncompressed) members
+_VERSION_NEEDED = 10
+
+# Made by UNIX (high byte 3), spec version 2.0, so the permission bits are honoured
+_VERSION_MADE_BY = (3 << 8) | 20
+
+# -rw-r--r-- regular file, in the high 16 bits of the external attributes
+_EXTERNAL_ATTR = (0o100644 << 16)
+
+
+class BundleTooLargeError(Exception):
+    """Archive that would need ZIP64"""
+    pass
+
+
+def dos_datetime(timestamp):
+    """
+    Convert a Unix timestamp to the MS-DOS date and time fields of a ZIP header
+
+    Returns:
+        tuple: (time, date) as 16-bit integers
+    """
+    t = time.gmtime(timestamp)
+    year = min(max(t.tm_year, 1980), 2107)
+    return (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2), ((year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+
+
+class StoredZip(io.RawIOBase):
+    """
+    Read-only, seekable view of an uncompressed ZIP archive of existing files
+
+    The archive is never written anywhere: headers are built in memory up front
+    and member data is read from the original files as the archive is read.
+    Every byte of the archive is a function of the member names, sizes, CRCs and
+    the timestamp, so the same job always produces the same archive and any
+    byte range can be served without generating what comes before it.
+    """
+
+    def __init__(self, entries, timestamp):
+        """
+        Args:
+            entries (list): (name, path, size, crc32) of each member, in archive order
+            timestamp (float): Modification time recorded for every member
+
+        Raises:
+            BundleTooLargeError: If the archive would exceed ZIP_MAX_SIZE
+        """
+        super().__init__()
+        mod_time, mod_date = dos_datetime(timestamp)
+        self._starts = []
+        self._segments = []
+        self._position = 0
+        self._file = None
+        self._file_path = None
+
+        offset = 0
+        central = []
+        for name, path, size, crc in entries:
+            encoded = name.encode('utf-8')
+            local = struct.pack(
+                '<IHHHHHIIIHH', 0x04034b50, _VERSION_NEEDED, _UTF8_FLAG, 0, mod_time, mod_date,
+                crc, size, size, len(encoded), 0
+            ) + encoded
+            central.append(struct.pack(
+                '<IHHHHHHIIIHHHHHII', 0x02014b50, _VERSION_MADE_BY, _VERSION_NEEDED, _UTF8_FLAG, 0,
+                mod_time, mod_date, crc, size, size, len(encoded), 0, 0, 0, 0, _EXTERNAL_ATTR, offset
+            ) + encoded)
+            offset = self._add(offset, local)
+            offset = self._add(offset, (path, size))
+            if offset > ZIP_MAX_SIZE:
+                raise BundleTooLargeError(f"Archive exceeds {ZIP_MAX_SIZE} bytes")
+
+        directory = b''.join(central)
+        end = struct.pack('<IHHHHIIH', 0x06054b50, 0, 0, len(central), len(central), len(directory), offset, 0)
+        offset = self._add(offset, directory + end)
+        if offset > ZIP_MAX_SIZE:
+            raise BundleTooLargeError(f"Archive exceeds {ZIP_MAX_SIZE} bytes")
+        self.size = offset
+
+    def _add(self, offset, segment):
+        length = len(segment) if isinstance(segment, bytes) else segment[1]
+        if length:
+            self._starts.append(offset)
+            self._segments.append(segment)
+        return offset + length
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        if offset < 0:
+            raise ValueError("Negative seek position")
+        self._position = offset
+        return offset
+
+    def readinto(self, buffer):
+        if self._position >= self.size or not len(buffer):
+            return 0
+        index = bisect.bisect_right(self._starts, self._position) - 1
+        segment = self._segments[index]
+        within = self._position - self._starts[index]
+
+        if isinstance(segment, bytes):
+            count = min(len(buffer), len(segment) - within)
+            buffer[:count] = segment[within:within + count]
+        else:
+            path, length = segment
+            f = self._open(path)
+            f.seek(within)
+            count = f.readinto(memoryview(buffer)[:min(len(buffer), length - within)])
+            if not count:
+                raise IOError(f"{path} is shorter than its recorded size")
+
+        self._position += count
+        return count
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        super().close()
+
+    def _open(self, path):
+        """Keep the current member open; reads usually run through a member sequentially"""
+        if self._file_path != path:
+            if self._file is not None:
+                self._file.close()
+            self._file = open(path, 'rb')
+            self._file_path = path
+        return self._file
+
+
+def bundle_entries(result_dir, files):
+    """
+    Archive members for the parts of a job
+
+    Args:
+        result_dir (str): Directory holding the parts
+        files (list): File records of the job ('filename', 'size', 'crc32')
+
+    Returns:
+        list: (name, path, size, crc32) tuples for StoredZip
+    """
+    return [(f['filename'], os.path.join(result_dir, f['filename']), f['size'], f['crc32']) for f in files]
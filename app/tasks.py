@@ -1,12 +1,30 @@
 import os
+import re
+import heapq
+import math
 import shutil
 import time
 import threading
-from flask import current_app, Flask
+from datetime import datetime, timezone
+from flask import current_app, has_app_context, Flask
 
 from app.services.converter import MP4ToMP3Converter
-from app.services.downloader import URLDownloader
+from app.services.downloader import DownloadError, URLDownloader, normalize_url
+from app.services.ffmpeg import probe_media
+from app.services.parallel_encoder import ParallelMP3Encoder
+from app.services.remuxer import AudioRemuxer, PassthroughError
+from app.services.result_cache import ResultCache, make_cache_key, url_fingerprint
 from app.services.splitter import MP3Splitter
+from app.services.upload_store import UploadStore
+from app.utils.admission import NullAdmission, create_admission
+from app.utils.concurrency import FixedConcurrency, create_concurrency
+from app.utils.file_utils import link_or_copy
+from app.utils.job_events import create_job_events
+from app.utils.job_registry import create_job_registry
+from app.utils.manifest import PartLog, ManifestCache, build_manifest, write_manifest, read_manifest
+from app.utils.queue_manager import FIFOPolicy, PriorityJobQueue, create_policy
+from app.utils.throughput import create_throughput_model
+from app.utils.webhooks import create_webhook_dispatcher
 # Setup logger
 from app.utils.logger import get_logger
 
@@ -15,54 +33,296 @@ logger = get_logger("tasks")
 # Variabel global untuk menyimpan instance Flask app
 _app = None
 
+# Nama file potongan hasil: {base}_part{N}.mp3 / .m4a
+PART_NAME_RE = re.compile(r'^(.*)_part(\d+)(\.mp3|\.m4a)$')
+
+# Cache hasil konversi, dibuat saat pertama kali dibutuhkan
+_result_cache = None
+_result_cache_lock = threading.Lock()
+
+# Registry status job, dibuat saat pertama kali dibutuhkan
+_job_registry = None
+_job_registry_lock = threading.Lock()
+
+# Penyimpanan upload bertahap, dibuat saat pertama kali dibutuhkan
+_upload_store = None
+_upload_store_lock = threading.Lock()
+
+# Log event progress job untuk SSE dan long-poll, dibuat saat pertama kali dibutuhkan
+_job_events = None
+_job_events_lock = threading.Lock()
+
+# Jarak minimum antar event progress (detik) agar log event tidak membengkak
+PROGRESS_EVENT_INTERVAL = 0.5
+
+# Manifest job yang sudah selesai, dibuat saat pertama kali dibutuhkan
+_manifest_cache = None
+_manifest_cache_lock = threading.Lock()
+
+# Model throughput untuk perkiraan waktu proses, dibuat saat pertama kali dibutuhkan
+_throughput_model = None
+_throughput_model_lock = threading.Lock()
+
+# Pengirim webhook callback_url, dibuat oleh set_app
+_webhook_dispatcher = None
+_webhook_dispatcher_lock = threading.Lock()
+
+# Koneksi Redis untuk EXECUTION_MODE 'rq', dibuat saat pertama kali dibutuhkan
+_redis = None
+
+# Antrian RQ, urut dari prioritas tertinggi (urutan yang didengarkan worker.py)
+RQ_QUEUES = ('high', 'default', 'low')
+
+
+class QueueFullError(Exception):
+    """Job ditolak karena perkiraan waktu tunggunya melebihi MAX_QUEUE_WAIT"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class JobRetryError(Exception):
+    """Percobaan job gagal sementara (mis. download terputus); job dijalankan ulang nanti"""
+
 
 def set_app(app):
     """Set aplikasi Flask yang akan digunakan oleh thread"""
-    global _app
+    global _app, _webhook_dispatcher
     _app = app
+    queue_manager.configure(
+        app.config['MAX_CONCURRENT_CONVERSIONS'],
+        create_policy(app.config['SCHEDULING_POLICY'], app.config['LARGE_FILE_PROCESSING_DELAY']),
+        create_admission(app.config),
+        create_concurrency(app.config),
+        app.config['DOWNLOAD_JOB_RETRIES'],
+        app.config['DOWNLOAD_JOB_RETRY_DELAY']
+    )
+
+    # Dijalankan sejak awal: dengan backend 'redis' proses web juga mengirim callback job yang selesai di worker RQ
+    with _webhook_dispatcher_lock:
+        _webhook_dispatcher = create_webhook_dispatcher(app.config)
+        _webhook_dispatcher.start()
 
 
 # Queue manager untuk mengelola jumlah konversi bersamaan
 class ConversionQueueManager:
-    def __init__(self, max_concurrent=3):
+    """
+    Antrian job yang dikerjakan oleh sejumlah worker thread tetap
+
+    Urutan antrian ditentukan oleh policy penjadwalan (lihat app.utils.queue_manager).
+    Sebelum memproses job, worker meminta slot ke admission controller sehingga
+    MAX_CONCURRENT_CONVERSIONS berlaku untuk semua proses, bukan per proses. Di dalam
+    proses, jumlah job yang berjalan dibatasi oleh slot yang bisa menyesuaikan CPU dan
+    memori container (lihat app.utils.concurrency).
+    """
+
+    def __init__(self, max_concurrent=3, policy=None, admission=None):
         self.max_concurrent = max_concurrent
-        self.active_jobs = 0
-        self.queue = []
+        self.queue = PriorityJobQueue(policy or FIFOPolicy())
+        self.admission = admission or NullAdmission()
+        self.concurrency = FixedConcurrency(max_concurrent)
+        self.retries = 0
+        self.retry_delay = 0
+        # job_id -> job; job yang berjalan, job yang sudah diambil worker tetapi masih menunggu slot global,
+        # dan job yang gagal sementara dan menunggu dijalankan ulang
+        self.running = {}
+        self.admitting = {}
+        self.retrying = {}
+        self.workers = []
         self.lock = threading.Lock()
-
-    def add_job(self, job_id, url=None, file_path=None, base_filename=None, chunk_size_mb=25, bitrate="192k"):
-        """Tambahkan job ke antrian dan proses jika memungkinkan"""
+        self.job_available = threading.Condition(self.lock)
+        # Penggabungan job URL yang sama: key -> job utama, job utama -> pengikut
+        self.inflight = {}
+        self.job_keys = {}
+        self.followers = {}
+        self.attached = {}
+
+    def configure(self, max_concurrent, policy, admission=None, concurrency=None, retries=0, retry_delay=0):
+        """
+        Atur worker, policy penjadwalan, admission dan slot; hanya berlaku sebelum job pertama masuk
+
+        Args:
+            max_concurrent (int): Jumlah worker thread, batas atas slot
+            policy: Policy penjadwalan antrian
+            admission (optional): Admission controller untuk batas antar proses
+            concurrency (optional): Pengatur jumlah slot (FixedConcurrency atau AdaptiveConcurrency)
+            retries (int): Jumlah percobaan ulang job yang gagal sementara (lihat JobRetryError)
+            retry_delay (float): Detik sebelum job yang gagal sementara masuk antrian lagi
+        """
+        with self.lock:
+            if not self.workers:
+                self.max_concurrent = max(1, max_concurrent)
+                self.queue = PriorityJobQueue(policy)
+                self.admission = admission or NullAdmission()
+                self.concurrency = concurrency or FixedConcurrency(self.max_concurrent)
+                self.retries = retries
+                self.retry_delay = retry_delay
+
+    def add_job(self, job_id, url=None, file_path=None, base_filename=None, chunk_size_mb=25, bitrate="192k",
+                output_format="mp3", fingerprint=None, est_cost=None):
+        """
+        Tambahkan job ke antrian; worker yang menganggur langsung mengambilnya
+
+        Job URL dengan URL (ternormalisasi) dan parameter yang sama dengan job yang
+        masih antri atau berjalan tidak diproses ulang, tetapi menempel ke job
+        tersebut dan menerima hasilnya saat job itu selesai.
+
+        Args:
+            est_cost (float, optional): Perkiraan waktu proses (detik) untuk policy penjadwalan
+
+        Returns:
+            bool: True jika job langsung diproses, False jika harus menunggu
+        """
         with self.lock:
-            # Cek apakah bisa langsung diproses
-            if self.active_jobs < self.max_concurrent:
-                self.active_jobs += 1
-                logger.info(f"Starting job {job_id} immediately (active: {self.active_jobs})")
-                thread = threading.Thread(
-                    target=self._process_job_with_context,
-                    args=(job_id, url, file_path, base_filename, chunk_size_mb, bitrate)
+            coalesce_key = self._coalesce_key(url, chunk_size_mb, bitrate, output_format) if url else None
+            primary = self.inflight.get(coalesce_key) if coalesce_key else None
+            if primary:
+                self.followers[primary].append((job_id, base_filename))
+                self.attached[job_id] = primary
+                get_job_registry().update(job_id, primary_job_id=primary)
+                logger.info(f"Job {job_id} attached to in-flight job {primary} for the same URL")
+                return primary not in self.queue
+
+            if coalesce_key:
+                self.inflight[coalesce_key] = job_id
+                self.job_keys[job_id] = coalesce_key
+                self.followers[job_id] = []
+
+            self._start_workers()
+            starts_now = self.concurrency.can_start(len(self.running) + len(self.admitting) + len(self.queue))
+
+            job = {
+                'job_id': job_id,
+                'url': url,
+                'file_path': file_path,
+                'base_filename': base_filename,
+                'chunk_size_mb': chunk_size_mb,
+                'bitrate': bitrate,
+                'output_format': output_format,
+                'fingerprint': fingerprint,
+                'est_cost': est_cost,
+                'added_time': time.time(),
+                'attempt': 1
+            }
+            # Prioritas yang sama dipakai di antrian global agar semua proses memakai satu urutan
+            self.admission.enqueue(job_id, self.queue.policy.priority(job))
+            self.queue.push(job)
+            self.job_available.notify()
+
+            if starts_now:
+                logger.info(f"Starting job {job_id} immediately (active: {len(self.running) + 1})")
+            else:
+                logger.info(f"Job {job_id} added to queue. Position: {self.queue.position(job_id)}")
+            return starts_now
+
+    def _start_workers(self):
+        """Jalankan worker thread saat job pertama masuk; dipanggil dengan lock dipegang"""
+        if not self.workers:
+            self.concurrency.start(self._demand)
+        while len(self.workers) < self.max_concurrent:
+            worker = threading.Thread(target=self._worker, name=f"conversion-worker-{len(self.workers) + 1}")
+            worker.daemon = True
+            worker.start()
+            self.workers.append(worker)
+
+    def _worker(self):
+        """Loop worker: ambil job berikutnya dan proses, selamanya"""
+        while True:
+            with self.lock:
+                while not self.queue or not self.concurrency.can_start(len(self.running) + len(self.admitting)):
+                    # Slot penuh: cek ulang berkala karena jumlah slot dan memori bebas bisa berubah
+                    self.job_available.wait(1.0 if self.queue else None)
+                job = self.queue.pop()
+                self.admitting[job['job_id']] = job
+
+            retry = False
+            try:
+                retry = self._process_job_with_context(
+                    job['job_id'], job['url'], job['file_path'], job['base_filename'],
+                    job['chunk_size_mb'], job['bitrate'], job['output_format'], job['fingerprint'],
+                    final_attempt=job['attempt'] > self.retries
                 )
-                thread.daemon = True
-                thread.start()
-                return True
+            finally:
+                with self.lock:
+                    self.admitting.pop(job['job_id'], None)
+                    self.running.pop(job['job_id'], None)
+                    self.job_available.notify()
+                    logger.info(f"Job {job['job_id']} completed. Active jobs: {len(self.running)}")
+            if retry:
+                self._retry_later(job)
+
+    def _retry_later(self, job):
+        """Masukkan kembali job yang gagal sementara ke antrian setelah retry_delay detik"""
+        job['attempt'] += 1
+        with self.lock:
+            self.retrying[job['job_id']] = job
+        logger.info(f"Job {job['job_id']} will be retried in {self.retry_delay}s (attempt {job['attempt']})")
+        timer = threading.Timer(self.retry_delay, self._requeue, args=(job,))
+        timer.daemon = True
+        timer.start()
+
+    def _requeue(self, job):
+        with self.lock:
+            self.retrying.pop(job['job_id'], None)
+            self.admission.enqueue(job['job_id'], self.queue.policy.priority(job))
+            self.queue.push(job)
+            self.job_available.notify()
+
+    def _demand(self):
+        """Jumlah job yang berjalan dan yang menunggu di proses ini"""
+        with self.lock:
+            return len(self.running) + len(self.admitting), len(self.queue)
+
+    def estimate_wait(self, job_id=None, est_cost=None):
+        """
+        Perkirakan berapa lama job menunggu sebelum mulai diproses
+
+        Job di depannya dibagikan ke slot yang paling cepat kosong, dimulai dari sisa
+        perkiraan waktu job yang sedang berjalan.
+
+        Args:
+            job_id (str, optional): Job dalam antrian; jika None, untuk job baru
+            est_cost (float, optional): Perkiraan waktu proses job baru
+
+        Returns:
+            float: Perkiraan waktu tunggu (detik), atau None jika job tidak dalam antrian
+        """
+        now = time.time()
+        with self.lock:
+            job_id = self.attached.get(job_id, job_id)
+            if job_id is None:
+                ahead = self.queue.ahead(priority=self.queue.policy.priority({'added_time': now, 'est_cost': est_cost}))
+            elif job_id in self.queue:
+                ahead = self.queue.ahead(job_id)
             else:
-                # Tambahkan ke antrian
-                self.queue.append({
-                    'job_id': job_id,
-                    'url': url,
-                    'file_path': file_path,
-                    'base_filename': base_filename,
-                    'chunk_size_mb': chunk_size_mb,
-                    'bitrate': bitrate,
-                    'added_time': time.time()
-                })
-                logger.info(f"Job {job_id} added to queue. Position: {len(self.queue)}")
-                return False
+                return None
+
+            remaining = sorted(
+                max((job['est_cost'] or 0) - (now - job.get('started_time', now)), 0)
+                for job in list(self.running.values()) + list(self.admitting.values())
+            )
+            slot_count = self.concurrency.slots
+
+        # Waktu setiap slot kosong; jika job aktif melebihi jumlah slot, slot pertama baru
+        # kosong setelah kelebihannya selesai
+        slots = remaining[-slot_count:] + [0.0] * max(slot_count - len(remaining), 0)
+        heapq.heapify(slots)
+        for job in ahead:
+            heapq.heapreplace(slots, slots[0] + (job['est_cost'] or 0))
+        return slots[0]
 
     def _process_job_with_context(self, job_id, url=None, file_path=None, base_filename=None, chunk_size_mb=25,
-                                  bitrate="192k"):
-        """Proses job dengan Flask app context dan manajemen antrian"""
+                                  bitrate="192k", output_format="mp3", fingerprint=None, final_attempt=True):
+        """
+        Proses job dengan Flask app context
+
+        Returns:
+            bool: True jika job gagal sementara dan harus dijalankan ulang
+        """
         global _app
 
+        retry = False
         try:
             # Pastikan app tersedia
             if not _app:
@@ -71,69 +331,107 @@ class ConversionQueueManager:
 
             # Gunakan app context
             with _app.app_context():
-                # Panggil fungsi proses konversi
-                if url:
-                    process_url_conversion(job_id, url, base_filename, chunk_size_mb, bitrate)
-                elif file_path:
-                    process_conversion(job_id, file_path, base_filename, chunk_size_mb, bitrate)
-                else:
-                    raise ValueError("Perlu URL atau file_path untuk memproses job")
+                try:
+                    # Tunggu slot global; job lain di proses ini tetap bisa diambil worker lain
+                    try:
+                        self.admission.acquire(job_id)
+                    except Exception as e:
+                        write_error(job_id, f"Conversion failed: no conversion slot available: {str(e)}")
+                        raise
+                    with self.lock:
+                        job = self.admitting.pop(job_id)
+                        job['started_time'] = time.time()
+                        self.running[job_id] = job
+
+                    try:
+                        # Panggil fungsi proses konversi
+                        if url:
+                            process_url_conversion(job_id, url, base_filename, chunk_size_mb, bitrate,
+                                                   output_format, final_attempt)
+                        elif file_path:
+                            process_conversion(job_id, file_path, base_filename, chunk_size_mb, bitrate,
+                                               output_format, fingerprint)
+                        else:
+                            raise ValueError("Perlu URL atau file_path untuk memproses job")
+                    except JobRetryError:
+                        retry = True
+                    finally:
+                        self.admission.release(job_id)
+                finally:
+                    # Job yang menempel tetap menunggu sampai percobaan terakhir selesai
+                    if not retry:
+                        self._complete_followers(job_id)
         except Exception as e:
             logger.error(f"Error processing job {job_id}: {str(e)}")
-        finally:
-            # Proses job berikutnya dalam antrian jika ada
-            with self.lock:
-                self.active_jobs -= 1
-                logger.info(f"Job {job_id} completed. Active jobs: {self.active_jobs}")
-
-                if self.queue:
-                    next_job = self.queue.pop(0)
-                    self.active_jobs += 1
-                    logger.info(f"Starting next job {next_job['job_id']} from queue")
-                    thread = threading.Thread(
-                        target=self._process_job_with_context,
-                        args=(
-                            next_job['job_id'],
-                            next_job.get('url'),
-                            next_job.get('file_path'),
-                            next_job.get('base_filename'),
-                            next_job.get('chunk_size_mb', 25),
-                            next_job.get('bitrate', "192k")
-                        )
-                    )
-                    thread.daemon = True
-                    thread.start()
+        return retry
 
-    def get_queue_status(self, job_id):
-        """Dapatkan status job dalam antrian"""
+    @staticmethod
+    def _coalesce_key(url, chunk_size_mb, bitrate, output_format):
+        """Key penggabungan job URL; nama file tidak termasuk karena setiap job memberi nama sendiri"""
+        return (normalize_url(url), int(chunk_size_mb), str(bitrate), output_format)
+
+    def _complete_followers(self, job_id):
+        """Bagikan hasil job utama ke semua job yang menempel padanya"""
         with self.lock:
-            # Cek jika job sedang dalam antrian
-            for i, job in enumerate(self.queue):
-                if job['job_id'] == job_id:
-                    return {'status': 'queued', 'position': i + 1, 'queue_length': len(self.queue)}
+            key = self.job_keys.pop(job_id, None)
+            if key is not None:
+                self.inflight.pop(key, None)
+            followers = self.followers.pop(job_id, [])
 
-            # Periksa direktori temporary untuk melihat apakah job sedang diproses
+        for follower_id, base_filename in followers:
             try:
-                from flask import current_app
-                temp_dir = os.path.join(current_app.config['TEMP_FOLDER'], job_id)
-                if os.path.exists(temp_dir):
-                    return {'status': 'processing', 'position': 0, 'queue_length': len(self.queue)}
-
-                download_dir = os.path.join(current_app.config['TEMP_FOLDER'], f"{job_id}_download")
-                if os.path.exists(download_dir):
-                    return {'status': 'processing', 'position': 0, 'queue_length': len(self.queue)}
+                link_job_results(job_id, follower_id, base_filename)
             except Exception as e:
-                logger.error(f"Error checking job directories: {str(e)}")
+                logger.error(f"Cannot share results of job {job_id} with job {follower_id}: {str(e)}")
+                write_error(follower_id, f"Conversion failed: {str(e)}")
+            finally:
+                with self.lock:
+                    self.attached.pop(follower_id, None)
+
+    def get_queue_status(self, job_id):
+        """Dapatkan status job dalam antrian; job yang menempel mengikuti status job utamanya"""
+        with self.lock:
+            primary = self.attached.get(job_id)
+            status = self._job_status(primary or job_id)
+            if primary and status['status'] == 'unknown':
+                # Job utama sudah selesai, hasilnya sedang dibagikan ke job ini
+                status['status'] = 'processing'
+
+        if status['status'] == 'queued' and self.admission.ordered:
+            # Posisi di antrian global semua proses, bukan hanya antrian proses ini
+            global_position = self.admission.position(primary or job_id)
+            if global_position:
+                status['position'], status['queue_length'] = global_position
+        return status
+
+    def _job_status(self, job_id):
+        """Status job di antrian atau daftar job yang berjalan; dipanggil dengan lock dipegang"""
+        # Cek jika job sedang dalam antrian
+        position = self.queue.position(job_id)
+        if position:
+            return {'status': 'queued', 'position': position, 'queue_length': len(self.queue)}
 
-            # Job tidak dalam antrian dan tidak sedang diproses, mungkin sudah selesai atau tidak ada
-            return {'status': 'unknown', 'position': 0, 'queue_length': len(self.queue)}
+        if job_id in self.admitting:
+            # Berikutnya di proses ini, menunggu slot yang sedang dipakai proses lain
+            return {'status': 'queued', 'position': 1, 'queue_length': len(self.queue) + len(self.admitting)}
+
+        if job_id in self.running:
+            return {'status': 'processing', 'position': 0, 'queue_length': len(self.queue)}
+
+        if job_id in self.retrying:
+            # Masuk antrian lagi setelah retry_delay, di belakang job yang sudah antri
+            return {'status': 'queued', 'position': len(self.queue) + 1, 'queue_length': len(self.queue) + 1}
+
+        # Job tidak dalam antrian dan tidak sedang diproses, mungkin sudah selesai atau tidak ada
+        return {'status': 'unknown', 'position': 0, 'queue_length': len(self.queue)}
 
 
 # Inisialisasi queue manager
 queue_manager = ConversionQueueManager(max_concurrent=3)
 
 
-def add_to_conversion_queue(job_id, url=None, file_path=None, base_filename=None, chunk_size_mb=25, bitrate="192k"):
+def add_to_conversion_queue(job_id, url=None, file_path=None, base_filename=None, chunk_size_mb=25, bitrate="192k",
+                            output_format="mp3", fingerprint=None, callback_url=None):
     """
     Fungsi untuk menambahkan job konversi ke antrian
 
@@ -144,11 +442,303 @@ def add_to_conversion_queue(job_id, url=None, file_path=None, base_filename=None
         base_filename (str, optional): Nama file dasar untuk output
         chunk_size_mb (int): Ukuran potongan dalam MB
         bitrate (str): Bitrate untuk konversi audio
+        output_format (str): Format output, 'mp3' atau 'm4a' (passthrough)
+        fingerprint (str, optional): Sidik isi file upload ('sha256:<hex>') untuk cache hasil
+        callback_url (str, optional): URL yang menerima POST status akhir job
 
     Returns:
         bool: True jika diproses langsung, False jika masuk antrian
+
+    Raises:
+        QueueFullError: Jika perkiraan waktu tunggu job melebihi MAX_QUEUE_WAIT
+    """
+    est_cost = estimate_job_cost(file_path, output_format)
+
+    # Tolak job daripada menumpuk antrian yang tidak akan selesai dalam batas waktu
+    max_wait = current_app.config['MAX_QUEUE_WAIT']
+    if max_wait:
+        wait = estimate_queue_wait(est_cost=est_cost)
+        if wait > max_wait:
+            logger.warning(f"Rejecting job {job_id}: estimated wait {wait:.0f}s exceeds {max_wait}s")
+            raise QueueFullError(f"Estimated queue wait {wait:.0f}s exceeds {max_wait}s", math.ceil(wait - max_wait))
+
+    get_job_registry().create(job_id, params={
+        'url': url,
+        'filename': base_filename,
+        'chunk_size_mb': chunk_size_mb,
+        'bitrate': bitrate,
+        'output_format': output_format,
+        'est_cost': est_cost,
+        'callback_url': callback_url,
+    })
+    publish_event(job_id, 'stage', stage='queued')
+
+    if current_app.config['EXECUTION_MODE'] == 'rq':
+        enqueue_rq_job(job_id, url, file_path, base_filename, chunk_size_mb, bitrate, output_format, fingerprint,
+                       est_cost)
+        return False
+
+    return queue_manager.add_job(job_id, url, file_path, base_filename, chunk_size_mb, bitrate, output_format,
+                                 fingerprint, est_cost)
+
+
+def get_redis():
+    """
+    Dapatkan koneksi Redis bersama
+
+    Returns:
+        redis.Redis: Koneksi ke REDIS_URL
+    """
+    global _redis
+    if _redis is None:
+        from redis import Redis
+        _redis = Redis.from_url(current_app.config['REDIS_URL'])
+    return _redis
+
+
+def get_rq_queue(name):
+    """
+    Dapatkan antrian RQ
+
+    Args:
+        name (str): Nama antrian (lihat RQ_QUEUES)
+
+    Returns:
+        rq.Queue: Antrian RQ
+    """
+    from rq import Queue
+    return Queue(name, connection=get_redis(), is_async=current_app.config['RQ_ASYNC'],
+                 default_timeout=current_app.config['RQ_JOB_TIMEOUT'])
+
+
+def enqueue_rq_job(job_id, url=None, file_path=None, base_filename=None, chunk_size_mb=25, bitrate="192k",
+                   output_format="mp3", fingerprint=None, est_cost=None):
+    """
+    Kirim job ke antrian RQ di Redis untuk dikerjakan oleh worker.py
+
+    Antrian dipilih oleh rq_queue_name(). Worker mengambil dari 'high', lalu 'default',
+    lalu 'low'. Job URL yang download-nya gagal sementara dijalankan ulang oleh RQ
+    (DOWNLOAD_JOB_RETRIES).
+
+    Returns:
+        rq.job.Job: Job RQ dengan id yang sama dengan job_id
+    """
+    from rq import Retry
+    queue_name = rq_queue_name(url, est_cost)
+
+    job = get_rq_queue(queue_name).enqueue(
+        run_queued_job,
+        kwargs={
+            'job_id': job_id,
+            'url': url,
+            'file_path': file_path,
+            'base_filename': base_filename,
+            'chunk_size_mb': chunk_size_mb,
+            'bitrate': bitrate,
+            'output_format': output_format,
+            'fingerprint': fingerprint,
+        },
+        job_id=job_id,
+        description=f"conversion {job_id}",
+        retry=Retry(max=current_app.config['DOWNLOAD_JOB_RETRIES'],
+                    interval=current_app.config['DOWNLOAD_JOB_RETRY_DELAY'])
+        if url and current_app.config['DOWNLOAD_JOB_RETRIES'] else None,
+        result_ttl=current_app.config['RESULTS_SERVE_EXPIRY'],
+        failure_ttl=current_app.config['JOB_REGISTRY_TTL']
+    )
+    logger.info(f"Job {job_id} enqueued on RQ queue '{queue_name}'")
+    return job
+
+
+def rq_queue_name(url=None, est_cost=None):
+    """
+    Pilih antrian RQ untuk sebuah job
+
+    Job URL selalu masuk 'default' karena ukurannya belum diketahui saat dikirim. Job upload
+    masuk 'high' jika perkiraan waktu prosesnya paling lama RQ_HIGH_MAX_COST detik, 'low' jika
+    minimal RQ_LOW_MIN_COST detik, dan 'default' di antaranya.
+
+    Args:
+        url (str, optional): URL job, None untuk job upload
+        est_cost (float, optional): Perkiraan waktu proses (detik)
+
+    Returns:
+        str: Nama antrian (lihat RQ_QUEUES)
+    """
+    if url or est_cost is None:
+        return 'default'
+    if est_cost <= current_app.config['RQ_HIGH_MAX_COST']:
+        return 'high'
+    if est_cost >= current_app.config['RQ_LOW_MIN_COST']:
+        return 'low'
+    return 'default'
+
+
+def run_queued_job(job_id, url=None, file_path=None, base_filename=None, chunk_size_mb=25, bitrate="192k",
+                   output_format="mp3", fingerprint=None):
+    """
+    Jalankan job dari antrian RQ (dipanggil oleh worker RQ)
+
+    Returns:
+        dict: Hasil process_url_conversion atau process_conversion
+
+    Raises:
+        JobRetryError: Jika download gagal sementara dan RQ masih akan menjalankan ulang job
+    """
+    if not has_app_context():
+        if not _app:
+            raise RuntimeError("Flask app not set. Call set_app() first.")
+        with _app.app_context():
+            return run_queued_job(job_id, url, file_path, base_filename, chunk_size_mb, bitrate, output_format,
+                                  fingerprint)
+
+    # Exception membuat RQ menjalankan ulang job selama retries_left masih ada
+    from rq import get_current_job
+    rq_job = get_current_job()
+    final_attempt = not current_app.config['RQ_ASYNC'] or rq_job is None or not rq_job.retries_left
+
+    # Jumlah worker RQ bisa melebihi MAX_CONCURRENT_CONVERSIONS; slot global tetap membatasi
+    admission = queue_manager.admission
+    admission.acquire(job_id)
+    try:
+        if url:
+            return process_url_conversion(job_id, url, base_filename, chunk_size_mb, bitrate, output_format,
+                                          final_attempt)
+        return process_conversion(job_id, file_path, base_filename, chunk_size_mb, bitrate, output_format,
+                                  fingerprint)
+    finally:
+        admission.release(job_id)
+
+
+def get_rq_queue_status(job_id):
+    """
+    Dapatkan status job di antrian RQ
+
+    Posisi dihitung termasuk semua job di antrian dengan prioritas lebih tinggi.
+
+    Args:
+        job_id (str): ID pekerjaan
+
+    Returns:
+        dict: Informasi status antrian
+    """
+    from rq.job import Job
+    from rq.exceptions import NoSuchJobError
+
+    queues = [get_rq_queue(name) for name in RQ_QUEUES]
+    queue_length = sum(queue.count for queue in queues)
+
+    try:
+        job = Job.fetch(job_id, connection=get_redis())
+    except NoSuchJobError:
+        return {'status': 'unknown', 'position': 0, 'queue_length': queue_length}
+
+    status = job.get_status()
+    if status == 'queued':
+        ahead = 0
+        for queue in queues:
+            if queue.name == job.origin:
+                position = queue.get_job_position(job_id)
+                if position is not None:
+                    return {'status': 'queued', 'position': ahead + position + 1, 'queue_length': queue_length}
+                break
+            ahead += queue.count
+    if status in ('queued', 'started', 'deferred', 'scheduled'):
+        return {'status': 'processing', 'position': 0, 'queue_length': queue_length}
+    return {'status': 'unknown', 'position': 0, 'queue_length': queue_length}
+
+
+def estimate_job_cost(file_path=None, output_format="mp3"):
+    """
+    Perkirakan waktu proses sebuah job untuk penjadwalan
+
+    Durasi dibaca dari box MP4 (atau ffprobe) jika file sudah ada; jika tidak, diperkirakan dari
+    ukuran file. Job URL (ukuran belum diketahui) dianggap berukuran
+    MAX_FILE_SIZE_FOR_INSTANT_PROCESSING dan ditambah perkiraan waktu download.
+    Kecepatan setiap tahap diambil dari model throughput.
+
+    Args:
+        file_path (str, optional): Path ke file MP4 yang sudah diupload
+        output_format (str): 'mp3' (encode ulang) atau 'm4a' (salin tanpa transcoding)
+
+    Returns:
+        float: Perkiraan waktu proses dalam detik
+    """
+    config = current_app.config
+    size = config['MAX_FILE_SIZE_FOR_INSTANT_PROCESSING']
+    duration = None
+
+    if file_path and os.path.exists(file_path):
+        size = os.path.getsize(file_path)
+        try:
+            duration = probe_media(file_path, binary=config['FFPROBE_BINARY'], timeout=5).get('duration')
+        except Exception as e:
+            logger.debug(f"Cannot probe {file_path} for scheduling: {str(e)}")
+
+    if not duration:
+        duration = size * 8 / config['ESTIMATED_INPUT_BITRATE']
+
+    model = get_throughput_model()
+    cost = model.estimate('remux' if output_format == 'm4a' else 'encode', duration)
+    if not file_path:
+        cost += model.estimate('download', size)
+    return cost
+
+
+def estimate_queue_wait(job_id=None, est_cost=None):
     """
-    return queue_manager.add_job(job_id, url, file_path, base_filename, chunk_size_mb, bitrate)
+    Perkirakan berapa lama job menunggu sebelum mulai diproses
+
+    Di mode 'rq' biaya job lain tidak diketahui, sehingga setiap job di depan dianggap
+    seberat job URL biasa.
+
+    Args:
+        job_id (str, optional): Job dalam antrian; jika None, untuk job baru
+        est_cost (float, optional): Perkiraan waktu proses job baru
+
+    Returns:
+        float: Perkiraan waktu tunggu (detik), atau None jika job tidak dalam antrian
+    """
+    if current_app.config['EXECUTION_MODE'] != 'rq':
+        return queue_manager.estimate_wait(job_id, est_cost)
+
+    if job_id is None:
+        position = sum(get_rq_queue(name).count for name in RQ_QUEUES) + 1
+    else:
+        queue_info = get_rq_queue_status(job_id)
+        if queue_info['status'] != 'queued':
+            return None
+        position = queue_info['position']
+    rounds = math.ceil(position / current_app.config['MAX_CONCURRENT_CONVERSIONS'])
+    return rounds * estimate_job_cost(None)
+
+
+def get_job_eta(job):
+    """
+    Perkirakan waktu mulai dan selesai sebuah job
+
+    Args:
+        job (dict): Record job dari registry (untuk job yang menempel: record job utamanya)
+
+    Returns:
+        dict: 'estimated_start' dan 'estimated_completion' (datetime UTC), atau dict
+            kosong jika job sudah selesai atau perkiraannya tidak diketahui
+    """
+    est_cost = (job.get('params') or {}).get('est_cost')
+    if est_cost is None or job['status'] not in ('queued', 'processing'):
+        return {}
+
+    now = time.time()
+    if job['status'] == 'processing':
+        start = job.get('started_at') or now
+    else:
+        # None: sudah diambil worker tetapi belum tercatat sebagai processing
+        start = now + (estimate_queue_wait(job['job_id']) or 0)
+    completion = max(start + est_cost, now)
+    return {
+        'estimated_start': datetime.fromtimestamp(start, timezone.utc),
+        'estimated_completion': datetime.fromtimestamp(completion, timezone.utc),
+    }
 
 
 def get_queue_status(job_id):
@@ -161,10 +751,511 @@ def get_queue_status(job_id):
     Returns:
         dict: Informasi status antrian
     """
+    if current_app.config['EXECUTION_MODE'] == 'rq':
+        return get_rq_queue_status(job_id)
     return queue_manager.get_queue_status(job_id)
 
 
-def process_url_conversion(job_id, url, base_filename=None, chunk_size_mb=25, bitrate="192k"):
+def create_converter(bitrate="192k"):
+    """
+    Buat MP4ToMP3Converter sesuai konfigurasi ffmpeg aplikasi
+
+    Args:
+        bitrate (str): Bitrate untuk konversi audio
+
+    Returns:
+        MP4ToMP3Converter: Instance converter
+    """
+    return MP4ToMP3Converter(
+        bitrate=bitrate,
+        threads=current_app.config['FFMPEG_THREADS'],
+        ffmpeg_binary=current_app.config['FFMPEG_BINARY'],
+        timeout=current_app.config['FFMPEG_TIMEOUT']
+    )
+
+
+def get_job_registry():
+    """
+    Dapatkan registry status job bersama
+
+    Returns:
+        JobRegistry: Instance registry sesuai JOB_REGISTRY_BACKEND
+    """
+    global _job_registry
+    with _job_registry_lock:
+        if _job_registry is None:
+            _job_registry = create_job_registry(current_app.config)
+        return _job_registry
+
+
+def get_upload_store():
+    """
+    Dapatkan penyimpanan upload bertahap bersama
+
+    Returns:
+        UploadStore: Instance untuk RESUMABLE_UPLOAD_FOLDER
+    """
+    global _upload_store
+    with _upload_store_lock:
+        if _upload_store is None:
+            _upload_store = UploadStore(current_app.config['RESUMABLE_UPLOAD_FOLDER'],
+                                        current_app.config['RESUMABLE_UPLOAD_EXPIRY'])
+        return _upload_store
+
+
+def get_job_events():
+    """
+    Dapatkan log event progress job bersama
+
+    Returns:
+        JobEvents: Instance sesuai JOB_REGISTRY_BACKEND
+    """
+    global _job_events
+    with _job_events_lock:
+        if _job_events is None:
+            _job_events = create_job_events(current_app.config)
+        return _job_events
+
+
+def get_manifest_cache():
+    """
+    Dapatkan cache manifest bersama
+
+    Returns:
+        ManifestCache: Instance dengan kapasitas MANIFEST_CACHE_SIZE
+    """
+    global _manifest_cache
+    with _manifest_cache_lock:
+        if _manifest_cache is None:
+            _manifest_cache = ManifestCache(current_app.config['MANIFEST_CACHE_SIZE'])
+        return _manifest_cache
+
+
+def get_job_manifest(job_id):
+    """
+    Manifest job yang sudah selesai, dari memori atau dari manifest.json
+
+    Args:
+        job_id (str): ID pekerjaan
+
+    Returns:
+        dict: Manifest (lihat build_manifest), atau None jika job tidak punya manifest
+    """
+    cache = get_manifest_cache()
+    manifest = cache.get(job_id)
+    if manifest is None:
+        manifest = read_manifest(os.path.join(current_app.config['RESULT_FOLDER'], job_id))
+        if manifest is not None:
+            cache.put(job_id, manifest)
+    return manifest
+
+
+def manifest_files(job_id, manifest):
+    """
+    Daftar file hasil untuk response status, event dan webhook
+
+    Args:
+        job_id (str): ID pekerjaan
+        manifest (dict): Manifest job
+
+    Returns:
+        list: File beserta durasi, posisi awal, bitrate, SHA-256 dan download_url
+    """
+    files = []
+    for part in manifest['parts']:
+        info = {key: part[key] for key in ('filename', 'size', 'duration', 'start', 'bitrate', 'sha256')
+                if part.get(key) is not None}
+        info['download_url'] = f"/api/download/{job_id}/{part['filename']}"
+        files.append(info)
+    return files
+
+
+def publish_event(job_id, event_type, events=None, **data):
+    """
+    Kirim event progress job; kegagalan hanya dicatat agar tidak menggagalkan konversi
+
+    Args:
+        job_id (str): ID pekerjaan
+        event_type (str): 'stage', 'progress', 'part', 'reset' atau 'status'
+        events (JobEvents, optional): Log event, wajib jika dipanggil di luar app context
+        **data: Isi event
+    """
+    try:
+        (events or get_job_events()).publish(job_id, event_type, data)
+    except Exception as e:
+        logger.warning(f"Cannot publish {event_type} event for job {job_id}: {str(e)}")
+
+
+def progress_publisher(job_id, stage):
+    """
+    Buat fungsi pengirim event progress yang dibatasi PROGRESS_EVENT_INTERVAL
+
+    Args:
+        job_id (str): ID pekerjaan
+        stage (str): Tahap yang dilaporkan ('downloading' atau 'converting')
+
+    Returns:
+        callable: Dipanggil dengan (percent, **data); aman dipanggil dari thread lain
+    """
+    events = get_job_events()
+    state = {'last': 0.0}
+
+    def _publish(percent, **data):
+        now = time.monotonic()
+        if (percent is None or percent < 100) and now - state['last'] < PROGRESS_EVENT_INTERVAL:
+            return
+        state['last'] = now
+        publish_event(job_id, 'progress', events, stage=stage,
+                      percent=None if percent is None else round(percent, 1), **data)
+
+    return _publish
+
+
+def download_progress(job_id):
+    """
+    Buat callback progress URLDownloader yang mengirim event 'downloading'
+
+    Args:
+        job_id (str): ID pekerjaan
+
+    Returns:
+        callable: Callback (byte terdownload, ukuran total)
+    """
+    publish = progress_publisher(job_id, 'downloading')
+
+    def _callback(downloaded, total_size):
+        publish(downloaded / total_size * 100 if total_size else None, bytes=downloaded, total_bytes=total_size)
+
+    return _callback
+
+
+def part_announcer(job_id):
+    """
+    Buat callback yang mengumumkan setiap potongan begitu file finalnya selesai ditulis
+
+    Args:
+        job_id (str): ID pekerjaan
+
+    Returns:
+        callable: Dipanggil dengan path potongan
+    """
+    events = get_job_events()
+
+    def _announce(path):
+        filename = os.path.basename(path)
+        publish_event(job_id, 'part', events, filename=filename, size=os.path.getsize(path),
+                      download_url=f"/api/download/{job_id}/{filename}")
+
+    return _announce
+
+
+def get_webhook_dispatcher():
+    """
+    Dapatkan pengirim webhook
+
+    Returns:
+        WebhookDispatcher: Instance sesuai WEBHOOK_BACKEND
+    """
+    global _webhook_dispatcher
+    with _webhook_dispatcher_lock:
+        if _webhook_dispatcher is None:
+            _webhook_dispatcher = create_webhook_dispatcher(current_app.config)
+            _webhook_dispatcher.start()
+        return _webhook_dispatcher
+
+
+def notify_callback(job_id, status, files=None, error=None):
+    """
+    Jadwalkan POST status akhir job ke callback_url-nya, jika ada
+
+    Pengiriman berjalan di background; fungsi ini tidak menunggu penerima.
+
+    Args:
+        job_id (str): ID pekerjaan
+        status (str): 'completed' atau 'failed'
+        files (list, optional): File hasil beserta download_url
+        error (str, optional): Pesan error untuk job yang gagal
+    """
+    job = get_job_registry().get(job_id)
+    callback_url = job['params'].get('callback_url') if job else None
+    if not callback_url:
+        return
+
+    # Bentuk payload sama dengan response GET /api/conversion/<job_id>
+    payload = {'job_id': job_id, 'status': status, 'files': files or []}
+    if error:
+        payload['error'] = error
+    try:
+        get_webhook_dispatcher().submit(job_id, callback_url, payload)
+    except Exception as e:
+        logger.error(f"Cannot schedule callback for job {job_id}: {str(e)}")
+
+
+def get_throughput_model():
+    """
+    Dapatkan model throughput bersama
+
+    Returns:
+        ThroughputModel: Instance model sesuai THROUGHPUT_BACKEND
+    """
+    global _throughput_model
+    with _throughput_model_lock:
+        if _throughput_model is None:
+            _throughput_model = create_throughput_model(current_app.config)
+        return _throughput_model
+
+
+def get_result_cache():
+    """
+    Dapatkan cache hasil konversi bersama
+
+    Returns:
+        ResultCache: Instance cache, atau None jika cache dinonaktifkan
+    """
+    global _result_cache
+    if not current_app.config['RESULT_CACHE_ENABLED']:
+        return None
+    with _result_cache_lock:
+        if _result_cache is None:
+            _result_cache = ResultCache(current_app.config['CACHE_FOLDER'], current_app.config['CACHE_MAX_BYTES'])
+        return _result_cache
+
+
+def create_downloader():
+    """
+    Buat URLDownloader sesuai konfigurasi download aplikasi
+
+    Returns:
+        URLDownloader: Instance downloader
+    """
+    return URLDownloader(
+        connections=current_app.config['DOWNLOAD_CONNECTIONS'],
+        min_range_size=current_app.config['DOWNLOAD_RANGE_MIN_SIZE'],
+        range_retries=current_app.config['DOWNLOAD_RANGE_RETRIES']
+    )
+
+
+def progress_logger(job_id, step=10, stage=None):
+    """
+    Buat callback progress yang mencatat log setiap kelipatan step persen
+
+    Args:
+        job_id (str): ID pekerjaan
+        step (int): Interval log dalam persen
+        stage (str, optional): Tahap ('encode' atau 'remux'); jika diberikan, durasi audio
+            dan waktu proses dicatat ke model throughput saat konversi selesai
+
+    Returns:
+        callable: Callback untuk FFmpegRunner
+    """
+    state = {'next': step}
+    # Callback dipanggil dari thread pembaca ffmpeg tanpa app context
+    model = get_throughput_model() if stage else None
+    publish = progress_publisher(job_id, 'converting')
+    started = time.time()
+
+    def _callback(progress):
+        percent = progress.get('percent')
+        if percent is not None and percent >= state['next']:
+            logger.info(f"Job {job_id} conversion progress: {percent:.1f}% (speed: {progress.get('speed')}x)")
+            state['next'] = (int(percent) // step + 1) * step
+        publish(percent, speed=progress.get('speed'))
+        if model and progress.get('done'):
+            model.observe(stage, progress.get('out_time'), time.time() - started)
+
+    return _callback
+
+
+def convert_and_split(job_id, source_path, result_dir, base_filename, chunk_size_mb=25, bitrate="192k",
+                      output_format="mp3", temp_dir=None, parts=None):
+    """
+    Konversi MP4 ke audio dan tulis potongannya langsung ke result_dir dalam satu tahap
+
+    Untuk output_format 'm4a', track audio AAC disalin tanpa transcoding. Jika codec
+    tidak kompatibel, otomatis kembali ke encode MP3. Input panjang di-encode paralel
+    per potongan waktu jika PARALLEL_ENCODE_WORKERS > 1.
+
+    Args:
+        job_id (str): ID unik untuk pekerjaan konversi
+        source_path (str): Path ke file MP4
+        result_dir (str): Direktori hasil untuk file _partN
+        base_filename (str): Nama file dasar untuk output
+        chunk_size_mb (int): Ukuran potongan dalam MB
+        bitrate (str): Bitrate untuk konversi audio
+        output_format (str): Format output, 'mp3' atau 'm4a' (passthrough)
+        temp_dir (str, optional): Direktori kerja untuk mode passthrough dan paralel
+        parts (PartLog, optional): Menerima ukuran, checksum dan durasi potongan MP3
+
+    Returns:
+        list: Daftar path file audio hasil
+    """
+    publish_event(job_id, 'stage', stage='converting')
+    announce_part = part_announcer(job_id)
+
+    if output_format == 'm4a':
+        remuxer = AudioRemuxer(
+            max_size_mb=chunk_size_mb,
+            threads=current_app.config['FFMPEG_THREADS'],
+            ffmpeg_binary=current_app.config['FFMPEG_BINARY'],
+            ffprobe_binary=current_app.config['FFPROBE_BINARY'],
+            timeout=current_app.config['FFMPEG_TIMEOUT']
+        )
+        try:
+            info = remuxer.probe(source_path)
+            logger.info(f"Passing through {info['audio']['codec']} audio into {chunk_size_mb}MB M4A chunks: {source_path}")
+            return remuxer.remux(
+                source_path, temp_dir or result_dir, result_dir, base_filename, info=info,
+                progress_callback=progress_logger(job_id, stage='remux'),
+                part_callback=announce_part
+            )
+        except PassthroughError as e:
+            logger.warning(f"Passthrough not possible for job {job_id} ({str(e)}), encoding to MP3 instead")
+
+    workers = current_app.config['PARALLEL_ENCODE_WORKERS']
+    if workers > 1:
+        try:
+            duration = probe_media(source_path, binary=current_app.config['FFPROBE_BINARY']).get('duration')
+        except Exception as e:
+            logger.warning(f"Cannot probe duration for job {job_id}: {str(e)}")
+            duration = None
+
+        if duration and duration >= current_app.config['PARALLEL_ENCODE_MIN_DURATION']:
+            encoder = ParallelMP3Encoder(
+                bitrate=bitrate,
+                workers=workers,
+                max_size_mb=chunk_size_mb,
+                ffmpeg_binary=current_app.config['FFMPEG_BINARY'],
+                ffprobe_binary=current_app.config['FFPROBE_BINARY'],
+                timeout=current_app.config['FFMPEG_TIMEOUT']
+            )
+            logger.info(f"Converting MP4 to {chunk_size_mb}MB MP3 chunks on {workers} workers: {source_path}")
+            try:
+                output_files = encoder.encode(
+                    source_path, temp_dir or result_dir, result_dir, base_filename, duration=duration,
+                    progress_callback=progress_logger(job_id, stage='encode'),
+                    parts=parts
+                )
+                # Potongan terakhir baru pasti setelah semua slice selesai digabung
+                for path in output_files:
+                    announce_part(path)
+                return output_files
+            except Exception as e:
+                logger.warning(f"Parallel conversion failed for job {job_id} ({str(e)}), retrying in a single pass")
+
+    logger.info(f"Converting MP4 to {chunk_size_mb}MB MP3 chunks: {source_path}")
+    converter = create_converter(bitrate)
+    splitter = MP3Splitter(max_size_mb=chunk_size_mb)
+    return converter.convert_segmented(
+        source_path, splitter, result_dir, base_filename,
+        progress_callback=progress_logger(job_id, stage='encode'),
+        part_callback=announce_part,
+        parts=parts
+    )
+
+
+def can_stream_ingest(output_format="mp3"):
+    """
+    Cek apakah job URL boleh dikonversi sambil didownload
+
+    Mode passthrough dan encode paralel membutuhkan file lengkap di disk.
+
+    Args:
+        output_format (str): Format output job
+
+    Returns:
+        bool: True jika streaming ingest dapat digunakan
+    """
+    return (current_app.config['STREAMING_INGEST']
+            and output_format == 'mp3'
+            and current_app.config['PARALLEL_ENCODE_WORKERS'] <= 1)
+
+
+def prefer_stream_ingest(downloader, metadata, output_format="mp3"):
+    """
+    Pilih antara konversi sambil download dan download paralel dengan Range
+
+    Untuk file yang bisa didownload paralel, URL_INGEST_PREFERENCE menentukan pilihannya:
+    'stream' menumpuk download dengan encode, 'ranges' mendownload lebih cepat dengan
+    beberapa koneksi lalu baru mengkonversi.
+
+    Args:
+        downloader (URLDownloader): Downloader job
+        metadata (dict): Hasil probe URL
+        output_format (str): Format output job
+
+    Returns:
+        bool: True jika job dikonversi sambil didownload
+    """
+    if not can_stream_ingest(output_format):
+        return False
+    if current_app.config['URL_INGEST_PREFERENCE'] == 'ranges':
+        return not downloader.supports_ranges(metadata)
+    return True
+
+
+def stream_url_conversion(job_id, url, downloader, result_dir, base_filename=None, chunk_size_mb=25,
+                          bitrate="192k", parts=None):
+    """
+    Alirkan body download langsung ke ffmpeg sehingga download dan encode berjalan bersamaan
+
+    Args:
+        job_id (str): ID unik untuk pekerjaan konversi
+        url (str): URL file MP4
+        downloader (URLDownloader): Downloader yang digunakan
+        result_dir (str): Direktori hasil untuk file _partN.mp3
+        base_filename (str, optional): Nama file dasar untuk output
+        chunk_size_mb (int): Ukuran potongan dalam MB
+        bitrate (str): Bitrate untuk konversi audio
+        parts (PartLog, optional): Menerima ukuran, checksum dan durasi potongan
+
+    Returns:
+        list: Daftar path file MP3 hasil, atau None jika file harus didownload dulu
+    """
+    try:
+        stream = downloader.open_stream(url)
+    except Exception as e:
+        logger.warning(f"Cannot open stream for job {job_id} ({str(e)}), downloading first")
+        return None
+
+    announce = part_announcer(job_id)
+    announced = []
+
+    def _announce(path):
+        announced.append(path)
+        announce(path)
+
+    try:
+        if not stream.streamable:
+            logger.info(f"Job {job_id}: not streamable (moov atom not at the front, truncated or no audio), "
+                        f"downloading before converting")
+            return None
+
+        if not base_filename:
+            base_filename = os.path.splitext(stream.filename)[0]
+
+        logger.info(f"Converting MP4 to {chunk_size_mb}MB MP3 chunks while downloading: {url}")
+        publish_event(job_id, 'stage', stage='converting')
+        converter = create_converter(bitrate)
+        splitter = MP3Splitter(max_size_mb=chunk_size_mb)
+        return converter.convert_segmented(
+            url, splitter, result_dir, base_filename,
+            progress_callback=progress_logger(job_id),
+            input_stream=stream.iter_chunks(download_progress(job_id)),
+            part_callback=_announce,
+            parts=parts
+        )
+    except Exception as e:
+        logger.warning(f"Streaming conversion failed for job {job_id} ({str(e)}), downloading first")
+        if announced:
+            # Converter menghapus potongan yang sudah ditulis; klien harus membuang potongan yang sudah diumumkan
+            publish_event(job_id, 'reset', filenames=[os.path.basename(path) for path in announced])
+        return None
+    finally:
+        stream.close()
+
+
+def process_url_conversion(job_id, url, base_filename=None, chunk_size_mb=25, bitrate="192k", output_format="mp3",
+                           final_attempt=True):
     """
     Proses konversi MP4 dari URL ke MP3 dan potong hasilnya
 
@@ -174,6 +1265,12 @@ def process_url_conversion(job_id, url, base_filename=None, chunk_size_mb=25, bi
         base_filename (str, optional): Nama file dasar untuk output
         chunk_size_mb (int): Ukuran potongan dalam MB
         bitrate (str): Bitrate untuk konversi audio
+        output_format (str): Format output, 'mp3' atau 'm4a' (passthrough)
+        final_attempt (bool): False jika job akan dijalankan ulang saat download gagal sementara
+
+    Raises:
+        JobRetryError: Jika download gagal sementara dan final_attempt False. Direktori
+            download (file .part dan state-nya) disimpan agar percobaan berikutnya melanjutkannya.
     """
 
     logger.info(f"Starting URL conversion job {job_id} for URL: {url}")
@@ -189,29 +1286,55 @@ def process_url_conversion(job_id, url, base_filename=None, chunk_size_mb=25, bi
     os.makedirs(download_dir, exist_ok=True)
 
     downloaded_file = None
+    get_job_registry().update(job_id, status='processing')
 
     try:
-        # Step 1: Download MP4 file
-        logger.info(f"Downloading MP4 from URL: {url}")
-        downloader = URLDownloader()
-        downloaded_file = downloader.download(url, download_dir)
-
-        # Validate downloaded file
-        downloader.validate_file_type(downloaded_file)
-
-        # Extract base filename if not provided
-        if not base_filename:
-            base_filename = os.path.splitext(os.path.basename(downloaded_file))[0]
-
-        # Step 2: Convert MP4 to MP3
-        logger.info(f"Converting MP4 to MP3: {downloaded_file}")
-        converter = MP4ToMP3Converter(bitrate=bitrate)
-        mp3_path = converter.convert(downloaded_file, temp_dir)
-
-        # Step 3: Split MP3 into chunks
-        logger.info(f"Splitting MP3 into {chunk_size_mb}MB chunks: {mp3_path}")
-        splitter = MP3Splitter(max_size_mb=chunk_size_mb)
-        output_files = splitter.split(mp3_path, result_dir, base_filename)
+        downloader = create_downloader()
+        metadata = downloader.probe(url)
+        output_files = None
+        parts = PartLog()
+
+        # Step 0: Ambil hasil dari cache jika URL yang sama (ETag/Last-Modified sama) pernah dikonversi
+        cache = get_result_cache()
+        fingerprint = url_fingerprint(url, metadata)
+        cache_key = make_cache_key(fingerprint, bitrate, chunk_size_mb, output_format) if fingerprint else None
+        if cache and cache_key:
+            cached_name = base_filename or os.path.splitext(metadata['filename'])[0]
+            output_files = cache.lookup(cache_key, result_dir, cached_name, parts)
+            if output_files is not None:
+                logger.info(f"Job {job_id}: result served from cache")
+                cache_key = None
+
+        # Step 1a: Konversi sambil download jika file mendukung (moov di depan)
+        if output_files is None and prefer_stream_ingest(downloader, metadata, output_format):
+            output_files = stream_url_conversion(job_id, url, downloader, result_dir, base_filename,
+                                                 chunk_size_mb, bitrate, parts)
+
+        if output_files is None:
+            # Step 1: Download MP4 file
+            logger.info(f"Downloading MP4 from URL: {url}")
+            publish_event(job_id, 'stage', stage='downloading')
+            download_started = time.time()
+            downloaded_file = downloader.download(url, download_dir, metadata=metadata,
+                                                  progress_callback=download_progress(job_id))
+            get_throughput_model().observe('download', os.path.getsize(downloaded_file),
+                                           time.time() - download_started)
+
+            # Validate downloaded file
+            downloader.validate_file_type(downloaded_file)
+
+            # Extract base filename if not provided
+            if not base_filename:
+                base_filename = os.path.splitext(os.path.basename(downloaded_file))[0]
+
+            # Step 2: Convert MP4 to MP3 chunks
+            output_files = convert_and_split(job_id, downloaded_file, result_dir, base_filename, chunk_size_mb,
+                                             bitrate, output_format, temp_dir, parts)
+
+        if cache and cache_key:
+            cache.store(cache_key, output_files, parts)
+
+        finish_job(job_id, output_files, parts)
 
         # Log results
         logger.info(f"Conversion job {job_id} completed successfully")
@@ -232,13 +1355,19 @@ def process_url_conversion(job_id, url, base_filename=None, chunk_size_mb=25, bi
     except Exception as e:
         logger.error(f"Error processing job {job_id}: {str(e)}")
 
+        if isinstance(e, DownloadError) and not final_attempt:
+            # Download dilanjutkan dari direktori download pada percobaan berikutnya
+            cleanup(job_id, temp_dir=temp_dir)
+            registry = get_job_registry()
+            registry.update(job_id, status='queued', created_at=registry.get(job_id)['created_at'])
+            publish_event(job_id, 'stage', stage='queued')
+            raise JobRetryError(str(e))
+
         # Cleanup on failure
         cleanup(job_id, downloaded_file, temp_dir, download_dir)
 
-        # Create error file in result directory
-        error_file = os.path.join(result_dir, "error.txt")
-        with open(error_file, 'w') as f:
-            f.write(f"Conversion failed: {str(e)}")
+        # Tandai job gagal (error.txt dan registry)
+        write_error(job_id, f"Conversion failed: {str(e)}")
 
         return {
             'job_id': job_id,
@@ -247,7 +1376,8 @@ def process_url_conversion(job_id, url, base_filename=None, chunk_size_mb=25, bi
         }
 
 
-def process_conversion(job_id, file_path, base_filename=None, chunk_size_mb=25, bitrate="192k"):
+def process_conversion(job_id, file_path, base_filename=None, chunk_size_mb=25, bitrate="192k", output_format="mp3",
+                       fingerprint=None):
     """
     Proses konversi MP4 ke MP3 dan potong hasilnya (untuk file yang sudah diupload)
 
@@ -257,6 +1387,8 @@ def process_conversion(job_id, file_path, base_filename=None, chunk_size_mb=25,
         base_filename (str, optional): Nama file dasar untuk output
         chunk_size_mb (int): Ukuran potongan dalam MB
         bitrate (str): Bitrate untuk konversi audio
+        output_format (str): Format output, 'mp3' atau 'm4a' (passthrough)
+        fingerprint (str, optional): Sidik isi file ('sha256:<hex>') untuk cache hasil
     """
     logger.info(f"Starting conversion job {job_id} for file: {file_path}")
 
@@ -267,6 +1399,7 @@ def process_conversion(job_id, file_path, base_filename=None, chunk_size_mb=25,
     # Create directories
     os.makedirs(temp_dir, exist_ok=True)
     os.makedirs(result_dir, exist_ok=True)
+    get_job_registry().update(job_id, status='processing')
 
     try:
         uploaded_file = file_path
@@ -274,15 +1407,21 @@ def process_conversion(job_id, file_path, base_filename=None, chunk_size_mb=25,
         if not base_filename:
             base_filename = os.path.splitext(os.path.basename(file_path))[0]
 
-        # Step 1: Convert MP4 to MP3
-        logger.info(f"Converting MP4 to MP3: {file_path}")
-        converter = MP4ToMP3Converter(bitrate=bitrate)
-        mp3_path = converter.convert(file_path, temp_dir)
+        # Step 0: Ambil hasil dari cache jika file yang sama pernah dikonversi dengan parameter yang sama
+        cache = get_result_cache()
+        cache_key = make_cache_key(fingerprint, bitrate, chunk_size_mb, output_format) if fingerprint else None
+        parts = PartLog()
+        output_files = cache.lookup(cache_key, result_dir, base_filename, parts) if cache and cache_key else None
 
-        # Step 2: Split MP3 into chunks
-        logger.info(f"Splitting MP3 into {chunk_size_mb}MB chunks: {mp3_path}")
-        splitter = MP3Splitter(max_size_mb=chunk_size_mb)
-        output_files = splitter.split(mp3_path, result_dir, base_filename)
+        if output_files is None:
+            # Step 1: Convert MP4 to MP3 chunks
+            output_files = convert_and_split(job_id, file_path, result_dir, base_filename, chunk_size_mb, bitrate,
+                                             output_format, temp_dir, parts)
+
+            if cache and cache_key:
+                cache.store(cache_key, output_files, parts)
+
+        finish_job(job_id, output_files, parts)
 
         # Log results
         logger.info(f"Conversion job {job_id} completed successfully")
@@ -312,10 +1451,8 @@ def process_conversion(job_id, file_path, base_filename=None, chunk_size_mb=25,
         if os.path.exists(temp_dir):
             shutil.rmtree(temp_dir, ignore_errors=True)
 
-        # Create error file in result directory
-        error_file = os.path.join(result_dir, "error.txt")
-        with open(error_file, 'w') as f:
-            f.write(f"Conversion failed: {str(e)}")
+        # Tandai job gagal (error.txt dan registry)
+        write_error(job_id, f"Conversion failed: {str(e)}")
 
         return {
             'job_id': job_id,
@@ -349,4 +1486,100 @@ def cleanup(job_id, downloaded_file=None, temp_dir=None, download_dir=None):
             try:
                 shutil.rmtree(directory, ignore_errors=True)
             except Exception as e:
-                logger.warning(f"Failed to delete temporary directory: {str(e)}")
\ No newline at end of file
+                logger.warning(f"Failed to delete temporary directory: {str(e)}")
+
+def finish_job(job_id, output_files, parts=None):
+    """
+    Tandai job selesai, tulis manifest.json dan simpan daftar file hasilnya di registry
+
+    Manifest berisi nama, ukuran, durasi, posisi awal, bitrate, SHA-256 dan CRC-32 tiap
+    potongan. Checksum diambil dari parts (dihitung saat potongan ditulis); potongan yang
+    ditulis langsung oleh ffmpeg dihitung dari disk. Manifest tidak diubah lagi setelah ini,
+    sehingga polling status cukup membaca salinannya di memori.
+
+    Args:
+        job_id (str): ID pekerjaan
+        output_files (list): Daftar path file hasil, berurutan
+        parts (PartLog, optional): Metadata potongan yang dicatat saat ditulis
+    """
+    manifest = build_manifest(job_id, output_files, parts)
+    write_manifest(os.path.join(current_app.config['RESULT_FOLDER'], job_id), manifest)
+    get_manifest_cache().put(job_id, manifest)
+
+    files = [{key: part[key] for key in ('filename', 'size', 'sha256', 'crc32')} for part in manifest['parts']]
+    get_job_registry().update(job_id, status='completed', files=files)
+    files = manifest_files(job_id, manifest)
+    publish_event(job_id, 'status', status='completed', files=files)
+    get_job_events().prune(job_id)
+    notify_callback(job_id, 'completed', files=files)
+
+
+def write_error(job_id, message):
+    """
+    Tandai job sebagai gagal dengan menulis error.txt di direktori hasilnya dan di registry
+
+    Args:
+        job_id (str): ID pekerjaan
+        message (str): Pesan error
+    """
+    result_dir = os.path.join(current_app.config['RESULT_FOLDER'], job_id)
+    os.makedirs(result_dir, exist_ok=True)
+    with open(os.path.join(result_dir, "error.txt"), 'w') as f:
+        f.write(message)
+    get_job_registry().update(job_id, status='failed', error=message)
+    publish_event(job_id, 'status', status='failed', error=message)
+    get_job_events().prune(job_id)
+    notify_callback(job_id, 'failed', error=message)
+
+
+def link_job_results(source_job_id, job_id, base_filename=None):
+    """
+    Salin hasil sebuah job ke job lain dengan hardlink (atau error-nya jika gagal)
+
+    Args:
+        source_job_id (str): ID job yang sudah selesai
+        job_id (str): ID job yang menerima hasil
+        base_filename (str, optional): Nama file dasar untuk potongan job penerima.
+            Jika None, nama dari job sumber digunakan.
+
+    Returns:
+        list: Daftar path potongan di direktori hasil job penerima
+    """
+    source_dir = os.path.join(current_app.config['RESULT_FOLDER'], source_job_id)
+    result_dir = os.path.join(current_app.config['RESULT_FOLDER'], job_id)
+    error_file = os.path.join(source_dir, "error.txt")
+
+    if os.path.exists(error_file):
+        with open(error_file, 'r') as f:
+            write_error(job_id, f.read())
+        return []
+
+    parts = []
+    if os.path.isdir(source_dir):
+        for name in os.listdir(source_dir):
+            match = PART_NAME_RE.match(name)
+            if match:
+                parts.append((int(match.group(2)), match.group(1), match.group(3), name))
+
+    if not parts:
+        write_error(job_id, "Conversion failed: job produced no output")
+        return []
+
+    # Isi potongan identik, jadi checksum dan durasi diambil dari manifest job sumber
+    manifest = get_job_manifest(source_job_id)
+    recorded = {part['filename']: part for part in manifest['parts']} if manifest else {}
+
+    os.makedirs(result_dir, exist_ok=True)
+    output_files = []
+    part_log = PartLog()
+    for number, source_base, ext, name in sorted(parts):
+        target = os.path.join(result_dir, f"{base_filename or source_base}_part{number}{ext}")
+        link_or_copy(os.path.join(source_dir, name), target)
+        output_files.append(target)
+        if name in recorded:
+            info = recorded[name]
+            part_log.record(target, info['size'], info['sha256'], info['crc32'], info['duration'])
+
+    finish_job(job_id, output_files, part_log)
+    logger.info(f"Job {job_id}: linked {len(output_files)} files from job {source_job_id}")
+    return output_files
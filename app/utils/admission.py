@@ -0,0 +1,262 @@
+import os
+import time
+import fcntl
+import threading
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Admit a job if a slot is free and it is among the first jobs blocked in acquire.
+# Jobs that are only queued do not count: they may sit behind a busy worker in their own
+# process, and waiting for them would deadlock that worker.
+# KEYS: leases (member -> lease expiry), queue (member -> priority), waiting (member -> heartbeat expiry),
+#       blocked (member -> priority)
+# ARGV: now, limit, job_id, lease expiry
+_ACQUIRE_SCRIPT = """
+local now = tonumber(ARGV[1])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+local expired = redis.call('ZRANGEBYSCORE', KEYS[3], '-inf', now)
+for _, member in ipairs(expired) do
+    redis.call('ZREM', KEYS[2], member)
+    redis.call('ZREM', KEYS[3], member)
+    redis.call('ZREM', KEYS[4], member)
+end
+if redis.call('ZSCORE', KEYS[1], ARGV[3]) then
+    redis.call('ZADD', KEYS[1], ARGV[4], ARGV[3])
+    return 1
+end
+local priority = redis.call('ZSCORE', KEYS[2], ARGV[3]) or '-inf'
+redis.call('ZADD', KEYS[3], ARGV[4], ARGV[3])
+redis.call('ZADD', KEYS[4], 'NX', priority, ARGV[3])
+local free = tonumber(ARGV[2]) - redis.call('ZCARD', KEYS[1])
+if free <= 0 then
+    return 0
+end
+if redis.call('ZRANK', KEYS[4], ARGV[3]) >= free then
+    return 0
+end
+redis.call('ZREM', KEYS[2], ARGV[3])
+redis.call('ZREM', KEYS[3], ARGV[3])
+redis.call('ZREM', KEYS[4], ARGV[3])
+redis.call('ZADD', KEYS[1], ARGV[4], ARGV[3])
+return 1
+"""
+
+
+class NullAdmission:
+    """Admission controller that admits every job; each process only applies its own limit"""
+
+    ordered = False
+
+    def enqueue(self, job_id, priority):
+        pass
+
+    def acquire(self, job_id):
+        pass
+
+    def release(self, job_id):
+        pass
+
+    def position(self, job_id):
+        return None
+
+
+class FileLockAdmission:
+    """
+    Limit concurrent conversions on one host with a fixed set of lock files
+
+    Each slot is a file locked with flock. The kernel drops the lock when the
+    holding process exits, so a crashed worker never leaks a slot. Queue order
+    stays per process.
+    """
+
+    ordered = False
+
+    def __init__(self, lock_folder, limit, poll_interval=0.5):
+        """
+        Args:
+            lock_folder (str): Directory for the slot lock files, shared by all processes
+            limit (int): Number of conversions allowed at once
+            poll_interval (float): Seconds between attempts while all slots are taken
+        """
+        self.lock_folder = lock_folder
+        self.limit = max(1, limit)
+        self.poll_interval = poll_interval
+        self.held = {}
+        self.lock = threading.Lock()
+        os.makedirs(lock_folder, exist_ok=True)
+
+    def enqueue(self, job_id, priority):
+        pass
+
+    def acquire(self, job_id):
+        """Block until a slot is free and take it for job_id"""
+        while True:
+            for slot in range(self.limit):
+                fd = os.open(os.path.join(self.lock_folder, f"slot{slot}.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    os.close(fd)
+                    continue
+                with self.lock:
+                    self.held[job_id] = fd
+                logger.info(f"Job {job_id} admitted on slot {slot}")
+                return
+            time.sleep(self.poll_interval)
+
+    def release(self, job_id):
+        with self.lock:
+            fd = self.held.pop(job_id, None)
+        if fd is not None:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def position(self, job_id):
+        return None
+
+
+class RedisAdmission:
+    """
+    Counting semaphore with lease expiry in Redis plus one global queue for every process
+
+    Queued jobs sit in a sorted set ordered by scheduling priority, which gives
+    every web process and replica the same queue position to report. Admission
+    only ranks the jobs that are blocked in acquire: a free slot goes to the first
+    of those, so workers of all processes follow one order, while a job still in
+    a process's local queue never holds back a worker that is already waiting.
+    Leases and queue entries are kept alive by a heartbeat thread; entries of a
+    process that dies expire and stop blocking the queue.
+    """
+
+    ordered = True
+
+    def __init__(self, redis_conn, limit, lease_seconds=60, prefix="admission:", poll_interval=0.5):
+        """
+        Args:
+            redis_conn (redis.Redis): Redis connection
+            limit (int): Number of conversions allowed at once across all processes
+            lease_seconds (int): Time a slot or queue entry survives without a heartbeat
+            prefix (str): Prefix of the Redis keys
+            poll_interval (float): Seconds between attempts while waiting for a slot
+        """
+        self.redis = redis_conn
+        self.limit = max(1, limit)
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.leases_key = prefix + "leases"
+        self.queue_key = prefix + "queue"
+        self.waiting_key = prefix + "waiting"
+        self.blocked_key = prefix + "blocked"
+        self.acquire_script = redis_conn.register_script(_ACQUIRE_SCRIPT)
+        self.held = set()
+        self.waiting = set()
+        self.lock = threading.Lock()
+        self.heartbeat = None
+
+    def enqueue(self, job_id, priority):
+        """Add a job to the global queue"""
+        pipe = self.redis.pipeline()
+        pipe.zadd(self.queue_key, {job_id: priority})
+        pipe.zadd(self.waiting_key, {job_id: time.time() + self.lease_seconds})
+        pipe.execute()
+        with self.lock:
+            self.waiting.add(job_id)
+        self._start_heartbeat()
+
+    def acquire(self, job_id):
+        """Block until job_id is admitted"""
+        self._start_heartbeat()
+        with self.lock:
+            self.waiting.add(job_id)
+        while True:
+            now = time.time()
+            admitted = self.acquire_script(
+                keys=[self.leases_key, self.queue_key, self.waiting_key, self.blocked_key],
+                args=[now, self.limit, job_id, now + self.lease_seconds]
+            )
+            if admitted:
+                with self.lock:
+                    self.waiting.discard(job_id)
+                    self.held.add(job_id)
+                logger.info(f"Job {job_id} admitted")
+                return
+            time.sleep(self.poll_interval)
+
+    def release(self, job_id):
+        with self.lock:
+            self.held.discard(job_id)
+            self.waiting.discard(job_id)
+        pipe = self.redis.pipeline()
+        pipe.zrem(self.leases_key, job_id)
+        pipe.zrem(self.queue_key, job_id)
+        pipe.zrem(self.waiting_key, job_id)
+        pipe.zrem(self.blocked_key, job_id)
+        pipe.execute()
+
+    def position(self, job_id):
+        """
+        Position of a waiting job in the global queue
+
+        Returns:
+            tuple: (position, queue_length), or None if the job is not waiting
+        """
+        pipe = self.redis.pipeline()
+        pipe.zrank(self.queue_key, job_id)
+        pipe.zcard(self.queue_key)
+        rank, length = pipe.execute()
+        if rank is None:
+            return None
+        return rank + 1, length
+
+    def _start_heartbeat(self):
+        with self.lock:
+            if self.heartbeat is None:
+                self.heartbeat = threading.Thread(target=self._heartbeat_loop, name="admission-heartbeat")
+                self.heartbeat.daemon = True
+                self.heartbeat.start()
+
+    def _heartbeat_loop(self):
+        """Extend the leases and queue entries owned by this process"""
+        while True:
+            time.sleep(self.lease_seconds / 3)
+            with self.lock:
+                held = list(self.held)
+                waiting = list(self.waiting)
+            if not held and not waiting:
+                continue
+
+            expiry = time.time() + self.lease_seconds
+            try:
+                pipe = self.redis.pipeline()
+                if held:
+                    pipe.zadd(self.leases_key, {job_id: expiry for job_id in held}, xx=True)
+                if waiting:
+                    pipe.zadd(self.waiting_key, {job_id: expiry for job_id in waiting}, xx=True)
+                pipe.execute()
+            except Exception as e:
+                logger.warning(f"Admission heartbeat failed: {str(e)}")
+
+
+def create_admission(config, redis_conn=None):
+    """
+    Create the admission controller selected by the configuration
+
+    Args:
+        config (dict): Flask configuration
+        redis_conn (redis.Redis, optional): Connection for the 'redis' backend;
+            created from REDIS_URL if None
+
+    Returns:
+        Admission controller
+    """
+    backend = config['ADMISSION_BACKEND']
+    limit = config['MAX_CONCURRENT_CONVERSIONS']
+    if backend == 'redis':
+        if redis_conn is None:
+            from redis import Redis
+            redis_conn = Redis.from_url(config['REDIS_URL'])
+        return RedisAdmission(redis_conn, limit, lease_seconds=config['ADMISSION_LEASE_SECONDS'])
+    if backend == 'file':
+        return FileLockAdmission(config['ADMISSION_LOCK_FOLDER'], limit)
+    return NullAdmission()
@@ -0,0 +1,280 @@
+import os
+import time
+import threading
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+CGROUP_ROOT = "/sys/fs/cgroup"
+
+# cgroup v1 reports "no limit" as a huge page-aligned number
+_V1_UNLIMITED = 1 << 60
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def _read_stat(path):
+    """Parse a 'key value' file such as memory.stat or cpu.stat"""
+    stats = {}
+    content = _read(path)
+    for line in (content or "").splitlines():
+        key, _, value = line.partition(" ")
+        if value.isdigit():
+            stats[key] = int(value)
+    return stats
+
+
+class ResourceMonitor:
+    """
+    Read the CPU and memory limits and usage of the container
+
+    cgroup v2 and v1 are supported; outside a cgroup with limits the host
+    totals from /proc are used instead.
+    """
+
+    def __init__(self, root=CGROUP_ROOT):
+        self.root = root
+        self.v2 = os.path.exists(os.path.join(root, "cgroup.controllers"))
+
+    def cpu_limit(self):
+        """Number of CPUs the container may use"""
+        if self.v2:
+            quota, _, period = (_read(os.path.join(self.root, "cpu.max")) or "max").partition(" ")
+        else:
+            quota = _read(os.path.join(self.root, "cpu", "cpu.cfs_quota_us"))
+            period = _read(os.path.join(self.root, "cpu", "cpu.cfs_period_us"))
+        try:
+            if quota not in (None, "max", "-1"):
+                return int(quota) / int(period)
+        except (TypeError, ValueError, ZeroDivisionError):
+            pass
+        return float(len(os.sched_getaffinity(0)))
+
+    def cpu_usage(self):
+        """CPU seconds used by the container (or the host) so far"""
+        if self.v2:
+            usage = _read_stat(os.path.join(self.root, "cpu.stat")).get("usage_usec")
+            if usage is not None:
+                return usage / 1000000
+        else:
+            usage = _read(os.path.join(self.root, "cpuacct", "cpuacct.usage"))
+            if usage and usage.isdigit():
+                return int(usage) / 1000000000
+
+        # Whole host: busy jiffies from the first line of /proc/stat
+        fields = (_read("/proc/stat") or "cpu 0").splitlines()[0].split()[1:]
+        jiffies = [int(value) for value in fields]
+        idle = sum(jiffies[3:5])
+        return (sum(jiffies[:8]) - idle) / os.sysconf("SC_CLK_TCK")
+
+    def memory_limit(self):
+        """Bytes of memory the container may use"""
+        if self.v2:
+            limit = _read(os.path.join(self.root, "memory.max"))
+        else:
+            limit = _read(os.path.join(self.root, "memory", "memory.limit_in_bytes"))
+        if limit and limit.isdigit() and int(limit) < _V1_UNLIMITED:
+            return int(limit)
+        return self._meminfo().get("MemTotal", 0)
+
+    def memory_usage(self):
+        """
+        Working set of the container in bytes
+
+        Inactive page cache is left out: the kernel reclaims it before it
+        OOM-kills anything, so counting it would throttle jobs for nothing.
+        """
+        if self.v2:
+            usage = _read(os.path.join(self.root, "memory.current"))
+            inactive = _read_stat(os.path.join(self.root, "memory.stat")).get("inactive_file", 0)
+        else:
+            usage = _read(os.path.join(self.root, "memory", "memory.usage_in_bytes"))
+            inactive = _read_stat(os.path.join(self.root, "memory", "memory.stat")).get("total_inactive_file", 0)
+        if usage and usage.isdigit():
+            return max(int(usage) - inactive, 0)
+
+        meminfo = self._meminfo()
+        return meminfo.get("MemTotal", 0) - meminfo.get("MemAvailable", 0)
+
+    @staticmethod
+    def process_tree_rss(pid=None):
+        """Resident memory in bytes of a process and all its descendants (ffmpeg children included)"""
+        pending = [pid or os.getpid()]
+        total = 0
+        while pending:
+            current = pending.pop()
+            for line in (_read(f"/proc/{current}/status") or "").splitlines():
+                if line.startswith("VmRSS:"):
+                    total += int(line.split()[1]) * 1024
+                    break
+            for tid in os.listdir(f"/proc/{current}/task") if os.path.isdir(f"/proc/{current}/task") else []:
+                children = _read(f"/proc/{current}/task/{tid}/children")
+                pending.extend(int(child) for child in (children or "").split())
+        return total
+
+    @staticmethod
+    def _meminfo():
+        meminfo = {}
+        for line in (_read("/proc/meminfo") or "").splitlines():
+            key, _, value = line.partition(":")
+            parts = value.split()
+            if parts and parts[0].isdigit():
+                meminfo[key] = int(parts[0]) * 1024
+        return meminfo
+
+
+class FixedConcurrency:
+    """Constant number of conversion slots"""
+
+    def __init__(self, slots):
+        self.slots = max(1, slots)
+
+    def start(self, demand):
+        pass
+
+    def can_start(self, active):
+        return active < self.slots
+
+
+class AdaptiveConcurrency:
+    """
+    Number of conversion slots that follows the CPU and memory available to the container
+
+    A sampler thread measures CPU utilisation against the CPU quota and the
+    resident memory of each running job. Slots are added one at a time while
+    every slot is busy, jobs are waiting and CPU is below target, and removed
+    when CPU is above target. The slot count never exceeds what fits in memory
+    with the configured headroom, and a new job only starts if the memory it is
+    expected to need is free right now.
+    """
+
+    def __init__(self, min_slots, max_slots, target_cpu=0.85, memory_headroom=0.15,
+                 job_memory=256 * 1024 * 1024, interval=5, monitor=None):
+        """
+        Args:
+            min_slots (int): Lower bound of the slot count
+            max_slots (int): Upper bound of the slot count
+            target_cpu (float): CPU utilisation (fraction of the quota) to stay under
+            memory_headroom (float): Fraction of the memory limit kept free
+            job_memory (int): Memory (bytes) assumed per job until one has been measured
+            interval (float): Seconds between samples
+            monitor (ResourceMonitor, optional): Source of the measurements
+        """
+        self.min_slots = max(1, min_slots)
+        self.max_slots = max(self.min_slots, max_slots)
+        self.target_cpu = target_cpu
+        self.memory_headroom = memory_headroom
+        self.job_memory = job_memory
+        self.interval = interval
+        self.monitor = monitor or ResourceMonitor()
+
+        self.cpu_limit = self.monitor.cpu_limit()
+        self.memory_limit = self.monitor.memory_limit()
+        self.idle_rss = self.monitor.process_tree_rss()
+        self.slots = self._clamp(round(self.cpu_limit))
+        self.slots = self._clamp(min(self.slots, self._memory_slots(0)))
+        self.sampler = None
+        self.lock = threading.Lock()
+        logger.info(f"Adaptive concurrency: {self.cpu_limit:.2f} CPUs, "
+                    f"{self.memory_limit / (1024 * 1024):.0f} MB memory, starting with {self.slots} slots")
+
+    def start(self, demand):
+        """
+        Start sampling
+
+        Args:
+            demand (callable): Returns (running jobs, waiting jobs) of this process
+        """
+        with self.lock:
+            if self.sampler is None:
+                self.sampler = threading.Thread(target=self._sample_loop, args=(demand,), name="concurrency-sampler")
+                self.sampler.daemon = True
+                self.sampler.start()
+
+    def can_start(self, active):
+        """
+        Whether another job may start now
+
+        Args:
+            active (int): Jobs of this process already started
+        """
+        if active >= self.slots:
+            return False
+        if active == 0:
+            # One job always runs, otherwise nothing would ever finish
+            return True
+        free = self.memory_limit * (1 - self.memory_headroom) - self.monitor.memory_usage()
+        return free >= self.job_memory
+
+    def _sample_loop(self, demand):
+        cpu_before = self.monitor.cpu_usage()
+        time_before = time.monotonic()
+        while True:
+            time.sleep(self.interval)
+            cpu_now = self.monitor.cpu_usage()
+            time_now = time.monotonic()
+            try:
+                utilisation = (cpu_now - cpu_before) / ((time_now - time_before) * self.cpu_limit)
+                running, waiting = demand()
+                self._adjust(utilisation, running, waiting)
+            except Exception as e:
+                logger.warning(f"Concurrency sample failed: {str(e)}")
+            cpu_before, time_before = cpu_now, time_now
+
+    def _adjust(self, utilisation, running, waiting):
+        """Update the per-job memory estimate and the slot count from one sample"""
+        rss = self.monitor.process_tree_rss()
+        if running == 0:
+            self.idle_rss = rss
+        else:
+            measured = max(rss - self.idle_rss, 0) / running
+            # Follow increases at once (a new job can grow fast), decreases slowly
+            self.job_memory = measured if measured > self.job_memory else 0.8 * self.job_memory + 0.2 * measured
+
+        slots = self.slots
+        if utilisation > self.target_cpu:
+            slots -= 1
+        elif waiting and running >= slots:
+            slots += 1
+        slots = self._clamp(min(slots, self._memory_slots(running)))
+
+        if slots != self.slots:
+            logger.info(f"Conversion slots {self.slots} -> {slots} (CPU {utilisation:.0%}, "
+                        f"{self.job_memory / (1024 * 1024):.0f} MB per job, running {running}, waiting {waiting})")
+            self.slots = slots
+
+    def _memory_slots(self, running):
+        """Number of jobs that fit in memory: the running ones plus those the free memory can take"""
+        free = self.memory_limit * (1 - self.memory_headroom) - self.monitor.memory_usage()
+        return running + max(int(free // self.job_memory), 0)
+
+    def _clamp(self, slots):
+        return max(self.min_slots, min(self.max_slots, slots))
+
+
+def create_concurrency(config):
+    """
+    Create the slot controller selected by the configuration
+
+    Args:
+        config (dict): Flask configuration
+
+    Returns:
+        FixedConcurrency or AdaptiveConcurrency
+    """
+    if not config['ADAPTIVE_CONCURRENCY']:
+        return FixedConcurrency(config['MAX_CONCURRENT_CONVERSIONS'])
+    return AdaptiveConcurrency(
+        config['MIN_CONCURRENT_CONVERSIONS'],
+        config['MAX_CONCURRENT_CONVERSIONS'],
+        target_cpu=config['ADAPTIVE_TARGET_CPU'],
+        memory_headroom=config['ADAPTIVE_MEMORY_HEADROOM'],
+        job_memory=config['ADAPTIVE_JOB_MEMORY'],
+        interval=config['ADAPTIVE_SAMPLE_INTERVAL']
+    )
@@ -1,6 +1,12 @@
+import io
 import os
+import errno
+import shutil
+import zlib
+import hashlib
+import tempfile
 import magic
-from flask import current_app
+from flask import current_app, Request
 from datetime import datetime, timedelta
 
 def allowed_file(filename):
@@ -16,6 +22,119 @@ def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in current_app.config['ALLOWED_EXTENSIONS']
 
+class HashingFile(io.FileIO):
+    """File that computes the SHA-256 and CRC-32 of everything written to it"""
+
+    def __init__(self, path, mode='w+b'):
+        super().__init__(path, mode)
+        self.sha256 = hashlib.sha256()
+        self.crc32 = 0
+        self.size = 0
+
+    def write(self, data):
+        view = memoryview(data)
+        while view:
+            written = super().write(view)
+            self.sha256.update(view[:written])
+            self.crc32 = zlib.crc32(view[:written], self.crc32)
+            self.size += written
+            view = view[written:]
+        return len(data)
+
+class UploadRequest(Request):
+    """
+    Request that streams uploaded files straight into UPLOAD_FOLDER
+
+    Werkzeug normally spools each multipart file into a temporary file that the
+    route then copies to its destination. Here the parser writes the file into
+    UPLOAD_FOLDER and hashes it on the way, so save_upload() only has to rename
+    it. Files the route does not save are deleted when the request closes.
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if not filename:
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+        fd, path = tempfile.mkstemp(prefix='.upload-', dir=current_app.config['UPLOAD_FOLDER'])
+        os.close(fd)
+        if not hasattr(self, '_upload_paths'):
+            self._upload_paths = []
+        self._upload_paths.append(path)
+        return HashingFile(path)
+
+    def close(self):
+        super().close()
+        for path in getattr(self, '_upload_paths', []):
+            if os.path.exists(path):
+                os.remove(path)
+
+def save_upload(file_storage, file_path, chunk_size=1024 * 1024):
+    """
+    Save an uploaded file while computing its SHA-256
+
+    Files received through UploadRequest are already in UPLOAD_FOLDER and
+    hashed, so they are renamed instead of copied.
+
+    Args:
+        file_storage (FileStorage): The uploaded file from request.files
+        file_path (str): Destination path
+        chunk_size (int): Number of bytes copied at a time
+
+    Returns:
+        str: Hex digest of the file contents
+    """
+    stream = file_storage.stream
+    if isinstance(stream, HashingFile):
+        stream.close()
+        os.replace(stream.name, file_path)
+        return stream.sha256.hexdigest()
+
+    digest = hashlib.sha256()
+    with open(file_path, 'wb') as f:
+        while True:
+            chunk = file_storage.stream.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+            f.write(chunk)
+    return digest.hexdigest()
+
+def file_checksums(file_path, chunk_size=1024 * 1024):
+    """
+    Compute the SHA-256 and CRC-32 of a file in one pass
+
+    Args:
+        file_path (str): Path to the file
+        chunk_size (int): Number of bytes read at a time
+
+    Returns:
+        tuple: (hex SHA-256, CRC-32 as an unsigned integer)
+    """
+    digest = hashlib.sha256()
+    crc = 0
+    with open(file_path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+            crc = zlib.crc32(chunk, crc)
+    return digest.hexdigest(), crc
+
+def link_or_copy(src, dst):
+    """
+    Hardlink src to dst, copying only when they are on different volumes
+
+    Args:
+        src (str): Existing file
+        dst (str): New path for the file
+    """
+    try:
+        os.link(src, dst)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        shutil.copy2(src, dst)
+
 def get_file_info(file_path):
     """
     Get information about a file
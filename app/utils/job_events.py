@@ -0,0 +1,265 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Event types; 'stage' and 'progress' also update the job's progress snapshot.
+# 'reset' withdraws the parts announced so far (a streamed conversion fell back to downloading first)
+EVENT_TYPES = ('stage', 'progress', 'part', 'reset', 'status')
+
+
+class JobEvents:
+    """
+    Base class for the per-job event logs behind the progress stream
+
+    Every event gets an id that increases within its job. A reader passes the
+    last id it has seen and receives the events after it, so a client that
+    reconnects (SSE Last-Event-ID, long-poll 'after') never misses one.
+    """
+
+    def publish(self, job_id, event_type, data):
+        """
+        Append an event to the log of a job
+
+        Args:
+            job_id (str): The unique job identifier
+            event_type (str): One of EVENT_TYPES
+            data (dict): Event payload
+
+        Returns:
+            str: Id of the event
+        """
+        if event_type not in EVENT_TYPES:
+            raise ValueError(f"Unknown event type: {event_type}")
+        return self._publish(job_id, event_type, data)
+
+    def read(self, job_id, after=None, timeout=0):
+        """
+        Return the events after an id, waiting up to timeout seconds for one
+
+        Args:
+            job_id (str): The unique job identifier
+            after (str, optional): Id of the last event seen; None reads from the start
+            timeout (float): Seconds to wait when there is no new event
+
+        Returns:
+            list: Events as dicts with 'id', 'event' and 'data', oldest first
+        """
+        raise NotImplementedError
+
+    def snapshot(self, job_id):
+        """
+        Latest stage and progress of a job
+
+        Returns:
+            dict: 'stage', 'progress' (percent or None) and 'event_id' (id of the
+                latest event), or None if the job has no events
+        """
+        raise NotImplementedError
+
+    def prune(self, job_id):
+        """Drop the progress events of a finished job; stage, part and status events stay"""
+        raise NotImplementedError
+
+    def _publish(self, job_id, event_type, data):
+        raise NotImplementedError
+
+
+class SQLiteJobEvents(JobEvents):
+    """
+    Event logs stored in the SQLite job database
+
+    Readers in the publishing process are woken at once; readers in other
+    processes on the host see new events within poll_interval.
+    """
+
+    def __init__(self, db_path, poll_interval=0.25):
+        """
+        Args:
+            db_path (str): Path to the database file
+            poll_interval (float): Seconds between checks while waiting for an event
+        """
+        self.db_path = db_path
+        self.poll_interval = poll_interval
+        self.local = threading.local()
+        self.published = threading.Condition()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+
+        connection = self._connection()
+        connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS job_events (
+                job_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                type TEXT NOT NULL,
+                data TEXT,
+                created_at REAL,
+                PRIMARY KEY (job_id, seq)
+            );
+            CREATE TABLE IF NOT EXISTS job_progress (
+                job_id TEXT PRIMARY KEY,
+                stage TEXT,
+                progress REAL,
+                seq INTEGER
+            );
+            """
+        )
+        connection.commit()
+
+    def _connection(self):
+        """Return this thread's connection; sqlite3 connections cannot be shared between threads"""
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self.local.connection = connection
+        return connection
+
+    def _publish(self, job_id, event_type, data):
+        connection = self._connection()
+        with connection:
+            # One statement, so two processes publishing for the same job cannot pick the same seq
+            cursor = connection.execute(
+                "INSERT INTO job_events (job_id, seq, type, data, created_at) "
+                "SELECT ?, COALESCE(MAX(seq), 0) + 1, ?, ?, ? FROM job_events WHERE job_id = ?",
+                (job_id, event_type, json.dumps(data), time.time(), job_id)
+            )
+            seq = connection.execute("SELECT seq FROM job_events WHERE rowid = ?", (cursor.lastrowid,)).fetchone()[0]
+            if event_type == 'stage':
+                connection.execute(
+                    "INSERT OR REPLACE INTO job_progress (job_id, stage, progress, seq) VALUES (?, ?, NULL, ?)",
+                    (job_id, data.get('stage'), seq)
+                )
+            elif event_type == 'progress':
+                connection.execute(
+                    "INSERT OR REPLACE INTO job_progress (job_id, stage, progress, seq) VALUES (?, ?, ?, ?)",
+                    (job_id, data.get('stage'), data.get('percent'), seq)
+                )
+            else:
+                connection.execute("UPDATE job_progress SET seq = ? WHERE job_id = ?", (seq, job_id))
+
+        with self.published:
+            self.published.notify_all()
+        return str(seq)
+
+    def read(self, job_id, after=None, timeout=0):
+        after = int(after) if after and str(after).isdigit() else 0
+        deadline = time.monotonic() + timeout
+        while True:
+            rows = self._connection().execute(
+                "SELECT seq, type, data FROM job_events WHERE job_id = ? AND seq > ? ORDER BY seq",
+                (job_id, after)
+            ).fetchall()
+            remaining = deadline - time.monotonic()
+            if rows or remaining <= 0:
+                return [{'id': str(seq), 'event': event_type, 'data': json.loads(data)}
+                        for seq, event_type, data in rows]
+            with self.published:
+                self.published.wait(min(remaining, self.poll_interval))
+
+    def snapshot(self, job_id):
+        row = self._connection().execute(
+            "SELECT stage, progress, seq FROM job_progress WHERE job_id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {'stage': row[0], 'progress': row[1], 'event_id': str(row[2])}
+
+    def prune(self, job_id):
+        connection = self._connection()
+        with connection:
+            connection.execute("DELETE FROM job_events WHERE job_id = ? AND type = 'progress'", (job_id,))
+
+
+class RedisJobEvents(JobEvents):
+    """Event logs stored as Redis streams, readable from every web and worker process"""
+
+    def __init__(self, redis_conn, prefix="job-events:", ttl=None, max_events=1000):
+        """
+        Args:
+            redis_conn (redis.Redis): Redis connection
+            prefix (str): Prefix of the stream and snapshot keys
+            ttl (int, optional): Seconds the events of a job are kept after its last event
+            max_events (int): Approximate number of events kept per job
+        """
+        self.redis = redis_conn
+        self.prefix = prefix
+        self.ttl = ttl
+        self.max_events = max_events
+
+    def _publish(self, job_id, event_type, data):
+        stream_key = self.prefix + job_id
+        snapshot_key = stream_key + ":progress"
+        event_id = self.redis.xadd(stream_key, {'type': event_type, 'data': json.dumps(data)},
+                                   maxlen=self.max_events, approximate=True)
+        event_id = event_id.decode('utf-8') if isinstance(event_id, bytes) else event_id
+
+        snapshot = {'event_id': event_id}
+        if event_type in ('stage', 'progress'):
+            snapshot['stage'] = data.get('stage') or ''
+            snapshot['progress'] = '' if data.get('percent') is None else data['percent']
+
+        pipe = self.redis.pipeline()
+        pipe.hset(snapshot_key, mapping=snapshot)
+        if self.ttl:
+            pipe.expire(stream_key, self.ttl)
+            pipe.expire(snapshot_key, self.ttl)
+        pipe.execute()
+        return event_id
+
+    def read(self, job_id, after=None, timeout=0):
+        stream_key = self.prefix + job_id
+        after = after or '0-0'
+        if timeout > 0:
+            result = self.redis.xread({stream_key: after}, block=max(int(timeout * 1000), 1))
+            entries = result[0][1] if result else []
+        else:
+            entries = self.redis.xrange(stream_key, min=f"({after}")
+        return [self._event(event_id, fields) for event_id, fields in entries]
+
+    def snapshot(self, job_id):
+        data = self.redis.hgetall(self.prefix + job_id + ":progress")
+        if not data:
+            return None
+        data = {key.decode('utf-8'): value.decode('utf-8') for key, value in data.items()}
+        return {
+            'stage': data.get('stage') or None,
+            'progress': float(data['progress']) if data.get('progress') else None,
+            'event_id': data.get('event_id'),
+        }
+
+    def prune(self, job_id):
+        stream_key = self.prefix + job_id
+        stale = [event_id for event_id, fields in self.redis.xrange(stream_key)
+                 if fields.get(b'type') == b'progress']
+        if stale:
+            self.redis.xdel(stream_key, *stale)
+
+    @staticmethod
+    def _event(event_id, fields):
+        return {
+            'id': event_id.decode('utf-8') if isinstance(event_id, bytes) else event_id,
+            'event': fields[b'type'].decode('utf-8'),
+            'data': json.loads(fields[b'data']),
+        }
+
+
+def create_job_events(config):
+    """
+    Create the event store matching the job registry backend
+
+    Args:
+        config (dict): Flask configuration
+
+    Returns:
+        JobEvents: Event store instance
+    """
+    if config['JOB_REGISTRY_BACKEND'] == 'redis':
+        from redis import Redis
+        return RedisJobEvents(Redis.from_url(config['REDIS_URL']), ttl=config['JOB_REGISTRY_TTL'])
+    return SQLiteJobEvents(config['JOB_REGISTRY_PATH'])
@@ -0,0 +1,231 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Job states, in the order a job normally moves through them
+JOB_STATES = ('queued', 'processing', 'completed', 'failed')
+
+# States a job never leaves
+FINAL_STATES = ('completed', 'failed')
+
+# Timestamp recorded when a job enters each state
+_STATE_TIMESTAMPS = {
+    'queued': 'created_at',
+    'processing': 'started_at',
+    'completed': 'finished_at',
+    'failed': 'finished_at',
+}
+
+# Fields stored as JSON
+_JSON_FIELDS = ('params', 'files')
+
+_FIELDS = ('job_id', 'status', 'params', 'files', 'error', 'primary_job_id',
+           'created_at', 'started_at', 'finished_at', 'updated_at')
+
+
+class JobRegistry:
+    """Base class for the stores that keep job state, parameters and output manifests"""
+
+    def create(self, job_id, params=None, status='queued', primary_job_id=None):
+        """
+        Register a new job
+
+        Args:
+            job_id (str): The unique job identifier
+            params (dict, optional): Conversion parameters of the job
+            status (str): Initial state
+            primary_job_id (str, optional): Job whose result this job shares
+        """
+        now = time.time()
+        record = {
+            'job_id': job_id,
+            'status': status,
+            'params': params or {},
+            'files': [],
+            'error': None,
+            'primary_job_id': primary_job_id,
+            'created_at': now,
+            'started_at': None,
+            'finished_at': None,
+            'updated_at': now,
+        }
+        self._save(job_id, record)
+
+    def update(self, job_id, status=None, **fields):
+        """
+        Update a job, recording the time of a state change
+
+        Args:
+            job_id (str): The unique job identifier
+            status (str, optional): New state
+            **fields: Other fields to set ('files', 'error', ...)
+        """
+        unknown = set(fields) - set(_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown job fields: {', '.join(sorted(unknown))}")
+        if status is not None:
+            if status not in JOB_STATES:
+                raise ValueError(f"Unknown job state: {status}")
+            fields['status'] = status
+            fields.setdefault(_STATE_TIMESTAMPS[status], time.time())
+        fields['updated_at'] = time.time()
+        self._update(job_id, fields)
+
+    def get(self, job_id):
+        """
+        Look up a job
+
+        Args:
+            job_id (str): The unique job identifier
+
+        Returns:
+            dict: The job record, or None if the job is unknown
+        """
+        raise NotImplementedError
+
+    def _save(self, job_id, record):
+        raise NotImplementedError
+
+    def _update(self, job_id, fields):
+        raise NotImplementedError
+
+
+class SQLiteJobRegistry(JobRegistry):
+    """Job registry stored in a local SQLite database"""
+
+    def __init__(self, db_path):
+        """
+        Initialize the registry
+
+        Args:
+            db_path (str): Path to the database file
+        """
+        self.db_path = db_path
+        self.local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+
+        connection = self._connection()
+        connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                params TEXT,
+                files TEXT,
+                error TEXT,
+                primary_job_id TEXT,
+                created_at REAL,
+                started_at REAL,
+                finished_at REAL,
+                updated_at REAL
+            )
+            """
+        )
+        connection.commit()
+
+    def _connection(self):
+        """Return this thread's connection; sqlite3 connections cannot be shared between threads"""
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_path, timeout=30)
+            connection.row_factory = sqlite3.Row
+            # WAL lets status reads run while a worker is writing
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self.local.connection = connection
+        return connection
+
+    def get(self, job_id):
+        row = self._connection().execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        record = dict(row)
+        for field in _JSON_FIELDS:
+            record[field] = json.loads(record[field]) if record[field] else ({} if field == 'params' else [])
+        return record
+
+    def _save(self, job_id, record):
+        values = [json.dumps(record[f]) if f in _JSON_FIELDS else record[f] for f in _FIELDS]
+        connection = self._connection()
+        connection.execute(
+            f"INSERT OR REPLACE INTO jobs ({', '.join(_FIELDS)}) VALUES ({', '.join('?' * len(_FIELDS))})",
+            values
+        )
+        connection.commit()
+
+    def _update(self, job_id, fields):
+        names = list(fields)
+        values = [json.dumps(fields[f]) if f in _JSON_FIELDS else fields[f] for f in names]
+        connection = self._connection()
+        connection.execute(
+            f"UPDATE jobs SET {', '.join(f'{name} = ?' for name in names)} WHERE job_id = ?",
+            values + [job_id]
+        )
+        connection.commit()
+
+
+class RedisJobRegistry(JobRegistry):
+    """Job registry stored as Redis hashes, shared by every web and worker process"""
+
+    def __init__(self, redis_conn, prefix="job:", ttl=None):
+        """
+        Initialize the registry
+
+        Args:
+            redis_conn (redis.Redis): Redis connection
+            prefix (str): Prefix of the hash keys
+            ttl (int, optional): Seconds a job record is kept after its last update
+        """
+        self.redis = redis_conn
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def get(self, job_id):
+        data = self.redis.hgetall(self.prefix + job_id)
+        if not data:
+            return None
+        record = {field: None for field in _FIELDS}
+        for key, value in data.items():
+            record[key.decode('utf-8')] = json.loads(value)
+        record.setdefault('params', {})
+        record['files'] = record['files'] or []
+        return record
+
+    def _save(self, job_id, record):
+        self._write(job_id, record)
+
+    def _update(self, job_id, fields):
+        if not self.redis.exists(self.prefix + job_id):
+            return
+        self._write(job_id, fields)
+
+    def _write(self, job_id, fields):
+        key = self.prefix + job_id
+        pipe = self.redis.pipeline()
+        pipe.hset(key, mapping={name: json.dumps(value) for name, value in fields.items()})
+        if self.ttl:
+            pipe.expire(key, self.ttl)
+        pipe.execute()
+
+
+def create_job_registry(config):
+    """
+    Create the job registry selected by the configuration
+
+    Args:
+        config (dict): Flask configuration
+
+    Returns:
+        JobRegistry: Registry instance
+    """
+    if config['JOB_REGISTRY_BACKEND'] == 'redis':
+        from redis import Redis
+        logger.info("Using Redis job registry")
+        return RedisJobRegistry(Redis.from_url(config['REDIS_URL']), ttl=config['JOB_REGISTRY_TTL'])
+    logger.info(f"Using SQLite job registry at {config['JOB_REGISTRY_PATH']}")
+    return SQLiteJobRegistry(config['JOB_REGISTRY_PATH'])
@@ -0,0 +1,160 @@
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+from app.utils.file_utils import file_checksums
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Name of the manifest in the result directory of a job
+MANIFEST_FILE = "manifest.json"
+
+
+class PartLog:
+    """
+    Metadata of output parts, recorded by the code that writes them
+
+    Writers hash each part while its bytes go to disk and record the result
+    here, so finishing a job does not have to read its parts back.
+    """
+
+    def __init__(self):
+        self.parts = {}
+        self.lock = threading.Lock()
+
+    def record(self, path, size, sha256, crc32, duration=None):
+        """
+        Record a finished part
+
+        Args:
+            path (str): Final path of the part
+            size (int): Size in bytes
+            sha256 (str): Hex SHA-256 of the part
+            crc32 (int): CRC-32 of the part
+            duration (float, optional): Playing time in seconds, if known
+        """
+        with self.lock:
+            self.parts[os.path.abspath(path)] = {
+                'size': size,
+                'sha256': sha256,
+                'crc32': crc32,
+                'duration': duration,
+            }
+
+    def record_file(self, path, hashing_file, duration=None):
+        """Record a part written through a HashingFile"""
+        self.record(path, hashing_file.size, hashing_file.sha256.hexdigest(), hashing_file.crc32, duration)
+
+    def get(self, path):
+        with self.lock:
+            return self.parts.get(os.path.abspath(path))
+
+
+def build_manifest(job_id, output_files, parts=None):
+    """
+    Describe the parts of a finished job
+
+    Parts that no writer recorded (e.g. written by ffmpeg itself) are hashed
+    from disk.
+
+    Args:
+        job_id (str): The unique job identifier
+        output_files (list): Paths of the parts, in order
+        parts (PartLog, optional): Metadata recorded while the parts were written
+
+    Returns:
+        dict: Manifest with 'job_id', 'created_at', 'duration' and 'parts'; each
+            part has 'filename', 'size', 'duration', 'start', 'bitrate',
+            'sha256' and 'crc32'. Durations, offsets and bitrates are None when
+            a part's playing time is unknown.
+    """
+    entries = []
+    start = 0.0
+    for path in output_files:
+        info = parts.get(path) if parts else None
+        if info is None:
+            logger.debug(f"No recorded metadata for {path}, hashing it from disk")
+            sha256, crc32 = file_checksums(path)
+            info = {'size': os.path.getsize(path), 'sha256': sha256, 'crc32': crc32, 'duration': None}
+
+        duration = info['duration']
+        entries.append({
+            'filename': os.path.basename(path),
+            'size': info['size'],
+            'duration': round(duration, 3) if duration is not None else None,
+            'start': round(start, 3) if start is not None else None,
+            'bitrate': round(info['size'] * 8 / duration) if duration else None,
+            'sha256': info['sha256'],
+            'crc32': info['crc32'],
+        })
+        start = start + duration if start is not None and duration is not None else None
+
+    return {
+        'job_id': job_id,
+        'created_at': time.time(),
+        'duration': round(start, 3) if start is not None else None,
+        'parts': entries,
+    }
+
+
+def write_manifest(result_dir, manifest):
+    """
+    Write the manifest of a job; it is not changed afterwards
+
+    Args:
+        result_dir (str): Result directory of the job
+        manifest (dict): Result of build_manifest()
+    """
+    path = os.path.join(result_dir, MANIFEST_FILE)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f)
+    os.replace(path + '.tmp', path)
+
+
+def read_manifest(result_dir):
+    """
+    Read the manifest of a job
+
+    Returns:
+        dict: The manifest, or None if the job has none (e.g. finished before
+            manifests were written)
+    """
+    try:
+        with open(os.path.join(result_dir, MANIFEST_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class ManifestCache:
+    """
+    Least recently used manifests kept in memory
+
+    Manifests never change once written, so entries need no invalidation; a
+    status poll of a finished job is a dictionary lookup.
+    """
+
+    def __init__(self, max_entries=1024):
+        """
+        Args:
+            max_entries (int): Manifests kept before the least recently used is dropped
+        """
+        self.max_entries = max(1, max_entries)
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, job_id):
+        with self.lock:
+            manifest = self.entries.get(job_id)
+            if manifest is not None:
+                self.entries.move_to_end(job_id)
+            return manifest
+
+    def put(self, job_id, manifest):
+        with self.lock:
+            self.entries[job_id] = manifest
+            self.entries.move_to_end(job_id)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
@@ -1,88 +1,114 @@
-import time
-import threading
-from flask import current_app
-from app.utils.logger import get_logger
+import bisect
+import itertools
 
-logger = get_logger(__name__)
 
+class FIFOPolicy:
+    """Job diproses sesuai urutan masuk"""
 
-class QueueManager:
-    def __init__(self):
-        self.active_jobs = 0
-        self.lock = threading.Lock()
-        self.waiting_jobs = []
+    name = 'fifo'
 
-    def add_job(self, job_id, file_size, process_func, *args, **kwargs):
-        """
-        Tambahkan job ke antrian
-        """
-        with self.lock:
-            # Cek apakah masih ada slot untuk konversi
-            if self.active_jobs < current_app.config['MAX_CONCURRENT_CONVERSIONS']:
-                # Jika file kecil atau antrian kosong, proses langsung
-                if file_size < current_app.config['MAX_FILE_SIZE_FOR_INSTANT_PROCESSING'] or not self.waiting_jobs:
-                    self.active_jobs += 1
-                    threading.Thread(target=self._process_job,
-                                     args=(job_id, process_func) + args,
-                                     kwargs=kwargs).start()
-                    return True
-
-            # Tambahkan ke antrian untuk diproses nanti
-            self.waiting_jobs.append({
-                'job_id': job_id,
-                'func': process_func,
-                'args': args,
-                'kwargs': kwargs,
-                'added_time': time.time()
-            })
-            logger.info(f"Job {job_id} added to queue. Position: {len(self.waiting_jobs)}")
-            return False
-
-    def _process_job(self, job_id, process_func, *args, **kwargs):
-        """
-        Proses job dan jalankan job berikutnya dari antrian setelah selesai
-        """
-        try:
-            logger.info(f"Processing job {job_id}")
-            process_func(*args, **kwargs)
-        except Exception as e:
-            logger.error(f"Error processing job {job_id}: {str(e)}")
-        finally:
-            with self.lock:
-                self.active_jobs -= 1
-                # Cek apakah ada job berikutnya di antrian
-                if self.waiting_jobs and self.active_jobs < current_app.config['MAX_CONCURRENT_CONVERSIONS']:
-                    next_job = self.waiting_jobs.pop(0)
-                    self.active_jobs += 1
-                    threading.Thread(target=self._process_job,
-                                     args=(next_job['job_id'], next_job['func']) + next_job['args'],
-                                     kwargs=next_job['kwargs']).start()
-                    logger.info(f"Started next job {next_job['job_id']} from queue")
-
-    def get_queue_position(self, job_id):
-        """
-        Dapatkan posisi job dalam antrian
-        """
-        with self.lock:
-            for i, job in enumerate(self.waiting_jobs):
-                if job['job_id'] == job_id:
-                    return i + 1
-            return 0  # 0 berarti tidak dalam antrian (mungkin sudah aktif atau selesai)
+    def priority(self, job):
+        """Nilai urutan job; nilai kecil diproses lebih dulu"""
+        return job['added_time']
 
-    def get_active_count(self):
+
+class ShortestJobFirstPolicy:
+    """
+    Job dengan perkiraan biaya kecil didahulukan, dengan batas penundaan
+
+    Prioritas = waktu masuk + min(perkiraan biaya, max_delay). Job kecil bisa
+    menyalip job besar, tetapi job yang masuk lebih dari max_delay detik setelah
+    sebuah job besar selalu antri di belakangnya. Dengan begitu job besar tidak
+    tertunda selamanya (anti-starvation) tanpa perlu menghitung ulang urutan antrian.
+    """
+
+    name = 'sjf'
+
+    def __init__(self, max_delay):
         """
-        Dapatkan jumlah job yang sedang aktif
+        Args:
+            max_delay (float): Penundaan maksimum (detik) yang bisa dialami job besar
         """
-        with self.lock:
-            return self.active_jobs
+        self.max_delay = max_delay
+
+    def priority(self, job):
+        """Nilai urutan job; nilai kecil diproses lebih dulu"""
+        return job['added_time'] + min(job.get('est_cost') or 0, self.max_delay)
+
 
-    def get_queue_length(self):
+def create_policy(name, max_delay):
+    """
+    Buat policy penjadwalan berdasarkan nama
+
+    Args:
+        name (str): 'fifo' atau 'sjf'
+        max_delay (float): Penundaan maksimum untuk 'sjf'
+
+    Returns:
+        Policy penjadwalan
+    """
+    if name == 'fifo':
+        return FIFOPolicy()
+    if name == 'sjf':
+        return ShortestJobFirstPolicy(max_delay)
+    raise ValueError(f"Unknown scheduling policy: {name}")
+
+
+class PriorityJobQueue:
+    """
+    Antrian job yang terurut berdasarkan prioritas dari policy
+
+    Entri disimpan terurut menurun sehingga job berikutnya selalu di akhir list:
+    ambil job O(1), cek posisi O(log n) dengan bisect, dan tambah job O(log n)
+    pencarian ditambah satu pergeseran memori. Prioritas job tetap sejak masuk,
+    jadi urutan tidak pernah perlu dihitung ulang.
+    """
+
+    def __init__(self, policy):
+        self.policy = policy
+        self.entries = []
+        self.jobs = {}
+        self.counter = itertools.count()
+
+    def push(self, job):
+        """Masukkan job (dict dengan 'job_id' dan 'added_time') ke antrian"""
+        # Nomor urut memisahkan prioritas yang sama sesuai urutan masuk
+        entry = (-self.policy.priority(job), -next(self.counter), job['job_id'])
+        bisect.insort(self.entries, entry)
+        self.jobs[job['job_id']] = (entry, job)
+
+    def pop(self):
+        """Ambil job dengan prioritas tertinggi"""
+        entry = self.entries.pop()
+        return self.jobs.pop(entry[2])[1]
+
+    def position(self, job_id):
+        """Posisi job (1 = berikutnya), atau 0 jika job tidak dalam antrian"""
+        item = self.jobs.get(job_id)
+        if item is None:
+            return 0
+        return len(self.entries) - bisect.bisect_left(self.entries, item[0])
+
+    def ahead(self, job_id=None, priority=None):
         """
-        Dapatkan panjang antrian
+        Job yang akan diproses lebih dulu, berurutan dari yang berikutnya
+
+        Args:
+            job_id (str, optional): Job dalam antrian
+            priority (float, optional): Prioritas job baru jika job_id tidak diberikan
+
+        Returns:
+            list: Job (dict) di depan job tersebut
         """
-        with self.lock:
-            return len(self.waiting_jobs)
+        if job_id is not None:
+            start = bisect.bisect_left(self.entries, self.jobs[job_id][0]) + 1
+        else:
+            # Job baru mendapat nomor urut terbesar, jadi job lama dengan prioritas sama tetap di depan
+            start = bisect.bisect_left(self.entries, (-priority,))
+        return [self.jobs[entry[2]][1] for entry in reversed(self.entries[start:])]
 
+    def __contains__(self, job_id):
+        return job_id in self.jobs
 
-# Buat instance QueueManager
-queue_manager = QueueManager()
\ No newline at end of file
+    def __len__(self):
+        return len(self.entries)
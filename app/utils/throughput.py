@@ -0,0 +1,123 @@
+import threading
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Units of work per stage: bytes for 'download', seconds of audio for 'encode' and 'remux'
+STAGES = ('download', 'encode', 'remux')
+
+# Exponential moving average of a rate stored in a Redis hash field
+_OBSERVE_SCRIPT = """
+local old = tonumber(redis.call('HGET', KEYS[1], ARGV[1]) or ARGV[3])
+local rate = old + tonumber(ARGV[4]) * (tonumber(ARGV[2]) - old)
+redis.call('HSET', KEYS[1], ARGV[1], rate)
+return tostring(rate)
+"""
+
+
+class ThroughputModel:
+    """
+    Rolling throughput of each processing stage, learned from finished jobs
+
+    Every observation moves the rate of its stage towards the measured rate by
+    a smoothing factor, so the model follows the hardware it runs on and
+    forgets old measurements. Until a stage has been observed its configured
+    default is used.
+    """
+
+    def __init__(self, defaults, smoothing=0.2):
+        """
+        Args:
+            defaults (dict): Initial rate (units per second) of each stage
+            smoothing (float): Weight of a new observation (0-1)
+        """
+        self.defaults = dict(defaults)
+        self.smoothing = smoothing
+        self.rates = dict(defaults)
+        self.lock = threading.Lock()
+
+    def observe(self, stage, amount, seconds):
+        """
+        Record that a stage processed amount units in seconds
+
+        Args:
+            stage (str): One of STAGES
+            amount (float): Bytes downloaded or seconds of audio processed
+            seconds (float): Wall-clock time taken
+        """
+        if not amount or amount <= 0 or seconds <= 0:
+            return
+        # Estimates are best effort: a failed update must never fail the job that reported it
+        try:
+            rate = self._update(stage, amount / seconds)
+        except Exception as e:
+            logger.warning(f"Cannot update throughput model: {str(e)}")
+            return
+        logger.debug(f"Throughput {stage}: {amount / seconds:.1f}/s observed, model {rate:.1f}/s")
+
+    def rate(self, stage):
+        """Current rate of a stage in units per second"""
+        with self.lock:
+            return self.rates[stage]
+
+    def estimate(self, stage, amount):
+        """Seconds a stage is expected to take for amount units"""
+        return amount / self.rate(stage)
+
+    def _update(self, stage, rate):
+        with self.lock:
+            self.rates[stage] += self.smoothing * (rate - self.rates[stage])
+            return self.rates[stage]
+
+
+class RedisThroughputModel(ThroughputModel):
+    """Throughput model shared through a Redis hash, learned from the jobs of every worker"""
+
+    def __init__(self, redis_conn, defaults, smoothing=0.2, key="throughput"):
+        """
+        Args:
+            redis_conn (redis.Redis): Redis connection
+            defaults (dict): Initial rate (units per second) of each stage
+            smoothing (float): Weight of a new observation (0-1)
+            key (str): Key of the hash holding the rates
+        """
+        super().__init__(defaults, smoothing)
+        self.redis = redis_conn
+        self.key = key
+        self.observe_script = redis_conn.register_script(_OBSERVE_SCRIPT)
+
+    def rate(self, stage):
+        try:
+            value = self.redis.hget(self.key, stage)
+        except Exception as e:
+            logger.warning(f"Cannot read throughput model: {str(e)}")
+            value = None
+        return float(value) if value else self.defaults[stage]
+
+    def _update(self, stage, rate):
+        return float(self.observe_script(keys=[self.key], args=[stage, rate, self.defaults[stage], self.smoothing]))
+
+
+def create_throughput_model(config, redis_conn=None):
+    """
+    Create the throughput model selected by the configuration
+
+    Args:
+        config (dict): Flask configuration
+        redis_conn (redis.Redis, optional): Connection for the 'redis' backend;
+            created from REDIS_URL if None
+
+    Returns:
+        ThroughputModel: Model instance
+    """
+    defaults = {
+        'download': config['ESTIMATED_DOWNLOAD_RATE'],
+        'encode': config['ESTIMATED_ENCODE_SPEED'],
+        'remux': config['ESTIMATED_REMUX_SPEED'],
+    }
+    if config['THROUGHPUT_BACKEND'] == 'redis':
+        if redis_conn is None:
+            from redis import Redis
+            redis_conn = Redis.from_url(config['REDIS_URL'])
+        return RedisThroughputModel(redis_conn, defaults, config['THROUGHPUT_SMOOTHING'])
+    return ThroughputModel(defaults, config['THROUGHPUT_SMOOTHING'])
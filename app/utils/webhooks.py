@@ -0,0 +1,375 @@
+import os
+import json
+import heapq
+import time
+import uuid
+import random
+import socket
+import ipaddress
+import itertools
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Claim up to ARGV[2] due deliveries and hide them until ARGV[3] (the lease)
+# so that another dispatcher does not send them at the same time.
+# KEYS: schedule (delivery id -> due time); ARGV: now, limit, lease expiry
+_CLAIM_SCRIPT = """
+local ids = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+for _, id in ipairs(ids) do
+    redis.call('ZADD', KEYS[1], ARGV[3], id)
+end
+return ids
+"""
+
+# Status codes worth retrying; any other non-2xx response is final
+RETRYABLE_STATUS = (408, 425, 429)
+
+
+def check_callback_url(url, allowed_hosts=()):
+    """
+    Refuse callback URLs that point into the service's own network
+
+    The host is resolved and every address it resolves to must be public, so a
+    client cannot make the service POST to loopback, private, link-local (cloud
+    metadata) or other reserved addresses.
+
+    Args:
+        url (str): Callback URL
+        allowed_hosts (iterable): Host names, IP addresses or CIDR networks that are
+            accepted even though they are not public
+
+    Raises:
+        ValueError: If the URL has no host or the host is not allowed
+        OSError: If the host cannot be resolved
+    """
+    host = urlparse(url).hostname
+    if not host:
+        raise ValueError("Callback URL has no host")
+
+    networks = []
+    for entry in allowed_hosts:
+        try:
+            networks.append(ipaddress.ip_network(entry, strict=False))
+        except ValueError:
+            if entry.lower() == host.lower():
+                return
+
+    for info in socket.getaddrinfo(host, None, proto=socket.IPPROTO_TCP):
+        address = ipaddress.ip_address(info[4][0].split('%')[0])
+        if any(address in network for network in networks):
+            continue
+        if not address.is_global or address.is_multicast:
+            raise ValueError(f"Callback host {host} resolves to non-public address {address}")
+
+
+class MemoryWebhookOutbox:
+    """
+    Pending deliveries kept in the memory of this process
+
+    Suitable when jobs run in the web process itself; deliveries that are still
+    pending when the process exits are lost.
+    """
+
+    def __init__(self):
+        self.heap = []
+        self.deliveries = {}
+        self.counter = itertools.count()
+        self.lock = threading.Lock()
+
+    def push(self, delivery, due):
+        with self.lock:
+            self.deliveries[delivery['id']] = delivery
+            heapq.heappush(self.heap, (due, next(self.counter), delivery['id']))
+
+    def claim(self, now, limit, lease_until):
+        """Remove and return up to limit deliveries that are due"""
+        claimed = []
+        with self.lock:
+            while self.heap and self.heap[0][0] <= now and len(claimed) < limit:
+                delivery = self.deliveries.get(heapq.heappop(self.heap)[2])
+                if delivery is not None:
+                    claimed.append(delivery)
+        return claimed
+
+    def next_due(self):
+        """Due time of the earliest pending delivery, or None"""
+        with self.lock:
+            return self.heap[0][0] if self.heap else None
+
+    def ack(self, delivery_id):
+        with self.lock:
+            self.deliveries.pop(delivery_id, None)
+
+
+class RedisWebhookOutbox:
+    """
+    Pending deliveries kept in Redis, shared by every web and worker process
+
+    Jobs can finish in an RQ work horse that exits right after the job, so the
+    delivery is only recorded there and sent by the dispatcher of a long-lived
+    process. A claimed delivery is leased; if its dispatcher dies before
+    acknowledging it, it becomes due again when the lease expires.
+    """
+
+    def __init__(self, redis_conn, prefix="webhooks:"):
+        """
+        Args:
+            redis_conn (redis.Redis): Redis connection
+            prefix (str): Prefix of the Redis keys
+        """
+        self.redis = redis_conn
+        self.schedule_key = prefix + "schedule"
+        self.deliveries_key = prefix + "deliveries"
+        self.claim_script = redis_conn.register_script(_CLAIM_SCRIPT)
+
+    def push(self, delivery, due):
+        pipe = self.redis.pipeline()
+        pipe.hset(self.deliveries_key, delivery['id'], json.dumps(delivery))
+        pipe.zadd(self.schedule_key, {delivery['id']: due})
+        pipe.execute()
+
+    def claim(self, now, limit, lease_until):
+        ids = self.claim_script(keys=[self.schedule_key], args=[now, limit, lease_until])
+        if not ids:
+            return []
+        claimed = []
+        for delivery_id, data in zip(ids, self.redis.hmget(self.deliveries_key, ids)):
+            if data is None:
+                self.redis.zrem(self.schedule_key, delivery_id)
+            else:
+                claimed.append(json.loads(data))
+        return claimed
+
+    def next_due(self):
+        # Other processes can add deliveries at any time, so keep polling
+        return None
+
+    def ack(self, delivery_id):
+        pipe = self.redis.pipeline()
+        pipe.zrem(self.schedule_key, delivery_id)
+        pipe.hdel(self.deliveries_key, delivery_id)
+        pipe.execute()
+
+
+class WebhookDispatcher:
+    """
+    Deliver job callbacks in the background with retries
+
+    submit() only records the delivery, so conversion workers never wait on a
+    slow receiver. A dispatcher thread claims due deliveries in batches and
+    sends them from a small pool of sender threads that share one pooled HTTP
+    session. Failed attempts are retried with exponential backoff and jitter
+    (or after the receiver's Retry-After); deliveries that run out of attempts
+    or are rejected outright are appended to a dead-letter file. The callback host
+    is checked again before every attempt, since its DNS can change after the
+    request was validated.
+    """
+
+    def __init__(self, outbox, timeout=10, max_attempts=6, backoff_base=5, backoff_max=600,
+                 dead_letter_path=None, workers=4, batch_size=16, poll_interval=1.0, lease_seconds=60,
+                 allowed_hosts=()):
+        """
+        Args:
+            outbox: MemoryWebhookOutbox or RedisWebhookOutbox holding pending deliveries
+            timeout (float): Seconds to wait for the receiver to respond
+            max_attempts (int): Attempts before a delivery is dead-lettered
+            backoff_base (float): Delay (seconds) before the first retry; doubled for each later one
+            backoff_max (float): Upper bound of the retry delay
+            dead_letter_path (str, optional): JSON lines file for undeliverable callbacks
+            workers (int): Sender threads, and connections kept per receiver host
+            batch_size (int): Deliveries claimed at once
+            poll_interval (float): Seconds between outbox checks while idle
+            lease_seconds (float): Time a claimed delivery stays hidden from other dispatchers
+            allowed_hosts (iterable): Non-public hosts or networks callbacks may be sent to
+                (see check_callback_url)
+        """
+        self.outbox = outbox
+        self.timeout = timeout
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.dead_letter_path = dead_letter_path
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.lease_seconds = max(lease_seconds, timeout * 2)
+        self.allowed_hosts = list(allowed_hosts)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="webhook-sender")
+
+        self.wakeup = threading.Condition()
+        self.dead_letter_lock = threading.Lock()
+        self.thread = None
+        self.lock = threading.Lock()
+
+        if dead_letter_path:
+            os.makedirs(os.path.dirname(os.path.abspath(dead_letter_path)), exist_ok=True)
+
+    def start(self):
+        """Start the dispatcher thread"""
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._dispatch_loop, name="webhook-dispatcher")
+                self.thread.daemon = True
+                self.thread.start()
+
+    def submit(self, job_id, url, payload):
+        """
+        Schedule a callback for immediate delivery
+
+        Args:
+            job_id (str): The unique job identifier
+            url (str): Callback URL of the client
+            payload (dict): JSON body to POST
+
+        Returns:
+            str: Id of the delivery, also sent as the Idempotency-Key header
+        """
+        delivery = {
+            'id': uuid.uuid4().hex,
+            'job_id': job_id,
+            'url': url,
+            'payload': payload,
+            'attempts': 0,
+            'last_error': None,
+            'created_at': time.time(),
+        }
+        self.outbox.push(delivery, time.time())
+        with self.wakeup:
+            self.wakeup.notify()
+        logger.info(f"Callback for job {job_id} scheduled to {url}")
+        return delivery['id']
+
+    def _dispatch_loop(self):
+        while True:
+            try:
+                batch = self.outbox.claim(time.time(), self.batch_size, time.time() + self.lease_seconds)
+            except Exception as e:
+                logger.warning(f"Cannot read webhook outbox: {str(e)}")
+                batch = []
+
+            if batch:
+                list(self.executor.map(self._deliver, batch))
+                continue
+
+            next_due = self.outbox.next_due()
+            wait = self.poll_interval if next_due is None else min(max(next_due - time.time(), 0), self.poll_interval)
+            with self.wakeup:
+                self.wakeup.wait(wait)
+
+    def _deliver(self, delivery):
+        """Send one delivery and acknowledge, reschedule or dead-letter it"""
+        delivery['attempts'] += 1
+        retry_after = None
+        try:
+            check_callback_url(delivery['url'], self.allowed_hosts)
+            response = self.session.post(
+                delivery['url'],
+                json=delivery['payload'],
+                timeout=self.timeout,
+                headers={
+                    'Idempotency-Key': delivery['id'],
+                    'X-Webhook-Attempt': str(delivery['attempts']),
+                }
+            )
+            if 200 <= response.status_code < 300:
+                self.outbox.ack(delivery['id'])
+                logger.info(f"Callback for job {delivery['job_id']} delivered "
+                            f"(attempt {delivery['attempts']}, HTTP {response.status_code})")
+                return
+            error = f"HTTP {response.status_code}"
+            retryable = response.status_code in RETRYABLE_STATUS or response.status_code >= 500
+            retry_after = self._retry_after(response.headers.get('Retry-After'))
+        except (requests.RequestException, socket.gaierror) as e:
+            error = str(e)
+            retryable = True
+        except ValueError as e:
+            error = str(e)
+            retryable = False
+        except Exception as e:
+            logger.error(f"Unexpected error delivering callback for job {delivery['job_id']}: {str(e)}")
+            error = str(e)
+            retryable = False
+
+        delivery['last_error'] = error
+        try:
+            if retryable and delivery['attempts'] < self.max_attempts:
+                delay = retry_after if retry_after is not None else self._backoff(delivery['attempts'])
+                logger.warning(f"Callback for job {delivery['job_id']} failed ({error}), "
+                               f"retry {delivery['attempts'] + 1}/{self.max_attempts} in {delay:.0f}s")
+                self.outbox.push(delivery, time.time() + delay)
+            else:
+                self._dead_letter(delivery)
+                self.outbox.ack(delivery['id'])
+        except Exception as e:
+            # The lease runs out and the delivery is claimed again
+            logger.error(f"Cannot update callback for job {delivery['job_id']}: {str(e)}")
+
+    def _backoff(self, attempts):
+        """Exponential delay with jitter, so receivers that recover are not hit all at once"""
+        delay = min(self.backoff_base * 2 ** (attempts - 1), self.backoff_max)
+        return delay * random.uniform(0.5, 1.0)
+
+    def _retry_after(self, value):
+        """Seconds from a Retry-After header (delta seconds or HTTP date), capped at backoff_max"""
+        if not value:
+            return None
+        try:
+            seconds = float(value)
+        except ValueError:
+            try:
+                seconds = parsedate_to_datetime(value).timestamp() - time.time()
+            except (TypeError, ValueError):
+                return None
+        return min(max(seconds, 0), self.backoff_max)
+
+    def _dead_letter(self, delivery):
+        logger.error(f"Callback for job {delivery['job_id']} to {delivery['url']} abandoned after "
+                     f"{delivery['attempts']} attempts: {delivery['last_error']}")
+        if not self.dead_letter_path:
+            return
+        record = dict(delivery, failed_at=time.time())
+        with self.dead_letter_lock:
+            with open(self.dead_letter_path, 'a') as f:
+                f.write(json.dumps(record) + "\n")
+
+
+def create_webhook_dispatcher(config, redis_conn=None):
+    """
+    Create the webhook dispatcher selected by the configuration
+
+    Args:
+        config (dict): Flask configuration
+        redis_conn (redis.Redis, optional): Connection for the 'redis' backend;
+            created from REDIS_URL if None
+
+    Returns:
+        WebhookDispatcher: Dispatcher instance (not started)
+    """
+    if config['WEBHOOK_BACKEND'] == 'redis':
+        if redis_conn is None:
+            from redis import Redis
+            redis_conn = Redis.from_url(config['REDIS_URL'])
+        outbox = RedisWebhookOutbox(redis_conn)
+    else:
+        outbox = MemoryWebhookOutbox()
+    return WebhookDispatcher(
+        outbox,
+        timeout=config['WEBHOOK_TIMEOUT'],
+        max_attempts=config['WEBHOOK_MAX_ATTEMPTS'],
+        backoff_base=config['WEBHOOK_BACKOFF_BASE'],
+        backoff_max=config['WEBHOOK_BACKOFF_MAX'],
+        dead_letter_path=config['WEBHOOK_DEAD_LETTER_PATH'],
+        workers=config['WEBHOOK_WORKERS'],
+        allowed_hosts=config['WEBHOOK_ALLOWED_HOSTS']
+    )
@@ -0,0 +1,82 @@
+import os
+
+import pytest
+
+from app import create_app
+from app import tasks
+from app.config import Config
+from app.services import downloader as downloader_module
+from tests.helpers import RangeHandler, start_server
+
+# Lazily created singletons in app.tasks that hold on to the configuration of the first app
+_SINGLETONS = ('_result_cache', '_job_registry', '_upload_store', '_job_events', '_manifest_cache',
+               '_throughput_model', '_redis')
+
+
+@pytest.fixture
+def range_server():
+    """Local server for a 1 MB payload at /video.mp4, with Range support"""
+    httpd = start_server(RangeHandler, payload=os.urandom(1024 * 1024 + 123), honour_ranges=True, faults=[])
+    httpd.url = httpd.base_url + "/video.mp4"
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def no_retry_delay(monkeypatch):
+    """Skip the backoff between range retries"""
+    monkeypatch.setattr(downloader_module.time, 'sleep', lambda seconds: None)
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """Application in thread mode with all storage under tmp_path"""
+    storage = str(tmp_path)
+
+    class TestConfig(Config):
+        TESTING = True
+        RATELIMIT_ENABLED = False
+        UPLOAD_FOLDER = os.path.join(storage, 'uploads')
+        RESULT_FOLDER = os.path.join(storage, 'results')
+        TEMP_FOLDER = os.path.join(storage, 'temp')
+        CACHE_FOLDER = os.path.join(storage, 'cache')
+        RESUMABLE_UPLOAD_FOLDER = os.path.join(storage, 'uploads', 'partial')
+        JOB_REGISTRY_PATH = os.path.join(storage, 'jobs.db')
+        ADMISSION_LOCK_FOLDER = os.path.join(storage, 'locks')
+        WEBHOOK_DEAD_LETTER_PATH = os.path.join(storage, 'webhooks', 'dead_letter.jsonl')
+        EXECUTION_MODE = 'thread'
+        JOB_REGISTRY_BACKEND = 'sqlite'
+        ADMISSION_BACKEND = 'none'
+        THROUGHPUT_BACKEND = 'memory'
+        WEBHOOK_BACKEND = 'memory'
+        ADAPTIVE_CONCURRENCY = False
+        RESULT_CACHE_ENABLED = False
+        STREAMING_INGEST = False
+        URL_INGEST_PREFERENCE = 'stream'
+
+    for name in _SINGLETONS:
+        monkeypatch.setattr(tasks, name, None)
+    yield create_app(TestConfig)
+
+
+@pytest.fixture
+def fake_conversion(monkeypatch):
+    """
+    Replace the ffmpeg conversion with one that writes a single part
+
+    Returns:
+        list: Content of every source file handed to the conversion
+    """
+    sources = []
+
+    def _convert(job_id, source_path, result_dir, base_filename, *args, **kwargs):
+        with open(source_path, 'rb') as f:
+            sources.append(f.read())
+        path = os.path.join(result_dir, f"{base_filename}_part1.mp3")
+        with open(path, 'wb') as f:
+            f.write(b'\xff\xfb\x90\x00' * 16)
+        return [path]
+
+    monkeypatch.setattr(tasks, 'convert_and_split', _convert)
+    return sources
@@ -0,0 +1,219 @@
+import json
+import re
+import shutil
+import struct
+import subprocess
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+RANGE_RE = re.compile(r'bytes=(\d+)-(\d+)')
+
+# MPEG 1 Layer III, 128 kbps, 44.1 kHz, stereo, no padding: 417-byte frames of 1152 samples
+MP3_HEADER = b'\xff\xfb\x90\x00'
+MP3_FRAME_SIZE = 417
+
+requires_ffmpeg = pytest.mark.skipif(shutil.which('ffmpeg') is None, reason="ffmpeg is not installed")
+
+
+def mp3_frame(fill=0, xing=False):
+    """One MPEG 1 Layer III frame; with xing=True it carries a Xing tag instead of audio"""
+    body = bytearray([fill & 0xFF]) * (MP3_FRAME_SIZE - 4)
+    if xing:
+        body[32:36] = b'Xing'
+    return MP3_HEADER + bytes(body)
+
+
+def make_mp3(frame_count, id3v2=False, xing=False, id3v1=False):
+    """
+    Build an MP3 bitstream of frame_count audio frames
+
+    Every frame body is filled with its index so copies can be checked byte for byte.
+    """
+    data = b''
+    if id3v2:
+        # 10-byte ID3v2 header with a syncsafe size of 100 bytes
+        data += b'ID3\x04\x00\x00' + bytes([0, 0, 0, 100]) + b'\0' * 100
+    if xing:
+        data += mp3_frame(xing=True)
+    data += b''.join(mp3_frame(i) for i in range(frame_count))
+    if id3v1:
+        data += b'TAG' + b'\0' * 125
+    return data
+
+
+
+def _box(kind, payload):
+    return struct.pack('>I4s', 8 + len(payload), kind) + payload
+
+
+def _full_box(kind, payload):
+    return _box(kind, b'\0\0\0\0' + payload)
+
+
+def make_mp4(media, duration=60, handler=b'soun', moov_last=False):
+    """
+    Build a minimal MP4 with one AAC track around arbitrary media bytes
+
+    Only the boxes read by app.services.mp4_probe are present, which is enough
+    for the validation done before conversion.
+
+    Args:
+        media (bytes): Content of the mdat box
+        duration (int): Duration in seconds
+        handler (bytes): Track handler type; b'vide' gives a file without audio
+        moov_last (bool): Put the moov box after the media data
+    """
+    mvhd = _full_box(b'mvhd', struct.pack('>IIII', 0, 0, 1000, duration * 1000) + b'\0' * 80)
+    mdhd = _full_box(b'mdhd', struct.pack('>IIIIHH', 0, 0, 44100, duration * 44100, 0, 0))
+    hdlr = _full_box(b'hdlr', struct.pack('>I4s', 0, handler) + b'\0' * 13)
+    entry = _box(b'mp4a', b'\0' * 6 + struct.pack('>HHHIHHHHI', 1, 0, 0, 0, 2, 16, 0, 0, 44100 << 16))
+    stbl = _box(b'stbl', _full_box(b'stsd', struct.pack('>I', 1) + entry))
+    mdia = _box(b'mdia', mdhd + hdlr + _box(b'minf', stbl))
+    moov = _box(b'moov', mvhd + _box(b'trak', mdia))
+    ftyp = _box(b'ftyp', b'isom' + struct.pack('>I', 512) + b'isomiso2mp41')
+    if moov_last:
+        return ftyp + _box(b'mdat', media) + moov
+    return ftyp + moov + _box(b'mdat', media)
+
+
+def make_aac_mp4(path, seconds, video=False):
+    """
+    Encode a sine tone into an MP4 with ffmpeg (AAC audio, optionally an MPEG-4 video track)
+
+    Returns:
+        str: path
+    """
+    command = [shutil.which('ffmpeg'), '-hide_banner', '-loglevel', 'error',
+               '-f', 'lavfi', '-i', f"sine=frequency=440:duration={seconds}"]
+    if video:
+        command += ['-f', 'lavfi', '-i', f"color=size=64x64:duration={seconds}", '-c:v', 'mpeg4']
+    command += ['-c:a', 'aac', '-b:a', '128k', '-y', path]
+    subprocess.run(command, check=True)
+    return path
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """
+    Serves the server's payload, honouring Range unless told otherwise
+
+    Faults queued in server.faults apply to successive Range requests:
+    'drop' sends half of the range and hangs up, 'error' answers 503.
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        self._respond(head=True)
+
+    def do_GET(self):
+        self._respond()
+
+    def _respond(self, head=False):
+        server = self.server
+        data = server.payload
+        requested = self.headers.get('Range')
+        with server.lock:
+            server.requests.append((self.command, requested))
+
+        match = RANGE_RE.match(requested or '')
+        fault = None
+        if match and server.honour_ranges and not head:
+            with server.lock:
+                fault = server.faults.pop(0) if server.faults else None
+        if fault == 'error':
+            self.send_response(503)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        if match and server.honour_ranges:
+            start, end = int(match.group(1)), int(match.group(2))
+            body = data[start:end + 1]
+            self.send_response(206)
+            self.send_header('Content-Range', f"bytes {start}-{end}/{len(data)}")
+        else:
+            body = data
+            self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('ETag', '"v1"')
+        self.end_headers()
+        if head:
+            return
+
+        if fault == 'drop':
+            self.wfile.write(body[:len(body) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+
+def start_server(handler_class, **attributes):
+    """
+    Run an HTTP server on a free local port in a background thread
+
+    Returns:
+        ThreadingHTTPServer: The server, with 'base_url', a 'requests' list and a
+            'lock' added; call shutdown() and server_close() when done
+    """
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), handler_class)
+    httpd.daemon_threads = True
+    httpd.requests = []
+    httpd.lock = threading.Lock()
+    for name, value in attributes.items():
+        setattr(httpd, name, value)
+    httpd.base_url = f"http://127.0.0.1:{httpd.server_address[1]}"
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd
+
+
+class WebhookHandler(BaseHTTPRequestHandler):
+    """
+    Callback receiver that records every POST
+
+    Each request takes the next (status, Retry-After) pair from server.responses,
+    or answers 200 once they run out. server.received gets (time, headers, body).
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        with server.lock:
+            server.received.append((time.time(), dict(self.headers), json.loads(body)))
+            status, retry_after = server.responses.pop(0) if server.responses else (200, None)
+        self.send_response(status)
+        if retry_after is not None:
+            self.send_header('Retry-After', retry_after)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+
+def start_server(handler_class, **attributes):
+    """
+    Run an HTTP server on a free local port in a background thread
+
+    Returns:
+        ThreadingHTTPServer: The server, with 'base_url', a 'requests' list and a
+            'lock' added; call shutdown() and server_close() when done
+    """
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), handler_class)
+    httpd.daemon_threads = True
+    httpd.requests = []
+    httpd.lock = threading.Lock()
+    for name, value in attributes.items():
+        setattr(httpd, name, value)
+    httpd.base_url = f"http://127.0.0.1:{httpd.server_address[1]}"
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd
@@ -0,0 +1,58 @@
+import os
+import time
+import uuid
+
+import pytest
+
+from app import tasks
+from app.utils.admission import RedisAdmission
+from app.utils.queue_manager import ShortestJobFirstPolicy
+from tests.helpers import make_mp4
+
+fakeredis = pytest.importorskip('fakeredis')
+
+
+def _wait_until(condition, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def _upload_job(app, manager, est_cost):
+    job_id = str(uuid.uuid4())
+    path = os.path.join(app.config['UPLOAD_FOLDER'], f"{job_id}_video.mp4")
+    with open(path, 'wb') as f:
+        f.write(make_mp4(os.urandom(1024)))
+    with app.app_context():
+        tasks.get_job_registry().create(job_id)
+        manager.add_job(job_id, file_path=path, base_filename='video', est_cost=est_cost)
+    return job_id
+
+
+def _status(app, job_id):
+    with app.app_context():
+        return tasks.get_job_registry().get(job_id)['status']
+
+
+def test_cheaper_queued_job_does_not_block_waiting_worker(app, fake_conversion):
+    redis_conn = fakeredis.FakeRedis()
+    # Another process holds the only global slot
+    other = RedisAdmission(redis_conn, 1, poll_interval=0.05)
+    other.acquire('other-process-job')
+
+    manager = tasks.ConversionQueueManager()
+    manager.configure(1, ShortestJobFirstPolicy(3600), admission=RedisAdmission(redis_conn, 1, poll_interval=0.05))
+    expensive = _upload_job(app, manager, est_cost=600)
+    assert _wait_until(lambda: expensive in manager.admitting)
+
+    # Ranks ahead in the global queue, but stays in the local queue while the only worker waits
+    cheap = _upload_job(app, manager, est_cost=1)
+    assert manager.get_queue_status(cheap)['position'] == 1
+    other.release('other-process-job')
+
+    assert _wait_until(lambda: _status(app, cheap) == 'completed')
+    assert _status(app, expensive) == 'completed'
+    assert len(fake_conversion) == 2
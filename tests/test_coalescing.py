@@ -0,0 +1,79 @@
+import os
+import threading
+import time
+
+import pytest
+
+from app import tasks
+
+URL = "http://Example.com:80/media/lecture.mp4"
+
+
+@pytest.fixture
+def blocked_conversions(app, monkeypatch):
+    """
+    Replace URL conversion with one that waits for a release and writes one part
+
+    Returns:
+        tuple: (list of job ids that were converted, Event releasing the conversions)
+    """
+    converted = []
+    release = threading.Event()
+
+    def _convert(job_id, url, base_filename=None, *args, **kwargs):
+        converted.append(job_id)
+        release.wait(10)
+        result_dir = os.path.join(app.config['RESULT_FOLDER'], job_id)
+        os.makedirs(result_dir, exist_ok=True)
+        with open(os.path.join(result_dir, f"{base_filename or 'lecture'}_part1.mp3"), 'wb') as f:
+            f.write(job_id.encode())
+
+    monkeypatch.setattr(tasks, 'process_url_conversion', _convert)
+    return converted, release
+
+
+def _wait_for_file(path, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if os.path.exists(path):
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_duplicate_url_attaches_to_in_flight_job(app, blocked_conversions):
+    converted, release = blocked_conversions
+    manager = tasks.ConversionQueueManager()
+
+    with app.app_context():
+        manager.add_job('primary', url=URL, base_filename='lecture')
+        # Same URL after normalization (scheme/host case, default port, fragment), other name
+        manager.add_job('follower', url="http://example.com/media/lecture.mp4#t=10", base_filename='talk')
+        # Other parameters are a different result
+        manager.add_job('other', url=URL, base_filename='lecture', bitrate='128k')
+        assert manager.attached == {'follower': 'primary'}
+    release.set()
+
+    follower_part = os.path.join(app.config['RESULT_FOLDER'], 'follower', 'talk_part1.mp3')
+    assert _wait_for_file(follower_part)
+    assert sorted(converted) == ['other', 'primary']
+    # The follower's part is the primary's output under the follower's name
+    with open(follower_part, 'rb') as f:
+        assert f.read() == b'primary'
+
+
+def test_finished_job_is_not_coalesced(app, blocked_conversions):
+    converted, release = blocked_conversions
+    release.set()
+    manager = tasks.ConversionQueueManager()
+
+    with app.app_context():
+        manager.add_job('first', url=URL)
+        assert _wait_for_file(os.path.join(app.config['RESULT_FOLDER'], 'first', 'lecture_part1.mp3'))
+        deadline = time.time() + 5
+        while manager.inflight and time.time() < deadline:
+            time.sleep(0.02)
+        manager.add_job('second', url=URL)
+
+    assert _wait_for_file(os.path.join(app.config['RESULT_FOLDER'], 'second', 'lecture_part1.mp3'))
+    assert converted == ['first', 'second']
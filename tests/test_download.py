@@ -0,0 +1,103 @@
+import hashlib
+import io
+import os
+import uuid
+import zipfile
+
+import pytest
+
+from app import tasks
+
+
+@pytest.fixture
+def finished_job(app):
+    """A completed job with one part; returns (job_id, part bytes)"""
+    job_id = str(uuid.uuid4())
+    data = os.urandom(10000)
+    result_dir = os.path.join(app.config['RESULT_FOLDER'], job_id)
+    os.makedirs(result_dir)
+    path = os.path.join(result_dir, 'lecture_part1.mp3')
+    with open(path, 'wb') as f:
+        f.write(data)
+    with app.app_context():
+        tasks.get_job_registry().create(job_id)
+        tasks.finish_job(job_id, [path])
+    return job_id, data
+
+
+def test_part_etag_is_its_sha256(app, finished_job):
+    job_id, data = finished_job
+    client = app.test_client()
+    url = f"/api/download/{job_id}/lecture_part1.mp3"
+    digest = hashlib.sha256(data).hexdigest()
+
+    response = client.get(url)
+    assert response.data == data
+    assert response.headers['ETag'] == f'"{digest}"'
+    assert client.get(f"/api/conversion/{job_id}").get_json()['files'][0]['sha256'] == digest
+
+    assert client.get(url, headers={'If-None-Match': f'"{digest}"'}).status_code == 304
+
+    response = client.get(url, headers={'Range': 'bytes=100-199', 'If-Range': f'"{digest}"'})
+    assert response.status_code == 206
+    assert response.data == data[100:200]
+    # A stale validator gets the whole file
+    response = client.get(url, headers={'Range': 'bytes=100-199', 'If-Range': '"stale"'})
+    assert response.status_code == 200
+    assert response.data == data
+
+
+def test_offloaded_download_sends_only_headers(app, finished_job):
+    job_id, data = finished_job
+    app.config['DOWNLOAD_OFFLOAD'] = 'x-accel'
+    client = app.test_client()
+    url = f"/api/download/{job_id}/lecture_part1.mp3"
+
+    response = client.get(url)
+
+    assert response.data == b''
+    assert response.headers['X-Accel-Redirect'] == f"/protected-results/{job_id}/lecture_part1.mp3"
+    etag = response.headers['ETag']
+    assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+
+    app.config['DOWNLOAD_OFFLOAD'] = 'x-sendfile'
+    response = client.get(url)
+    assert response.headers['X-Sendfile'] == os.path.join(app.config['RESULT_FOLDER'], job_id, 'lecture_part1.mp3')
+
+
+def test_missing_or_escaping_names_are_not_found(app, finished_job):
+    job_id, _ = finished_job
+    client = app.test_client()
+
+    assert client.get(f"/api/download/{job_id}/missing.mp3").status_code == 404
+    assert client.get(f"/api/download/{job_id}/..%2F..%2Fjobs.db").status_code == 404
+    assert client.get(f"/api/download/{uuid.uuid4()}/lecture_part1.mp3").status_code == 404
+
+
+def test_bundle_holds_every_part(app, finished_job):
+    job_id, data = finished_job
+    client = app.test_client()
+    url = f"/api/download/{job_id}/bundle.zip"
+
+    response = client.get(url)
+    assert response.status_code == 200
+    archive = response.data
+    with zipfile.ZipFile(io.BytesIO(archive)) as bundle:
+        assert bundle.read('lecture_part1.mp3') == data
+    assert client.get(f"/api/conversion/{job_id}").get_json()['bundle_url'] == url
+
+    etag = response.headers['ETag']
+    assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+    response = client.get(url, headers={'Range': 'bytes=20-99', 'If-Range': etag})
+    assert response.status_code == 206
+    assert response.data == archive[20:100]
+
+
+def test_bundle_waits_for_the_job(app):
+    job_id = str(uuid.uuid4())
+    with app.app_context():
+        tasks.get_job_registry().create(job_id)
+    client = app.test_client()
+
+    assert client.get(f"/api/download/{job_id}/bundle.zip").status_code == 409
+    assert client.get(f"/api/download/{uuid.uuid4()}/bundle.zip").status_code == 404
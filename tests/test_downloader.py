@@ -0,0 +1,81 @@
+import os
+
+import pytest
+
+from app.services.downloader import URLDownloader
+from tests.helpers import RANGE_RE
+
+pytestmark = pytest.mark.usefixtures('no_retry_delay')
+
+
+def _gets(server):
+    return [requested for command, requested in server.requests if command == 'GET']
+
+
+def _bounds(requested):
+    start, end = RANGE_RE.match(requested).groups()
+    return int(start), int(end)
+
+
+def _read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_parallel_ranges_are_reassembled(range_server, tmp_path):
+    downloader = URLDownloader(chunk_size=8192, connections=4, min_range_size=1024)
+    metadata = downloader.probe(range_server.url)
+    assert downloader.supports_ranges(metadata)
+
+    path = downloader.download(range_server.url, str(tmp_path), metadata=metadata)
+
+    assert _read(path) == range_server.payload
+    ranges = sorted(_bounds(requested) for requested in _gets(range_server))
+    assert len(ranges) == 4
+    # The ranges tile the file without gaps or overlap
+    expected_start = 0
+    for start, end in ranges:
+        assert start == expected_start
+        expected_start = end + 1
+    assert expected_start == len(range_server.payload)
+    assert os.listdir(tmp_path) == ['video.mp4']
+
+
+def test_dropped_range_is_resumed(range_server, tmp_path):
+    downloader = URLDownloader(chunk_size=8192, connections=4, min_range_size=1024)
+    range_server.faults = ['drop']
+
+    path = downloader.download(range_server.url, str(tmp_path))
+
+    assert _read(path) == range_server.payload
+    requests = [_bounds(requested) for requested in _gets(range_server)]
+    assert len(requests) == 5
+    range_size = -(-len(range_server.payload) // 4)
+    retries = [(start, end) for start, end in requests if start % range_size]
+    # The retry asks only for what the dropped connection did not deliver
+    assert len(retries) == 1
+    start, end = retries[0]
+    assert end == min(start // range_size * range_size + range_size, len(range_server.payload)) - 1
+
+
+def test_ignored_range_falls_back_to_single_stream(range_server, tmp_path):
+    range_server.honour_ranges = False
+    downloader = URLDownloader(chunk_size=8192, connections=4, min_range_size=1024)
+
+    path = downloader.download(range_server.url, str(tmp_path))
+
+    assert _read(path) == range_server.payload
+    assert _gets(range_server)[-1] is None
+    assert os.listdir(tmp_path) == ['video.mp4']
+
+
+def test_small_source_uses_one_connection(range_server, tmp_path):
+    size = len(range_server.payload)
+    downloader = URLDownloader(chunk_size=8192, connections=4, min_range_size=size + 1)
+    metadata = downloader.probe(range_server.url)
+    assert not downloader.supports_ranges(metadata)
+
+    path = downloader.download(range_server.url, str(tmp_path), metadata=metadata)
+
+    assert _read(path) == range_server.payload
+    assert _gets(range_server) == [f"bytes=0-{size - 1}"]
@@ -0,0 +1,67 @@
+import os
+import time
+
+import pytest
+
+from app.services import ffmpeg
+from app.services.converter import MP4ToMP3Converter
+from app.services.ffmpeg import FFmpegRunner, NoAudioStreamError
+from app.services.mp3_frames import MP3FormatError
+from app.services.splitter import MP3Splitter
+
+
+def _fake_ffmpeg(tmp_path, script):
+    """An executable standing in for ffmpeg; it ignores its arguments"""
+    path = tmp_path / 'ffmpeg'
+    path.write_text("#!/bin/sh\n" + script)
+    path.chmod(0o755)
+    return str(path)
+
+
+NO_AUDIO = "echo \"Stream map '0:a:0' matches no streams.\" >&2\nexit 1\n"
+
+
+def _failing_handler(stream):
+    stream.read()
+    raise MP3FormatError("No MP3 audio frames found in stream")
+
+
+def test_ffmpeg_error_wins_over_handler_error(tmp_path):
+    runner = FFmpegRunner(binary=_fake_ffmpeg(tmp_path, NO_AUDIO))
+
+    with pytest.raises(NoAudioStreamError) as error:
+        runner.run(['-i', 'in.mp4'], ['pipe:1'], stdout_handler=_failing_handler)
+    assert error.value.returncode == 1
+
+
+def test_handler_error_is_raised_when_ffmpeg_succeeds(tmp_path):
+    runner = FFmpegRunner(binary=_fake_ffmpeg(tmp_path, "printf 'not mp3'\n"))
+
+    with pytest.raises(MP3FormatError):
+        runner.run(['-i', 'in.mp4'], ['pipe:1'], stdout_handler=_failing_handler)
+
+
+def test_ffmpeg_left_writing_is_killed(tmp_path, monkeypatch):
+    monkeypatch.setattr(ffmpeg, '_HANDLER_ERROR_GRACE', 0.2)
+    runner = FFmpegRunner(binary=_fake_ffmpeg(tmp_path, "exec yes\n"))
+
+    def _give_up(stream):
+        stream.read(1024)
+        raise MP3FormatError("No MP3 audio frames found in stream")
+
+    started = time.monotonic()
+    with pytest.raises(MP3FormatError):
+        runner.run(['-i', 'in.mp4'], ['pipe:1'], stdout_handler=_give_up)
+    assert time.monotonic() - started < 5
+
+
+def test_segmented_conversion_keeps_ffmpeg_error_type(tmp_path):
+    source = tmp_path / 'video.mp4'
+    source.write_bytes(b'\0' * 1024)
+    output = tmp_path / 'out'
+    output.mkdir()
+    converter = MP4ToMP3Converter(ffmpeg_binary=_fake_ffmpeg(tmp_path, NO_AUDIO))
+
+    with pytest.raises(NoAudioStreamError):
+        converter.convert_segmented(str(source), MP3Splitter(), str(output), 'video')
+    assert os.listdir(output) == []
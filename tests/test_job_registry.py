@@ -0,0 +1,66 @@
+import pytest
+
+from app.utils.job_registry import RedisJobRegistry, SQLiteJobRegistry
+
+
+@pytest.fixture(params=['sqlite', 'redis'])
+def registry(request, tmp_path):
+    if request.param == 'sqlite':
+        return SQLiteJobRegistry(str(tmp_path / 'jobs.db'))
+    fakeredis = pytest.importorskip('fakeredis')
+    return RedisJobRegistry(fakeredis.FakeRedis(), ttl=60)
+
+
+def test_job_moves_through_its_states(registry):
+    registry.create('job-1', params={'url': 'http://example.com/a.mp4', 'bitrate': '192k'})
+    job = registry.get('job-1')
+    assert job['status'] == 'queued'
+    assert job['params'] == {'url': 'http://example.com/a.mp4', 'bitrate': '192k'}
+    assert job['files'] == []
+    assert job['created_at'] and job['started_at'] is None and job['finished_at'] is None
+
+    registry.update('job-1', status='processing')
+    assert registry.get('job-1')['started_at'] is not None
+
+    files = [{'filename': 'a_part1.mp3', 'size': 100}]
+    registry.update('job-1', status='completed', files=files)
+    job = registry.get('job-1')
+    assert job['status'] == 'completed'
+    assert job['files'] == files
+    assert job['finished_at'] >= job['started_at'] >= job['created_at']
+
+
+def test_failed_job_keeps_its_error(registry):
+    registry.create('job-1')
+
+    registry.update('job-1', status='failed', error="Conversion failed: no audio")
+
+    job = registry.get('job-1')
+    assert (job['status'], job['error']) == ('failed', "Conversion failed: no audio")
+
+
+def test_unknown_jobs(registry):
+    assert registry.get('missing') is None
+    # Updating a job that was never created does not create it
+    registry.update('missing', status='processing')
+    assert registry.get('missing') is None
+
+
+def test_invalid_updates_are_rejected(registry):
+    registry.create('job-1')
+
+    with pytest.raises(ValueError):
+        registry.update('job-1', status='paused')
+    with pytest.raises(ValueError):
+        registry.update('job-1', colour='red')
+    assert registry.get('job-1')['status'] == 'queued'
+
+
+def test_redis_records_expire(tmp_path):
+    fakeredis = pytest.importorskip('fakeredis')
+    redis_conn = fakeredis.FakeRedis()
+    registry = RedisJobRegistry(redis_conn, ttl=60)
+
+    registry.create('job-1')
+
+    assert 0 < redis_conn.ttl('job:job-1') <= 60
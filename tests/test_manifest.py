@@ -0,0 +1,91 @@
+import hashlib
+import os
+import uuid
+import zlib
+
+from app import tasks
+from app.services.result_cache import ResultCache
+from app.utils.manifest import ManifestCache, PartLog, build_manifest, read_manifest, write_manifest
+
+
+def _write(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+    return str(path)
+
+
+def _record(parts, path, data, duration):
+    parts.record(path, len(data), hashlib.sha256(data).hexdigest(), zlib.crc32(data), duration)
+
+
+def test_manifest_cache_drops_least_recently_used():
+    cache = ManifestCache(max_entries=2)
+    cache.put('a', {'job_id': 'a'})
+    cache.put('b', {'job_id': 'b'})
+    assert cache.get('a') == {'job_id': 'a'}
+
+    cache.put('c', {'job_id': 'c'})
+
+    assert cache.get('b') is None
+    assert cache.get('a') == {'job_id': 'a'}
+    assert cache.get('c') == {'job_id': 'c'}
+
+
+def test_manifest_uses_recorded_parts_and_hashes_the_rest(tmp_path):
+    first = os.urandom(16000)
+    second = os.urandom(8000)
+    paths = [_write(tmp_path / 'talk_part1.mp3', first), _write(tmp_path / 'talk_part2.mp3', second)]
+    parts = PartLog()
+    _record(parts, paths[0], first, 1.0)
+
+    manifest = build_manifest('job', paths, parts)
+
+    assert manifest['parts'][0] == {
+        'filename': 'talk_part1.mp3', 'size': 16000, 'duration': 1.0, 'start': 0.0, 'bitrate': 128000,
+        'sha256': hashlib.sha256(first).hexdigest(), 'crc32': zlib.crc32(first),
+    }
+    # The second part was written by ffmpeg: checksums from disk, no timing
+    assert manifest['parts'][1]['sha256'] == hashlib.sha256(second).hexdigest()
+    assert manifest['parts'][1]['crc32'] == zlib.crc32(second)
+    assert manifest['parts'][1]['duration'] is None
+    assert manifest['duration'] is None
+
+    write_manifest(str(tmp_path), manifest)
+    assert read_manifest(str(tmp_path)) == manifest
+    assert read_manifest(str(tmp_path / 'missing')) is None
+
+
+def test_part_metadata_survives_the_result_cache(tmp_path):
+    data = os.urandom(4000)
+    os.makedirs(tmp_path / 'job1')
+    source = _write(tmp_path / 'job1' / 'a_part1.mp3', data)
+    parts = PartLog()
+    _record(parts, source, data, 0.25)
+    cache = ResultCache(str(tmp_path / 'cache'), 1024 * 1024)
+    cache.store('key', [source], parts)
+
+    linked = PartLog()
+    paths = cache.lookup('key', str(tmp_path / 'job2'), 'b', linked)
+
+    assert linked.get(paths[0]) == parts.get(source)
+
+
+def test_completed_status_comes_from_the_manifest(app):
+    job_id = str(uuid.uuid4())
+    result_dir = os.path.join(app.config['RESULT_FOLDER'], job_id)
+    os.makedirs(result_dir)
+    data = os.urandom(32000)
+    path = _write(os.path.join(result_dir, 'lecture_part1.mp3'), data)
+    parts = PartLog()
+    _record(parts, path, data, 2.0)
+    with app.app_context():
+        tasks.get_job_registry().create(job_id)
+        tasks.finish_job(job_id, [path], parts)
+    assert read_manifest(result_dir)['parts'][0]['duration'] == 2.0
+
+    files = app.test_client().get(f"/api/conversion/{job_id}").get_json()['files']
+
+    assert files == [{
+        'filename': 'lecture_part1.mp3', 'size': 32000, 'duration': 2.0, 'start': 0.0, 'bitrate': 128000,
+        'sha256': hashlib.sha256(data).hexdigest(), 'download_url': f"/api/download/{job_id}/lecture_part1.mp3",
+    }]
@@ -0,0 +1,133 @@
+import os
+
+import pytest
+
+from app.services import mp3_frames
+from app.services.mp3_frames import MP3FormatError, copy_range, iter_frames, parse_frame_header, plan_segments
+from tests.helpers import MP3_FRAME_SIZE, MP3_HEADER, make_mp3
+
+
+def _write(tmp_path, data, name='audio.mp3'):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_parse_frame_header():
+    header = parse_frame_header(MP3_HEADER)
+
+    assert (header.version, header.layer) == (1, 3)
+    assert header.bitrate == 128000
+    assert header.sample_rate == 44100
+    assert header.samples == 1152
+    assert header.channels == 2
+    assert header.size == MP3_FRAME_SIZE
+
+
+@pytest.mark.parametrize('data', [
+    b'\xff\xfb\x90',         # too short
+    b'\xfe\xfb\x90\x00',     # no frame sync
+    b'\xff\xeb\x90\x00',     # reserved MPEG version
+    b'\xff\xfb\xf0\x00',     # invalid bitrate index
+    b'\xff\xfb\x00\x00',     # free format
+    b'\xff\xfb\x9c\x00',     # reserved sample rate
+])
+def test_parse_frame_header_rejects_invalid_headers(data):
+    assert parse_frame_header(data) is None
+
+
+def test_iter_frames_skips_tags_and_info_frame(tmp_path):
+    path = _write(tmp_path, make_mp3(10, id3v2=True, xing=True, id3v1=True))
+    audio_start = 110 + MP3_FRAME_SIZE
+
+    frames = list(iter_frames(path))
+
+    assert len(frames) == 10
+    assert [frame.offset for frame in frames] == [audio_start + i * MP3_FRAME_SIZE for i in range(10)]
+
+
+def test_iter_frames_resyncs_after_garbage(tmp_path):
+    path = _write(tmp_path, make_mp3(3) + b'\x00' * 50 + make_mp3(3))
+
+    frames = list(iter_frames(path))
+
+    assert len(frames) == 6
+    assert frames[3].offset == 3 * MP3_FRAME_SIZE + 50
+
+
+def test_non_mp3_input_is_rejected(tmp_path):
+    path = _write(tmp_path, os.urandom(8) + b'\x00' * (200 * 1024), name='video.mp4')
+
+    with pytest.raises(MP3FormatError):
+        plan_segments(path, 1024 * 1024)
+
+
+def test_plan_segments_respects_max_size_and_covers_all_frames(tmp_path):
+    path = _write(tmp_path, make_mp3(25, id3v2=True, id3v1=True))
+    max_size = 10 * MP3_FRAME_SIZE + 100
+
+    segments = plan_segments(path, max_size)
+
+    assert [s.samples // 1152 for s in segments] == [10, 10, 5]
+    assert all(s.end - s.start <= max_size for s in segments)
+    assert segments[0].start == 110
+    for previous, segment in zip(segments, segments[1:]):
+        assert segment.start == previous.end
+        assert segment.start_sample == previous.start_sample + previous.samples
+    assert segments[-1].end == 110 + 25 * MP3_FRAME_SIZE
+    assert segments[0].sample_rate == 44100
+
+
+def test_copy_range_appends_the_requested_bytes(tmp_path):
+    data = os.urandom(3 * 1024 * 1024 + 17)
+    src_path = _write(tmp_path, data, name='src')
+    dst_path = str(tmp_path / 'dst')
+
+    with open(src_path, 'rb') as src, open(dst_path, 'wb') as dst:
+        dst.write(b'head')
+        copy_range(src, dst, 1000, 2 * 1024 * 1024)
+        copy_range(src, dst, 5, 10)
+
+    with open(dst_path, 'rb') as f:
+        assert f.read() == b'head' + data[1000:1000 + 2 * 1024 * 1024] + data[5:15]
+
+
+def test_copy_range_falls_back_to_read_write(tmp_path, monkeypatch):
+    def unsupported(*args):
+        raise OSError("copy_file_range not supported")
+
+    monkeypatch.setattr(mp3_frames.os, 'copy_file_range', unsupported, raising=False)
+    data = os.urandom(100 * 1024)
+    src_path = _write(tmp_path, data, name='src')
+    dst_path = str(tmp_path / 'dst')
+
+    with open(src_path, 'rb') as src, open(dst_path, 'wb') as dst:
+        copy_range(src, dst, 10, 50000, block_size=4096)
+
+    with open(dst_path, 'rb') as f:
+        assert f.read() == data[10:50010]
+
+
+def test_copy_range_resumes_after_partial_zero_copy(tmp_path, monkeypatch):
+    calls = []
+
+    def fails_after_first_block(src_fd, dst_fd, count, offset_src):
+        calls.append(offset_src)
+        if len(calls) > 1:
+            raise OSError("copy_file_range interrupted")
+        # Copy one block the way copy_file_range would, advancing the destination offset
+        data = os.pread(src_fd, min(count, 8192), offset_src)
+        return os.write(dst_fd, data)
+
+    monkeypatch.setattr(mp3_frames.os, 'copy_file_range', fails_after_first_block, raising=False)
+    data = os.urandom(100 * 1024)
+    src_path = _write(tmp_path, data, name='src')
+    dst_path = str(tmp_path / 'dst')
+
+    with open(src_path, 'rb') as src, open(dst_path, 'wb') as dst:
+        dst.write(b'head')
+        copy_range(src, dst, 10, 50000, block_size=4096)
+
+    assert calls == [10, 8202]
+    with open(dst_path, 'rb') as f:
+        assert f.read() == b'head' + data[10:50010]
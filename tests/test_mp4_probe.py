@@ -0,0 +1,79 @@
+import io
+import os
+
+import pytest
+
+from app.services.mp4_probe import MP4ProbeError, probe_mp4, probe_mp4_prefix
+from tests.helpers import make_aac_mp4, make_mp4, requires_ffmpeg
+
+
+def _file(tmp_path, data):
+    path = tmp_path / 'video.mp4'
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_probe_reads_duration_and_audio_track(tmp_path):
+    info = probe_mp4(_file(tmp_path, make_mp4(os.urandom(4096), duration=90)))
+
+    assert info == {
+        'duration': 90.0,
+        'audio': {'codec': 'aac', 'sample_rate': 44100, 'channels': 2, 'bit_rate': None},
+        'moov_at_front': True,
+    }
+
+
+def test_probe_finds_moov_after_media_data(tmp_path):
+    info = probe_mp4(_file(tmp_path, make_mp4(os.urandom(4096), moov_last=True)))
+
+    assert info['moov_at_front'] is False
+    assert info['audio']['codec'] == 'aac'
+
+
+def test_file_without_sound_track_has_no_audio(tmp_path):
+    assert probe_mp4(_file(tmp_path, make_mp4(b'', handler=b'vide')))['audio'] is None
+
+
+@pytest.mark.parametrize('data', [
+    b'RIFF\x00\x00\x10\x00WAVEfmt ' + b'\0' * 100,
+    make_mp4(os.urandom(4096))[:-100],
+    make_mp4(os.urandom(4096), moov_last=True)[:-20],
+    make_mp4(b'')[:40],
+], ids=['not-mp4', 'truncated-mdat', 'truncated-moov', 'no-moov'])
+def test_malformed_files_are_rejected(tmp_path, data):
+    with pytest.raises(MP4ProbeError):
+        probe_mp4(_file(tmp_path, data))
+
+
+def test_prefix_probe():
+    data = make_mp4(os.urandom(64 * 1024))
+    moov_end = data.index(b'mdat') - 4
+
+    assert probe_mp4_prefix(data[:moov_end], len(data))['duration'] == 60.0
+    # moov not complete yet, or behind the media data: the prefix cannot tell
+    assert probe_mp4_prefix(data[:200], len(data)) is None
+    assert probe_mp4_prefix(make_mp4(os.urandom(1024), moov_last=True)[:2048]) is None
+    # The mdat box claims more bytes than Content-Length announces
+    with pytest.raises(MP4ProbeError):
+        probe_mp4_prefix(data[:moov_end + 16], len(data) - 1000)
+
+
+@requires_ffmpeg
+def test_probe_matches_an_ffmpeg_encoded_file(tmp_path):
+    path = make_aac_mp4(str(tmp_path / 'tone.mp4'), 3, video=True)
+
+    info = probe_mp4(path)
+
+    assert info['duration'] == pytest.approx(3, abs=0.1)
+    assert info['audio']['codec'] == 'aac'
+    assert info['audio']['sample_rate'] == 44100
+    assert info['audio']['bit_rate'] == pytest.approx(128000, rel=0.2)
+
+
+def test_upload_without_audio_is_refused(app):
+    response = app.test_client().post('/api/conversion/file', data={
+        'file': (io.BytesIO(make_mp4(os.urandom(1024), handler=b'vide')), 'video.mp4'),
+    }, content_type='multipart/form-data')
+
+    assert response.status_code == 400
+    assert os.listdir(app.config['UPLOAD_FOLDER']) == []
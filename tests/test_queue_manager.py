@@ -0,0 +1,139 @@
+import threading
+import time
+
+import pytest
+
+from app import tasks
+from app.utils.queue_manager import FIFOPolicy, PriorityJobQueue, ShortestJobFirstPolicy, create_policy
+
+
+@pytest.fixture
+def blocked_manager(app, monkeypatch):
+    """A one-worker queue whose conversions record their start and wait for a release each"""
+    manager = tasks.ConversionQueueManager()
+    manager.configure(1, FIFOPolicy())
+    started = []
+    changed = threading.Condition()
+    releases = threading.Semaphore(0)
+
+    def process(job_id, *args):
+        with changed:
+            started.append(job_id)
+            changed.notify_all()
+        releases.acquire(timeout=10)
+
+    def wait_started(count):
+        with changed:
+            assert changed.wait_for(lambda: len(started) >= count, timeout=10)
+
+    monkeypatch.setattr(tasks, '_app', app)
+    monkeypatch.setattr(tasks, 'process_conversion', process)
+    manager.started = started
+    manager.release = releases.release
+    manager.wait_started = wait_started
+    yield manager
+    releases.release(100)
+    deadline = time.time() + 10
+    while (manager.queue or manager.admitting or manager.running) and time.time() < deadline:
+        time.sleep(0.01)
+
+
+def _job(job_id, added_time, est_cost=None):
+    return {'job_id': job_id, 'added_time': added_time, 'est_cost': est_cost}
+
+
+def _drain(queue):
+    return [queue.pop()['job_id'] for _ in range(len(queue))]
+
+
+def test_fifo_keeps_arrival_order():
+    queue = PriorityJobQueue(FIFOPolicy())
+    for index, job_id in enumerate(('a', 'b', 'c')):
+        queue.push(_job(job_id, 100 + index, est_cost=100 - index))
+
+    assert [queue.position(job_id) for job_id in ('a', 'b', 'c')] == [1, 2, 3]
+    assert _drain(queue) == ['a', 'b', 'c']
+
+
+def test_equal_priorities_keep_arrival_order():
+    queue = PriorityJobQueue(FIFOPolicy())
+    for job_id in ('a', 'b', 'c'):
+        queue.push(_job(job_id, 100))
+
+    assert _drain(queue) == ['a', 'b', 'c']
+
+
+def test_sjf_lets_short_jobs_overtake():
+    queue = PriorityJobQueue(ShortestJobFirstPolicy(max_delay=300))
+    queue.push(_job('big', 100, est_cost=200))
+    queue.push(_job('small', 101, est_cost=5))
+    queue.push(_job('medium', 102, est_cost=50))
+
+    assert queue.position('small') == 1
+    assert queue.position('big') == 3
+    assert queue.position('missing') == 0
+    assert 'big' in queue and len(queue) == 3
+    assert _drain(queue) == ['small', 'medium', 'big']
+
+
+def test_sjf_delay_is_bounded():
+    queue = PriorityJobQueue(ShortestJobFirstPolicy(max_delay=300))
+    # The big job's cost is capped at max_delay, so only jobs submitted within
+    # 300 seconds of it can run first
+    queue.push(_job('big', 100, est_cost=10000))
+    queue.push(_job('within-delay', 350, est_cost=1))
+    queue.push(_job('after-delay', 401, est_cost=0))
+
+    assert _drain(queue) == ['within-delay', 'big', 'after-delay']
+
+
+def test_unknown_policy_is_rejected():
+    assert create_policy('fifo', 300).name == 'fifo'
+    assert create_policy('sjf', 300).max_delay == 300
+    with pytest.raises(ValueError):
+        create_policy('lifo', 300)
+
+
+def test_jobs_run_in_arrival_order(blocked_manager):
+    assert blocked_manager.add_job('first', file_path='a.mp4') is True
+    blocked_manager.wait_started(1)
+    assert blocked_manager.add_job('second', file_path='b.mp4') is False
+    assert blocked_manager.add_job('third', file_path='c.mp4') is False
+
+    assert blocked_manager.get_queue_status('first')['status'] == 'processing'
+    assert blocked_manager.get_queue_status('second') == {'status': 'queued', 'position': 1, 'queue_length': 2}
+    assert blocked_manager.get_queue_status('third') == {'status': 'queued', 'position': 2, 'queue_length': 2}
+
+    blocked_manager.release(3)
+    blocked_manager.wait_started(3)
+    assert blocked_manager.started == ['first', 'second', 'third']
+
+
+def test_positions_move_up_as_jobs_start(blocked_manager):
+    blocked_manager.add_job('first', file_path='a.mp4')
+    blocked_manager.wait_started(1)
+    for job_id in ('second', 'third', 'fourth'):
+        blocked_manager.add_job(job_id, file_path=f'{job_id}.mp4')
+
+    blocked_manager.release()
+    blocked_manager.wait_started(2)
+
+    assert blocked_manager.get_queue_status('first')['status'] == 'unknown'
+    assert blocked_manager.get_queue_status('second')['status'] == 'processing'
+    assert blocked_manager.get_queue_status('third') == {'status': 'queued', 'position': 1, 'queue_length': 2}
+    assert blocked_manager.get_queue_status('fourth') == {'status': 'queued', 'position': 2, 'queue_length': 2}
+
+
+def test_worker_takes_shortest_queued_job_first(blocked_manager):
+    blocked_manager.configure(1, ShortestJobFirstPolicy(max_delay=300))
+    blocked_manager.add_job('first', file_path='a.mp4', est_cost=10)
+    blocked_manager.wait_started(1)
+    blocked_manager.add_job('big', file_path='b.mp4', est_cost=200)
+    blocked_manager.add_job('small', file_path='c.mp4', est_cost=5)
+
+    assert blocked_manager.get_queue_status('small')['position'] == 1
+    assert blocked_manager.get_queue_status('big')['position'] == 2
+
+    blocked_manager.release(3)
+    blocked_manager.wait_started(3)
+    assert blocked_manager.started == ['first', 'small', 'big']
@@ -0,0 +1,42 @@
+import os
+
+import pytest
+
+from app.services import remuxer as remuxer_module
+from app.services.remuxer import AudioRemuxer, PassthroughError
+from tests.helpers import make_aac_mp4, requires_ffmpeg
+
+AAC_INFO = {'duration': 20.0, 'audio': {'codec': 'aac', 'sample_rate': 44100, 'channels': 1, 'bit_rate': 128000}}
+
+
+@pytest.mark.parametrize('info', [
+    {'duration': 20.0, 'audio': None},
+    {'duration': 20.0, 'audio': dict(AAC_INFO['audio'], codec='mp3')},
+])
+def test_probe_rejects_inputs_that_cannot_be_passed_through(monkeypatch, info):
+    monkeypatch.setattr(remuxer_module, 'probe_media', lambda path, binary: info)
+
+    with pytest.raises(PassthroughError):
+        AudioRemuxer().probe('video.mp4')
+
+
+def test_probe_accepts_aac(monkeypatch):
+    monkeypatch.setattr(remuxer_module, 'probe_media', lambda path, binary: AAC_INFO)
+
+    assert AudioRemuxer().probe('video.mp4') == AAC_INFO
+
+
+@requires_ffmpeg
+def test_remux_writes_parts_under_the_size_limit(tmp_path):
+    source = make_aac_mp4(str(tmp_path / 'lecture.mp4'), 20, video=True)
+    work, output = str(tmp_path / 'work'), str(tmp_path / 'out')
+    remuxer = AudioRemuxer()
+    remuxer.max_size_bytes = 96 * 1024
+
+    paths = remuxer.remux(source, work, output, 'lecture', info=AAC_INFO)
+
+    assert len(paths) >= 3
+    assert [os.path.basename(path) for path in paths] == [f"lecture_part{i}.m4a" for i in range(1, len(paths) + 1)]
+    assert all(os.path.getsize(path) <= remuxer.max_size_bytes for path in paths)
+    assert all(open(path, 'rb').read(12)[4:8] == b'ftyp' for path in paths)
+    assert os.listdir(work) == []
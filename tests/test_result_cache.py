@@ -0,0 +1,68 @@
+import os
+
+from app.services.result_cache import ResultCache, make_cache_key, url_fingerprint
+
+
+def _parts(folder, base, sizes):
+    os.makedirs(folder, exist_ok=True)
+    paths = []
+    for i, size in enumerate(sizes):
+        path = os.path.join(folder, f"{base}_part{i + 1}.mp3")
+        with open(path, 'wb') as f:
+            f.write(bytes([i + 1]) * size)
+        paths.append(path)
+    return paths
+
+
+def _age(cache, key, seconds_ago):
+    entry_dir = os.path.join(cache.cache_folder, key)
+    mtime = os.path.getmtime(entry_dir) - seconds_ago
+    os.utime(entry_dir, (mtime, mtime))
+
+
+def test_cache_key_depends_on_input_and_parameters():
+    key = make_cache_key('sha256:abc', '192k', 25, 'mp3')
+
+    assert key == make_cache_key('sha256:abc', '192k', 25, 'mp3')
+    assert key != make_cache_key('sha256:abd', '192k', 25, 'mp3')
+    assert key != make_cache_key('sha256:abc', '128k', 25, 'mp3')
+    assert key != make_cache_key('sha256:abc', '192k', 20, 'mp3')
+    assert key != make_cache_key('sha256:abc', '192k', 25, 'm4a')
+
+
+def test_url_fingerprint_needs_a_validator():
+    url = "http://example.com/video.mp4"
+
+    assert url_fingerprint(url, {'size': 10}) is None
+    assert url_fingerprint(url, {'size': 10, 'etag': '"v1"'}) != url_fingerprint(url, {'size': 10, 'etag': '"v2"'})
+
+
+def test_stored_result_is_linked_into_a_new_job(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache'), 10 * 1024 * 1024)
+    source = _parts(str(tmp_path / 'job1'), 'lecture', [1000, 500])
+    key = make_cache_key('sha256:abc', '192k', 25, 'mp3')
+    assert cache.lookup(key, str(tmp_path / 'job2'), 'talk') is None
+
+    cache.store(key, source)
+    paths = cache.lookup(key, str(tmp_path / 'job2'), 'talk')
+
+    assert [os.path.basename(path) for path in paths] == ['talk_part1.mp3', 'talk_part2.mp3']
+    for cached, original in zip(paths, source):
+        assert os.path.samefile(cached, original)
+    assert [name for name in os.listdir(cache.cache_folder)] == [key]
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache'), 2500)
+    keys = [make_cache_key(f"sha256:{i}", '192k', 25, 'mp3') for i in range(3)]
+
+    cache.store(keys[0], _parts(str(tmp_path / 'a'), 'a', [1000]))
+    _age(cache, keys[0], 30)
+    cache.store(keys[1], _parts(str(tmp_path / 'b'), 'b', [1000]))
+    _age(cache, keys[1], 20)
+    # Using the oldest entry makes the second one the least recently used
+    assert cache.lookup(keys[0], str(tmp_path / 'a2'), 'a') is not None
+    cache.store(keys[2], _parts(str(tmp_path / 'c'), 'c', [1000]))
+
+    assert sorted(os.listdir(cache.cache_folder)) == sorted([keys[0], keys[2]])
+    assert cache.lookup(keys[1], str(tmp_path / 'b2'), 'b') is None
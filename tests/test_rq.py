@@ -0,0 +1,85 @@
+import os
+import uuid
+
+import pytest
+
+from app import tasks
+from app.utils.job_registry import RedisJobRegistry
+from tests.helpers import make_mp4
+
+fakeredis = pytest.importorskip('fakeredis')
+from rq import SimpleWorker  # noqa: E402
+
+
+@pytest.fixture
+def rq_app(app, monkeypatch):
+    """Application in 'rq' mode with its queues and job registry in fakeredis"""
+    redis_conn = fakeredis.FakeRedis()
+    app.config['EXECUTION_MODE'] = 'rq'
+    app.config['MAX_QUEUE_WAIT'] = 0
+    monkeypatch.setattr(tasks, '_redis', redis_conn)
+    monkeypatch.setattr(tasks, '_job_registry', RedisJobRegistry(redis_conn))
+    return app
+
+
+def _work(app):
+    """Run every queued job in this process, as `python worker.py` would on another node"""
+    with app.app_context():
+        queues = [tasks.get_rq_queue(name) for name in tasks.RQ_QUEUES]
+        worker = SimpleWorker(queues, connection=tasks.get_redis())
+        worker.work(burst=True)
+
+
+def _upload(app, size):
+    path = os.path.join(app.config['UPLOAD_FOLDER'], f"{uuid.uuid4()}_video.mp4")
+    with open(path, 'wb') as f:
+        f.write(make_mp4(os.urandom(size)))
+    return path
+
+
+def test_upload_job_runs_on_rq_worker(rq_app, fake_conversion):
+    path = _upload(rq_app, 64 * 1024)
+    job_id = str(uuid.uuid4())
+
+    with rq_app.app_context():
+        assert tasks.add_to_conversion_queue(job_id, file_path=path, base_filename='video') is False
+        assert tasks.get_queue_status(job_id)['status'] == 'queued'
+        assert tasks.get_rq_queue('high').job_ids == [job_id]
+
+    _work(rq_app)
+
+    with rq_app.app_context():
+        job = tasks.get_job_registry().get(job_id)
+        assert job['status'] == 'completed'
+        assert [f['filename'] for f in job['files']] == ['video_part1.mp3']
+        assert os.path.exists(os.path.join(rq_app.config['RESULT_FOLDER'], job_id, 'video_part1.mp3'))
+    assert len(fake_conversion) == 1
+    assert not os.path.exists(path)
+
+
+def test_queue_follows_job_kind_and_cost_thresholds(rq_app):
+    with rq_app.app_context():
+        assert tasks.rq_queue_name(url="http://example.com/a.mp4", est_cost=1) == 'default'
+        assert tasks.rq_queue_name(est_cost=None) == 'default'
+        assert tasks.rq_queue_name(est_cost=rq_app.config['RQ_HIGH_MAX_COST']) == 'high'
+        assert tasks.rq_queue_name(est_cost=rq_app.config['RQ_HIGH_MAX_COST'] + 1) == 'default'
+        assert tasks.rq_queue_name(est_cost=rq_app.config['RQ_LOW_MIN_COST']) == 'low'
+
+
+@pytest.mark.usefixtures('no_retry_delay')
+def test_url_job_is_retried_by_rq(rq_app, range_server, fake_conversion):
+    range_server.payload = make_mp4(os.urandom(512 * 1024))
+    range_server.faults = ['drop', 'error']
+    rq_app.config['DOWNLOAD_RANGE_RETRIES'] = 1
+    rq_app.config['DOWNLOAD_JOB_RETRY_DELAY'] = 0
+    job_id = str(uuid.uuid4())
+
+    with rq_app.app_context():
+        tasks.add_to_conversion_queue(job_id, url=range_server.url)
+        assert tasks.get_rq_queue('default').job_ids == [job_id]
+
+    _work(rq_app)
+
+    with rq_app.app_context():
+        assert tasks.get_job_registry().get(job_id)['status'] == 'completed'
+    assert fake_conversion == [range_server.payload]
@@ -0,0 +1,41 @@
+import io
+import os
+
+import pytest
+
+from app.services import splitter as splitter_module
+from app.services.mp3_frames import MP3FormatError
+from app.services.splitter import MP3Splitter
+from tests.helpers import MP3_FRAME_SIZE, MP3_HEADER, make_mp3
+
+
+def _splitter(max_frames):
+    splitter = MP3Splitter()
+    splitter.max_size_bytes = max_frames * MP3_FRAME_SIZE + 100
+    return splitter
+
+
+@pytest.mark.parametrize('read_size', [1000, 256 * 1024])
+def test_split_stream_cuts_at_frame_boundaries(tmp_path, monkeypatch, read_size):
+    monkeypatch.setattr(splitter_module, 'STREAM_READ_SIZE', read_size)
+    stream = io.BytesIO(make_mp3(25, id3v2=True, xing=True))
+
+    paths = _splitter(10).split_stream(stream, str(tmp_path), 'lecture')
+
+    assert [os.path.basename(path) for path in paths] == ['lecture_part1.mp3', 'lecture_part2.mp3',
+                                                           'lecture_part3.mp3']
+    parts = [open(path, 'rb').read() for path in paths]
+    assert [len(part) // MP3_FRAME_SIZE for part in parts] == [10, 10, 5]
+    assert all(part.startswith(MP3_HEADER) for part in parts)
+    # Tag and Info frame dropped, audio frames copied unchanged
+    assert b''.join(parts) == make_mp3(25)
+    assert sorted(os.listdir(tmp_path)) == ['lecture_part1.mp3', 'lecture_part2.mp3', 'lecture_part3.mp3']
+
+
+def test_split_stream_without_frames_leaves_no_parts(tmp_path):
+    stream = io.BytesIO(b'\x00' * 100000)
+
+    with pytest.raises(MP3FormatError):
+        _splitter(10).split_stream(stream, str(tmp_path), 'lecture')
+
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,101 @@
+import os
+import uuid
+
+import pytest
+
+from app import tasks
+from tests.helpers import make_mp4
+
+
+class FakeStreamingConverter:
+    """Reads the whole input stream, writing a part after each half, then optionally fails"""
+
+    def __init__(self, fail):
+        self.fail = fail
+        self.received = b''
+
+    def convert_segmented(self, url, splitter, result_dir, base_filename, progress_callback=None,
+                          input_stream=None, part_callback=None, parts=None):
+        output_files = []
+        for chunk in input_stream:
+            self.received += chunk
+        for index in (1, 2):
+            path = os.path.join(result_dir, f"{base_filename}_part{index}.mp3")
+            with open(path, 'wb') as f:
+                f.write(b'\xff\xfb\x90\x00' * 16)
+            output_files.append(path)
+            part_callback(path)
+        if self.fail:
+            for path in output_files:
+                os.remove(path)
+            raise Exception("Conversion failed: broken pipe")
+        return output_files
+
+
+@pytest.fixture
+def streaming_job(app, range_server, tmp_path):
+    range_server.payload = make_mp4(os.urandom(256 * 1024))
+    range_server.honour_ranges = False
+    job_id = str(uuid.uuid4())
+    result_dir = str(tmp_path / 'results' / job_id)
+    os.makedirs(result_dir)
+    with app.app_context():
+        tasks.get_job_registry().create(job_id)
+    return job_id, result_dir
+
+
+def _run(app, monkeypatch, range_server, streaming_job, fail):
+    job_id, result_dir = streaming_job
+    converter = FakeStreamingConverter(fail)
+    monkeypatch.setattr(tasks, 'create_converter', lambda bitrate: converter)
+    with app.app_context():
+        output_files = tasks.stream_url_conversion(job_id, range_server.url, tasks.create_downloader(), result_dir)
+        events = tasks.get_job_events().read(job_id)
+    assert converter.received == range_server.payload
+    return output_files, events
+
+
+def test_streamed_download_reports_progress_and_parts(app, monkeypatch, range_server, streaming_job):
+    output_files, events = _run(app, monkeypatch, range_server, streaming_job, fail=False)
+
+    assert [os.path.basename(path) for path in output_files] == ['video_part1.mp3', 'video_part2.mp3']
+    downloading = [event['data'] for event in events
+                   if event['event'] == 'progress' and event['data']['stage'] == 'downloading']
+    assert downloading[-1]['percent'] == 100.0
+    assert downloading[-1]['bytes'] == len(range_server.payload)
+    assert [event['data']['filename'] for event in events if event['event'] == 'part'] == \
+        ['video_part1.mp3', 'video_part2.mp3']
+    assert not [event for event in events if event['event'] == 'reset']
+
+
+def test_fallback_withdraws_announced_parts(app, monkeypatch, range_server, streaming_job):
+    output_files, events = _run(app, monkeypatch, range_server, streaming_job, fail=True)
+
+    assert output_files is None
+    kinds = [event['event'] for event in events if event['event'] in ('part', 'reset')]
+    assert kinds == ['part', 'part', 'reset']
+    assert events[-1]['data']['filenames'] == ['video_part1.mp3', 'video_part2.mp3']
+    assert os.listdir(streaming_job[1]) == []
+
+
+@pytest.mark.parametrize('preference, streamed', [('stream', True), ('ranges', False)])
+def test_ingest_preference_for_range_capable_url(app, monkeypatch, range_server, fake_conversion,
+                                                 preference, streamed):
+    range_server.payload = make_mp4(os.urandom(256 * 1024))
+    app.config.update(STREAMING_INGEST=True, DOWNLOAD_RANGE_MIN_SIZE=0, URL_INGEST_PREFERENCE=preference)
+    converter = FakeStreamingConverter(fail=False)
+    monkeypatch.setattr(tasks, 'create_converter', lambda bitrate: converter)
+    job_id = str(uuid.uuid4())
+
+    with app.app_context():
+        tasks.get_job_registry().create(job_id)
+        assert tasks.create_downloader().supports_ranges(tasks.create_downloader().probe(range_server.url))
+        result = tasks.process_url_conversion(job_id, range_server.url)
+
+    assert result['status'] == 'completed'
+    if streamed:
+        assert converter.received == range_server.payload
+        assert fake_conversion == []
+    else:
+        assert converter.received == b''
+        assert fake_conversion == [range_server.payload]
@@ -0,0 +1,90 @@
+import os
+import time
+import uuid
+
+import pytest
+
+from app import tasks
+from app.utils.queue_manager import FIFOPolicy
+from tests.helpers import RANGE_RE, make_mp4
+
+
+def _wait_for_status(app, job_id, statuses, timeout=10):
+    with app.app_context():
+        registry = tasks.get_job_registry()
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            job = registry.get(job_id)
+            if job['status'] in statuses:
+                return job
+            time.sleep(0.05)
+    raise AssertionError(f"Job {job_id} did not reach {statuses}")
+
+
+def _range_starts(server):
+    return [int(RANGE_RE.match(requested).group(1)) for command, requested in server.requests
+            if command == 'GET' and requested]
+
+
+@pytest.mark.usefixtures('no_retry_delay')
+def test_failed_download_resumes_on_next_attempt(app, range_server, fake_conversion):
+    range_server.payload = make_mp4(os.urandom(512 * 1024))
+    # First attempt: the connection drops halfway, then the retry within the attempt gets a 503
+    range_server.faults = ['drop', 'error']
+    app.config['DOWNLOAD_RANGE_RETRIES'] = 1
+    job_id = str(uuid.uuid4())
+    download_dir = os.path.join(app.config['TEMP_FOLDER'], f"{job_id}_download")
+
+    with app.app_context():
+        tasks.get_job_registry().create(job_id)
+        with pytest.raises(tasks.JobRetryError):
+            tasks.process_url_conversion(job_id, range_server.url, final_attempt=False)
+
+        assert os.path.exists(os.path.join(download_dir, 'video.mp4.part'))
+        assert os.path.exists(os.path.join(download_dir, 'video.mp4.part.json'))
+        assert tasks.get_job_registry().get(job_id)['status'] == 'queued'
+
+        result = tasks.process_url_conversion(job_id, range_server.url)
+
+    assert result['status'] == 'completed'
+    assert fake_conversion == [range_server.payload]
+    # The second attempt asked only for the bytes the first one did not save
+    assert 0 < _range_starts(range_server)[-1] <= len(range_server.payload) // 2
+    assert not os.path.exists(download_dir)
+
+
+@pytest.mark.usefixtures('no_retry_delay')
+def test_final_attempt_fails_and_removes_download(app, range_server, fake_conversion):
+    range_server.payload = make_mp4(os.urandom(512 * 1024))
+    range_server.faults = ['drop', 'error']
+    app.config['DOWNLOAD_RANGE_RETRIES'] = 1
+    job_id = str(uuid.uuid4())
+
+    with app.app_context():
+        tasks.get_job_registry().create(job_id)
+        result = tasks.process_url_conversion(job_id, range_server.url)
+        assert tasks.get_job_registry().get(job_id)['status'] == 'failed'
+
+    assert result['status'] == 'failed'
+    assert fake_conversion == []
+    assert not os.path.exists(os.path.join(app.config['TEMP_FOLDER'], f"{job_id}_download"))
+
+
+@pytest.mark.usefixtures('no_retry_delay')
+def test_queue_requeues_job_after_transient_failure(app, range_server, fake_conversion):
+    range_server.payload = make_mp4(os.urandom(512 * 1024))
+    range_server.faults = ['drop', 'error']
+    app.config['DOWNLOAD_RANGE_RETRIES'] = 1
+    manager = tasks.ConversionQueueManager()
+    manager.configure(1, FIFOPolicy(), retries=1, retry_delay=0)
+    job_id = str(uuid.uuid4())
+
+    with app.app_context():
+        tasks.get_job_registry().create(job_id)
+        manager.add_job(job_id, url=range_server.url)
+
+    job = _wait_for_status(app, job_id, ('completed', 'failed'))
+
+    assert job['status'] == 'completed'
+    assert fake_conversion == [range_server.payload]
+    assert 0 < _range_starts(range_server)[-1] <= len(range_server.payload) // 2
@@ -0,0 +1,48 @@
+import os
+import uuid
+
+import pytest
+
+from app import tasks
+from app.utils.throughput import RedisThroughputModel
+from tests.helpers import make_mp4
+
+fakeredis = pytest.importorskip('fakeredis')
+
+DEFAULTS = {'download': 1000.0, 'encode': 50.0, 'remux': 500.0}
+
+
+def _unreachable_model():
+    server = fakeredis.FakeServer()
+    server.connected = False
+    return RedisThroughputModel(fakeredis.FakeRedis(server=server), DEFAULTS)
+
+
+def test_redis_model_learns_from_observations():
+    model = RedisThroughputModel(fakeredis.FakeRedis(), DEFAULTS, smoothing=0.5)
+
+    model.observe('download', 3000, 1)
+
+    assert model.rate('download') == 2000.0
+    assert model.estimate('download', 4000) == 2.0
+
+
+def test_unreachable_redis_falls_back_to_defaults():
+    model = _unreachable_model()
+
+    model.observe('download', 3000, 1)
+
+    assert model.rate('download') == DEFAULTS['download']
+
+
+def test_job_completes_when_throughput_model_is_unreachable(app, range_server, fake_conversion, monkeypatch):
+    range_server.payload = make_mp4(os.urandom(64 * 1024))
+    monkeypatch.setattr(tasks, '_throughput_model', _unreachable_model())
+    job_id = str(uuid.uuid4())
+
+    with app.app_context():
+        tasks.get_job_registry().create(job_id)
+        result = tasks.process_url_conversion(job_id, range_server.url)
+
+    assert result['status'] == 'completed'
+    assert fake_conversion == [range_server.payload]
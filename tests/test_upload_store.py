@@ -0,0 +1,100 @@
+import hashlib
+import io
+import os
+import time
+
+import pytest
+
+from app import tasks
+from app.services.upload_store import UploadError, UploadOffsetError, UploadStore
+from tests.helpers import make_mp4
+
+
+@pytest.fixture
+def store(tmp_path):
+    return UploadStore(str(tmp_path / 'partial'), expiry_seconds=60)
+
+
+def test_upload_resumes_from_the_bytes_on_disk(store, tmp_path):
+    data = os.urandom(300 * 1024)
+    upload = store.create('video.mp4', len(data))
+
+    assert store.write(upload['upload_id'], io.BytesIO(data[:100000]), 0) == 100000
+    # A new process has no hash state; it is rebuilt from the file
+    store = UploadStore(store.folder)
+    assert store.get(upload['upload_id'])['offset'] == 100000
+    # The client resends the end of a range whose response it never saw
+    assert store.write(upload['upload_id'], io.BytesIO(data[90000:]), 90000) == len(data)
+
+    target = str(tmp_path / 'video.mp4')
+    assert store.finalize(upload['upload_id'], target) == hashlib.sha256(data).hexdigest()
+    with open(target, 'rb') as f:
+        assert f.read() == data
+
+
+def test_gaps_and_overruns_are_rejected(store):
+    upload_id = store.create('video.mp4', 1000)['upload_id']
+    store.write(upload_id, io.BytesIO(b'a' * 400), 0)
+
+    with pytest.raises(UploadOffsetError) as gap:
+        store.write(upload_id, io.BytesIO(b'b' * 100), 500)
+    assert gap.value.offset == 400
+    with pytest.raises(UploadError):
+        store.write(upload_id, io.BytesIO(b'c' * 700), 400)
+    with pytest.raises(UploadOffsetError):
+        store.finalize(upload_id, os.path.join(store.folder, 'out.mp4'))
+
+
+def test_unknown_and_invalid_ids(store):
+    assert store.get('0' * 32) is None
+    assert store.get('../../etc/passwd') is None
+    with pytest.raises(UploadError):
+        store.write('0' * 32, io.BytesIO(b'data'), 0)
+
+
+def test_expired_uploads_are_purged(store):
+    stale = store.create('stale.mp4', 10)['upload_id']
+    old = time.time() - 120
+    for name in os.listdir(store.folder):
+        os.utime(os.path.join(store.folder, name), (old, old))
+
+    fresh = store.create('fresh.mp4', 10)['upload_id']
+
+    assert store.get(stale) is None
+    assert store.get(fresh) is not None
+
+
+def test_resumable_upload_through_the_api(app, monkeypatch):
+    queued = []
+
+    def add_job(job_id, url, file_path, base_filename, chunk_size_mb, bitrate, output_format, fingerprint, est_cost):
+        queued.append((file_path, fingerprint))
+        return True
+
+    monkeypatch.setattr(tasks.queue_manager, 'add_job', add_job)
+    client = app.test_client()
+    data = make_mp4(os.urandom(200 * 1024))
+
+    response = client.post('/api/uploads', json={'filename': 'lecture.mp4', 'length': len(data)})
+    assert response.status_code == 201
+    upload_url = f"/api/uploads/{response.get_json()['upload_id']}"
+
+    response = client.patch(upload_url, data=data[:50000], headers={'Upload-Offset': '0'})
+    assert response.headers['Upload-Offset'] == '50000'
+    response = client.patch(upload_url, data=data[60000:], headers={'Upload-Offset': '60000'})
+    assert response.status_code == 409
+    assert response.headers['Upload-Offset'] == '50000'
+    assert client.head(upload_url).headers['Upload-Offset'] == '50000'
+    response = client.patch(upload_url, data=data[50000:],
+                            headers={'Content-Range': f"bytes 50000-{len(data) - 1}/{len(data)}"})
+    assert response.headers['Upload-Offset'] == str(len(data))
+
+    response = client.post(f"{upload_url}/finalize", json={'checksum': hashlib.sha256(data).hexdigest()})
+
+    assert response.status_code == 202
+    assert response.get_json()['file_size'] == len(data)
+    file_path, fingerprint = queued[0]
+    assert fingerprint == f"sha256:{hashlib.sha256(data).hexdigest()}"
+    with open(file_path, 'rb') as f:
+        assert f.read() == data
+    assert client.get(upload_url).status_code == 404
@@ -0,0 +1,154 @@
+import json
+import os
+import time
+
+import pytest
+
+from app.utils.webhooks import MemoryWebhookOutbox, WebhookDispatcher, check_callback_url
+from tests.helpers import WebhookHandler, start_server
+
+PAYLOAD = {'job_id': 'job-1', 'status': 'completed', 'files': []}
+
+
+@pytest.fixture
+def receiver():
+    httpd = start_server(WebhookHandler, responses=[], received=[])
+    httpd.url = httpd.base_url + "/hook"
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def dispatcher_factory(tmp_path):
+    dead_letter_path = str(tmp_path / 'dead_letter.jsonl')
+
+    def _create(**kwargs):
+        options = dict(dead_letter_path=dead_letter_path, poll_interval=0.05, allowed_hosts=['127.0.0.1'])
+        options.update(kwargs)
+        dispatcher = WebhookDispatcher(MemoryWebhookOutbox(), **options)
+        dispatcher.start()
+        return dispatcher
+
+    _create.dead_letter_path = dead_letter_path
+    return _create
+
+
+def _wait_until(condition, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def _dead_letters(path):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_callback_is_delivered_with_payload_and_headers(receiver, dispatcher_factory):
+    dispatcher = dispatcher_factory()
+
+    delivery_id = dispatcher.submit('job-1', receiver.url, PAYLOAD)
+
+    assert _wait_until(lambda: receiver.received)
+    time.sleep(0.2)
+    assert len(receiver.received) == 1
+    _, headers, body = receiver.received[0]
+    assert body == PAYLOAD
+    assert headers['Idempotency-Key'] == delivery_id
+    assert headers['X-Webhook-Attempt'] == '1'
+    assert _dead_letters(dispatcher_factory.dead_letter_path) == []
+
+
+def test_failed_callback_is_retried_with_backoff_and_retry_after(receiver, dispatcher_factory):
+    receiver.responses = [(503, None), (429, '1')]
+    dispatcher = dispatcher_factory(backoff_base=0.4)
+
+    delivery_id = dispatcher.submit('job-1', receiver.url, PAYLOAD)
+
+    assert _wait_until(lambda: len(receiver.received) == 3)
+    times = [received[0] for received in receiver.received]
+    headers = [received[1] for received in receiver.received]
+    assert [h['X-Webhook-Attempt'] for h in headers] == ['1', '2', '3']
+    assert {h['Idempotency-Key'] for h in headers} == {delivery_id}
+    assert all(received[2] == PAYLOAD for received in receiver.received)
+    # First retry: backoff_base with jitter (0.5 - 1.0); second: the receiver's Retry-After
+    assert 0.2 <= times[1] - times[0] < 1.0
+    assert times[2] - times[1] >= 1.0
+    assert _dead_letters(dispatcher_factory.dead_letter_path) == []
+
+
+def test_callback_is_dead_lettered_after_last_attempt(receiver, dispatcher_factory):
+    receiver.responses = [(500, None)] * 5
+    dispatcher = dispatcher_factory(max_attempts=2, backoff_base=0.1)
+
+    delivery_id = dispatcher.submit('job-1', receiver.url, PAYLOAD)
+
+    assert _wait_until(lambda: _dead_letters(dispatcher_factory.dead_letter_path))
+    record, = _dead_letters(dispatcher_factory.dead_letter_path)
+    assert record['id'] == delivery_id
+    assert record['attempts'] == 2
+    assert record['last_error'] == 'HTTP 500'
+    assert record['payload'] == PAYLOAD
+    assert len(receiver.received) == 2
+
+
+def test_rejected_callback_is_dead_lettered_without_retry(receiver, dispatcher_factory):
+    receiver.responses = [(400, None)]
+    dispatcher = dispatcher_factory(backoff_base=0.1)
+
+    dispatcher.submit('job-1', receiver.url, PAYLOAD)
+
+    assert _wait_until(lambda: _dead_letters(dispatcher_factory.dead_letter_path))
+    assert _dead_letters(dispatcher_factory.dead_letter_path)[0]['attempts'] == 1
+    assert len(receiver.received) == 1
+
+
+def test_callback_to_host_that_is_not_allowed_is_never_sent(receiver, dispatcher_factory):
+    dispatcher = dispatcher_factory(allowed_hosts=[])
+
+    dispatcher.submit('job-1', receiver.url, PAYLOAD)
+
+    assert _wait_until(lambda: _dead_letters(dispatcher_factory.dead_letter_path))
+    assert 'non-public' in _dead_letters(dispatcher_factory.dead_letter_path)[0]['last_error']
+    assert receiver.received == []
+
+
+@pytest.mark.parametrize('url', [
+    'http://127.0.0.1:8080/hook',
+    'http://localhost/hook',
+    'http://10.1.2.3/hook',
+    'http://192.168.0.10/hook',
+    'http://169.254.169.254/latest/meta-data',
+    'http://[::1]/hook',
+    'http://0.0.0.0/hook',
+])
+def test_non_public_callback_hosts_are_refused(url):
+    with pytest.raises(ValueError):
+        check_callback_url(url)
+
+
+def test_allowed_hosts_admit_internal_receivers():
+    check_callback_url('http://93.184.216.34/hook')
+    check_callback_url('http://10.1.2.3/hook', ['10.0.0.0/8'])
+    check_callback_url('http://127.0.0.1/hook', ['127.0.0.1'])
+    check_callback_url('http://hooks.internal/hook', ['hooks.internal'])
+    with pytest.raises(ValueError):
+        check_callback_url('http://10.1.2.3/hook', ['192.168.0.0/16'])
+
+
+def test_api_rejects_internal_callback_url(app):
+    client = app.test_client()
+
+    response = client.post('/api/conversion/url', json={
+        'url': 'http://example.com/video.mp4',
+        'callback_url': 'http://169.254.169.254/latest/meta-data',
+    })
+
+    assert response.status_code == 400
+    assert 'callback_url' in response.get_json()['error']
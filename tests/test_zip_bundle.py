@@ -0,0 +1,59 @@
+import io
+import os
+import zipfile
+import zlib
+
+import pytest
+
+from app.services.zip_bundle import BundleTooLargeError, StoredZip, ZIP_MAX_SIZE, bundle_entries
+
+
+@pytest.fixture
+def parts(tmp_path):
+    """Three parts on disk and their registry records"""
+    files = []
+    for index, size in enumerate((5000, 0, 12345), start=1):
+        data = os.urandom(size)
+        name = f"lecture_part{index}.mp3"
+        (tmp_path / name).write_bytes(data)
+        files.append({'filename': name, 'size': size, 'crc32': zlib.crc32(data), 'data': data})
+    return str(tmp_path), files
+
+
+def test_archive_is_a_valid_stored_zip(parts):
+    result_dir, files = parts
+    archive = StoredZip(bundle_entries(result_dir, files), 1700000000)
+    data = archive.read()
+
+    assert len(data) == archive.size
+    with zipfile.ZipFile(io.BytesIO(data)) as bundle:
+        assert bundle.testzip() is None
+        assert bundle.namelist() == [f['filename'] for f in files]
+        for f in files:
+            info = bundle.getinfo(f['filename'])
+            assert info.compress_type == zipfile.ZIP_STORED
+            assert info.date_time == (2023, 11, 14, 22, 13, 20)
+            assert bundle.read(f['filename']) == f['data']
+
+
+def test_any_range_matches_the_full_archive(parts):
+    result_dir, files = parts
+    entries = bundle_entries(result_dir, files)
+    full = StoredZip(entries, 1700000000).read()
+    # Raw reads stop at member boundaries; the buffered reader joins them
+    archive = io.BufferedReader(StoredZip(entries, 1700000000))
+
+    for start, length in ((0, 10), (25, 6000), (5100, 50), (len(full) - 30, 100)):
+        archive.seek(start)
+        assert archive.read(length) == full[start:start + length]
+    archive.seek(-22, io.SEEK_END)
+    assert archive.read()[:4] == b'PK\x05\x06'
+    archive.close()
+
+
+def test_archive_over_4gb_is_refused(parts):
+    result_dir, files = parts
+    entries = [('huge.mp3', os.path.join(result_dir, 'huge.mp3'), ZIP_MAX_SIZE, 0)]
+
+    with pytest.raises(BundleTooLargeError):
+        StoredZip(entries, 1700000000)
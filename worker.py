@@ -3,6 +3,7 @@ import sys
 from rq import Worker, Queue, Connection
 from redis import Redis
 from app import create_app
+from app.tasks import RQ_QUEUES
 
 app = create_app()
 app.app_context().push()
@@ -12,7 +13,10 @@ redis_conn = Redis.from_url(app.config['REDIS_URL'])
 
 # Pekerja bisa dijalankan dengan:
 # python worker.py
+# Job dikirim ke sini jika EXECUTION_MODE=rq; jalankan beberapa worker untuk menambah kapasitas.
+# Antrian didengarkan sesuai urutan prioritas: high, default, low
+# Scheduler menjalankan ulang job URL yang gagal sementara setelah DOWNLOAD_JOB_RETRY_DELAY
 if __name__ == '__main__':
     with Connection(redis_conn):
-        worker = Worker(map(Queue, ['default', 'high', 'low']))
-        worker.work()
\ No newline at end of file
+        worker = Worker(map(Queue, RQ_QUEUES))
+        worker.work(with_scheduler=True)
\ No newline at end of file